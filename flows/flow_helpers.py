@@ -0,0 +1,366 @@
+import configparser
+import fnmatch
+import functools
+import glob
+import hashlib
+import os
+import re
+import shlex
+import sys
+from collections import deque
+from typing import TypeVar
+
+from flytekit.types.file import FlyteFile
+from flytekitplugins.domino.helpers import Input, Output, run_domino_job_task
+from flytekitplugins.domino.artifact import Artifact, DATA, MODEL, REPORT
+
+
+# Helpers shared by the Flow definitions in this directory. The Flows are compiled on the machine that runs
+# "pyflyte run", so everything here is evaluated there, once per registration, and never inside the Domino jobs.
+
+# Root of the project repository. Task commands are relative to it and SAS programs %include files under /mnt/code.
+FLOWS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(FLOWS_DIR)
+CODE_MOUNT = "/mnt/code"
+
+# Files that change the behaviour of every SAS program which includes domino.sas: the setup file puts
+# share/macros on SASAUTOS, so any macro in it may be called.
+SHARED_MACRO_PATTERN = "share/macros/*.sas"
+
+# Runs the programs of a batched task side by side inside its job, see build_flow
+BATCH_RUNNER = os.path.join(FLOWS_DIR, "run_batch.py")
+
+# %include "file"; statements that are not commented out with a leading *
+INCLUDE_PATTERN = re.compile(r'^\s*%include\s+["\']([^"\']+)["\']', re.IGNORECASE | re.MULTILINE)
+
+
+def resolve_program_path(path):
+    # Map a program or %include path to a file in the repository
+    if path.startswith(CODE_MOUNT + "/"):
+        path = path[len(CODE_MOUNT) + 1:]
+    return os.path.join(REPO_ROOT, path)
+
+
+def program_dependencies(command):
+    # Returns the program file of a task command plus the files it pulls in with %include, sorted
+    program = resolve_program_path(command.split()[0])
+    files = {program}
+    pending = [program]
+    while pending:
+        path = pending.pop()
+        if not path.lower().endswith(".sas") or not os.path.isfile(path):
+            continue
+        with open(path, "r", errors="replace") as file:
+            includes = INCLUDE_PATTERN.findall(file.read())
+        for include in includes:
+            included = resolve_program_path(include)
+            if included not in files:
+                files.add(included)
+                pending.append(included)
+            if os.path.basename(included) == "domino.sas":
+                files.update(glob.glob(os.path.join(REPO_ROOT, SHARED_MACRO_PATTERN)))
+    return sorted(files)
+
+
+@functools.lru_cache(maxsize=None)
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        digest.update(b"missing")
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def snapshot_fingerprint(directory):
+    # Cheap fingerprint of a Dataset snapshot from the name, size and mtime of its files. Snapshots are
+    # read-only, so this changes exactly when a new snapshot with different files is taken. Returns None
+    # when the snapshot is not mounted on this machine.
+    if not os.path.isdir(directory):
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(path, directory)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def flow_snapshot_dirs(argv=None):
+    # The snapshot directories given to "pyflyte run" as --<name>_snapshot arguments. Flow inputs are only
+    # placeholders while the workflow is compiled, so the command line is the only place their values are known.
+    argv = sys.argv if argv is None else argv
+    dirs = []
+    for i, arg in enumerate(argv):
+        name, _, value = arg.partition("=")
+        if name.startswith("--") and name.endswith("snapshot"):
+            if not value and i + 1 < len(argv):
+                value = argv[i + 1]
+            if value:
+                dirs.append(value)
+    return dirs
+
+
+def compute_cache_version(command, snapshot_dirs=(), environment_name=None):
+    # Cache version derived from the program, everything it %includes and the content of the input snapshots.
+    # Outputs of upstream tasks are Flyte inputs, so they are already part of Flyte's own cache key.
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(f"command\0{command}\nenvironment\0{environment_name}\n".encode())
+    for path in program_dependencies(command):
+        digest.update(f"{os.path.relpath(path, REPO_ROOT)}\0{file_digest(path)}\n".encode())
+    for directory in sorted(snapshot_dirs):
+        digest.update(f"{directory}\0{snapshot_fingerprint(directory)}\n".encode())
+    return digest.hexdigest()
+
+
+def run_cached_domino_job_task(flyte_task_name, command, snapshot_dirs=None, **kwargs):
+    # Same as run_domino_job_task, but cached by default with a cache version computed by compute_cache_version.
+    # An explicit cache_version or cache=False is passed through unchanged.
+    kwargs.setdefault("cache", True)
+    if kwargs["cache"] and "cache_version" not in kwargs:
+        if snapshot_dirs is None:
+            snapshot_dirs = flow_snapshot_dirs()
+        kwargs["cache_version"] = compute_cache_version(command, snapshot_dirs, kwargs.get("environment_name"))
+    return run_domino_job_task(flyte_task_name=flyte_task_name, command=command, **kwargs)
+
+
+ARTIFACT_TYPES = {"DATA": DATA, "MODEL": MODEL, "REPORT": REPORT}
+
+
+def split_list(value):
+    return [item.strip() for item in value.replace("\n", ",").split(",") if item.strip()]
+
+
+class FlowSpec:
+    # A Flow task graph read from one or more configparser files, relative to the flows directory. Later files
+    # override sections and options of earlier ones. See adam_tfl.cfg for the format. Dependencies between tasks
+    # are derived from their inputs and outputs, and the spec is checked as soon as it is loaded, so a missing
+    # program, a duplicate output or a cycle fails "pyflyte run" before anything is registered.
+
+    def __init__(self, *paths):
+        self.paths = [os.path.join(FLOWS_DIR, path) for path in paths]
+        for path in self.paths:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Flow spec {path} does not exist")
+        config = configparser.ConfigParser(interpolation=None)
+        config.read(self.paths)
+
+        self.tasks = {}
+        # Output name -> (section producing it, file type)
+        self.outputs = {}
+        self.artifacts = {}
+        problems = []
+        for section in config.sections():
+            c = config[section]
+            command = c.get("command", "").strip()
+            if not command:
+                problems.append(f"[{section}] has no command")
+                continue
+            program = command.split()[0]
+            if not os.path.isfile(resolve_program_path(program)):
+                problems.append(f"[{section}] program {program} does not exist")
+
+            inputs = []
+            for item in split_list(c.get("inputs", "")):
+                name, _, source = item.partition("=")
+                inputs.append((name.strip(), source.strip() or name.strip()))
+
+            outputs = []
+            for item in split_list(c.get("outputs", "")):
+                name, _, file_type = item.partition(":")
+                name, _, file_name = name.partition("=")
+                name, file_name, file_type = name.strip(), file_name.strip() or name.strip(), file_type.strip()
+                if not file_type:
+                    problems.append(f"[{section}] output {name} has no file type")
+                if name in self.outputs:
+                    problems.append(f"[{section}] output {name} is also produced by [{self.outputs[name][0]}]")
+                    continue
+                self.outputs[name] = (section, file_type)
+                outputs.append((name, file_name, file_type))
+
+            artifact = None
+            if c.get("artifact"):
+                artifact_type = c.get("artifact_type", "DATA").strip().upper()
+                if artifact_type not in ARTIFACT_TYPES:
+                    problems.append(f"[{section}] unknown artifact_type {artifact_type}, expected one of {', '.join(ARTIFACT_TYPES)}")
+                else:
+                    key = (c["artifact"].strip(), artifact_type)
+                    if key not in self.artifacts:
+                        self.artifacts[key] = Artifact(key[0], ARTIFACT_TYPES[artifact_type])
+                    artifact = self.artifacts[key]
+
+            self.tasks[section] = {
+                "name": c.get("name", section),
+                "command": command,
+                "inputs": inputs,
+                "outputs": outputs,
+                "artifact": artifact,
+                "environment": c.get("environment", "").strip(),
+                "hardware_tier": c.get("hardware_tier", "").strip(),
+                "cache": c.getboolean("cache", True),
+                "batch": c.getboolean("batch", True),
+            }
+
+        self.dependencies = {
+            section: sorted({self.outputs[source][0] for _, source in task["inputs"] if source in self.outputs})
+            for section, task in self.tasks.items()
+        }
+        self.order = self.topological_order()
+        if len(self.order) < len(self.tasks):
+            cyclic = sorted(set(self.tasks) - set(self.order))
+            problems.append(f"Dependency cycle between {', '.join(cyclic)}")
+        if problems:
+            raise ValueError(f"Invalid flow spec {', '.join(self.paths)}:\n  " + "\n  ".join(problems))
+
+    def topological_order(self):
+        # Kahn's algorithm, keeping the file order between independent tasks
+        pending = {section: len(deps) for section, deps in self.dependencies.items()}
+        dependents = {section: [] for section in self.tasks}
+        for section, deps in self.dependencies.items():
+            for dep in deps:
+                dependents[dep].append(section)
+        queue = deque(section for section in self.tasks if pending[section] == 0)
+        order = []
+        while queue:
+            section = queue.popleft()
+            order.append(section)
+            for dependent in dependents[section]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    queue.append(dependent)
+        return order
+
+    def select(self, targets=None):
+        # The sections matching the target patterns plus everything they depend on, in dependency order
+        if targets is None:
+            return list(self.order)
+        selected = set()
+        pending = []
+        for pattern in targets:
+            matches = fnmatch.filter(self.tasks, pattern)
+            if not matches:
+                raise ValueError(f"Flow target {pattern} does not match any task in {', '.join(self.paths)}")
+            pending.extend(matches)
+        while pending:
+            section = pending.pop()
+            if section not in selected:
+                selected.add(section)
+                pending.extend(self.dependencies[section])
+        return [section for section in self.order if section in selected]
+
+
+def batch_cache_version(tasks, snapshot_dirs=None):
+    # Cache version of a batched task, from the cache versions its tasks would have on their own and the runner
+    if snapshot_dirs is None:
+        snapshot_dirs = flow_snapshot_dirs()
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(f"runner\0{file_digest(BATCH_RUNNER)}\n".encode())
+    for task in tasks:
+        digest.update(f"{compute_cache_version(task['command'], snapshot_dirs, task['environment'] or None)}\n".encode())
+    return digest.hexdigest()
+
+
+def plan_batches(spec, sections, batch_size):
+    # Groups of sections that run as one Domino job, in the order of their last section, so every group comes after
+    # the tasks it reads outputs from. Sections that no other selected section depends on are packed into groups of
+    # up to batch_size by environment, hardware tier and cache setting. Sections whose inputs of the same name come
+    # from different sources are kept apart, since the job has one input of each name. Everything else runs on its own.
+    depended_on = {dep for section in sections for dep in spec.dependencies[section]}
+    groups = []
+    open_groups = {}
+    for section in sections:
+        task = spec.tasks[section]
+        if batch_size <= 1 or not task["batch"] or section in depended_on:
+            groups.append([section])
+            continue
+        key = (task["environment"], task["hardware_tier"], task["cache"])
+        for group in open_groups.get(key, []):
+            sources = {name: source for member in group for name, source in spec.tasks[member]["inputs"]}
+            if len(group) < batch_size and all(sources.get(name, source) == source for name, source in task["inputs"]):
+                group.append(section)
+                break
+        else:
+            group = [section]
+            open_groups.setdefault(key, []).append(group)
+            groups.append(group)
+    position = {section: i for i, section in enumerate(sections)}
+    return sorted(groups, key=lambda group: position[group[-1]])
+
+
+def build_flow(spec, targets=None, batch_size=1, **flow_inputs):
+    # Adds the tasks of a FlowSpec to the workflow being compiled. Call it inside a @workflow function with the
+    # workflow's inputs as keyword arguments; task inputs that are not produced by another task are read from them.
+    # Returns the task results by section name.
+    #
+    # With batch_size > 1, up to batch_size tasks that nothing depends on, typically TFLs, run together in one
+    # Domino job (see plan_batches), since the job startup often takes longer than the program. run_batch.py runs
+    # them side by side in the job and reports each program's status and logs; the job fails if any of them fails.
+    # Add "batch: false" to a section to keep it in a job of its own.
+    sections = spec.select(targets)
+    problems = []
+    for section in sections:
+        for name, source in spec.tasks[section]["inputs"]:
+            if source not in spec.outputs and source not in flow_inputs:
+                problems.append(f"[{section}] input {name} reads {source}, which is neither a task output nor a Flow input")
+    if problems:
+        raise ValueError("Cannot build flow:\n  " + "\n  ".join(problems))
+
+    results = {}
+    for group in plan_batches(spec, sections, batch_size):
+        tasks = [spec.tasks[section] for section in group]
+        task = tasks[0]
+        inputs = []
+        input_names = set()
+        output_specs = []
+        for member in tasks:
+            for name, source in member["inputs"]:
+                if name in input_names:
+                    continue
+                input_names.add(name)
+                if source in spec.outputs:
+                    producer, file_type = spec.outputs[source]
+                    inputs.append(Input(name=name, type=FlyteFile[TypeVar(file_type)], value=results[producer][source]))
+                else:
+                    inputs.append(Input(name=name, type=str, value=flow_inputs[source]))
+
+            for name, file_name, file_type in member["outputs"]:
+                if member["artifact"] is not None:
+                    output_specs.append(Output(name=name, type=member["artifact"].File(name=file_name, type=file_type)))
+                else:
+                    output_specs.append(Output(name=name, type=FlyteFile[TypeVar(file_type)]))
+
+        kwargs = {}
+        if task["hardware_tier"]:
+            kwargs["hardware_tier_name"] = task["hardware_tier"]
+        if task["environment"]:
+            kwargs["environment_name"] = task["environment"]
+        if len(tasks) == 1:
+            flyte_task_name = task["name"]
+            command = task["command"]
+        else:
+            flyte_task_name = f"{task['name']} and {len(tasks) - 1} more"
+            runner = os.path.relpath(BATCH_RUNNER, REPO_ROOT)
+            command = " ".join(["python3", runner] + [shlex.quote(member["command"]) for member in tasks])
+            if task["cache"]:
+                kwargs["cache_version"] = batch_cache_version(tasks)
+        result = run_cached_domino_job_task(
+            flyte_task_name=flyte_task_name,
+            command=command,
+            inputs=inputs,
+            output_specs=output_specs,
+            use_project_defaults_for_omitted=True,
+            cache=task["cache"],
+            **kwargs
+        )
+        # The outputs of every task of a batch are outputs of its job
+        for section in group:
+            results[section] = result
+    return results
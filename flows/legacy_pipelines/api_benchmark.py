@@ -0,0 +1,181 @@
+"""
+api_benchmark.py
+
+Measure the Domino API client of multijob-local.py without a Domino deployment.
+
+Starts a local stand-in for the Domino API (http://127.0.0.1:<port>, answering the job status and job tag endpoints
+that multijob calls most), points multijob-local.py at it and times the same calls made three ways: one new
+connection per call, as multijob did before it shared API_SESSION; one at a time over the pooled session; and
+dispatched with run_concurrently over the pooled session, as the tag writes after a submission are.
+
+    api_benchmark.py --jobs 50 --latency-ms 20 --json results.json
+
+--latency-ms makes the stand-in behave like a remote API, where each call waits on the server. --min-calls-per-s
+fails the run (exit code 1) when the concurrent dispatch is slower, so a regression shows up as a failed CI step.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MULTIJOB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "multijob-local.py")
+PROJECT_ID = "benchmark-project"
+# Tags written after each job submission: the job name, the job title and the task id
+TAGS_PER_JOB = 3
+
+
+class DominoApiHandler(BaseHTTPRequestHandler):
+    # Answers GET api/jobs/beta/jobs/<id> with a job status and POST v4/jobs/<id>/tag with an empty object
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle's algorithm the body would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/api/jobs/beta/jobs/"):
+            job_id = path.rsplit("/", 1)[-1]
+            return self.send_json(200, {"job": {"id": job_id, "status": {"executionStatus": "Running"}}})
+        self.send_json(404, {})
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/v4/jobs/") and self.path.endswith("/tag"):
+            return self.send_json(200, {})
+        self.send_json(404, {})
+
+
+def start_api(latency_ms):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DominoApiHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_multijob(endpoint):
+    # multijob-local.py reads its Domino settings from the environment when it is imported
+    os.environ["DOMINO_API_PROXY"] = endpoint
+    for name, value in (("DOMINO_RUN_ID", "benchmark"), ("DOMINO_STARTING_USERNAME", "benchmark"),
+                        ("DOMINO_PROJECT_ID", PROJECT_ID), ("DOMINO_PROJECT_OWNER", "benchmark"),
+                        ("DOMINO_PROJECT_NAME", "benchmark"), ("DOMINO_IS_GIT_BASED", "true")):
+        os.environ.setdefault(name, value)
+    spec = importlib.util.spec_from_file_location("multijob_local", MULTIJOB_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def job_calls(multijob, jobs):
+    # A status poll and the tag writes of each job, as (function, args) pairs
+    calls = []
+    for i in range(jobs):
+        job_id = f"job{i:04d}"
+        calls.append((multijob.get_job_status, (job_id, )))
+        calls.extend((multijob.set_job_tag, (PROJECT_ID, job_id, f"tag{t}")) for t in range(TAGS_PER_JOB))
+    return calls
+
+
+def unpooled_call(multijob, endpoint):
+    # The calls of job_calls over a new connection each, as submit_api_call made them with requests.request
+    import requests
+
+    def get_job_status(job_id):
+        response = requests.request("GET", f"{endpoint}/api/jobs/beta/jobs/{job_id}")
+        response.raise_for_status()
+        return response.json()["job"]["status"]["executionStatus"]
+
+    def set_job_tag(project_id, job_id, tag):
+        response = requests.request("POST", f"{endpoint}/v4/jobs/{job_id}/tag",
+                                    data=json.dumps({"tagName": tag, "projectId": project_id}))
+        response.raise_for_status()
+
+    return {multijob.get_job_status: get_job_status, multijob.set_job_tag: set_job_tag}
+
+
+def timed(function):
+    def call(*args):
+        start = time.monotonic()
+        function(*args)
+        return time.monotonic() - start
+    return call
+
+
+def run_benchmark(multijob, mode, calls, endpoint):
+    # Returns the wall time and the per-call latencies of making every call in `mode`
+    start = time.monotonic()
+    if mode == "concurrent":
+        latencies = multijob.run_concurrently(lambda function, args: timed(function)(*args), calls)
+    elif mode == "pooled":
+        latencies = [timed(function)(*args) for function, args in calls]
+    else:
+        unpooled = unpooled_call(multijob, endpoint)
+        latencies = [timed(unpooled[function])(*args) for function, args in calls]
+    seconds = time.monotonic() - start
+    return {
+        "mode": mode,
+        "calls": len(calls),
+        "seconds": round(seconds, 3),
+        "calls_per_s": round(len(calls) / seconds, 1) if seconds > 0 else None,
+        "latency_ms_median": round(multijob.percentile(latencies, 0.5) * 1000, 1),
+        "latency_ms_p95": round(multijob.percentile(latencies, 0.95) * 1000, 1),
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the Domino API client of multijob-local.py against a local stand-in.")
+    parser.add_argument("--jobs", type=int, default=50, help=f"Jobs whose status is polled and which get {TAGS_PER_JOB} tags each (default: 50)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay before the stand-in answers each call (default: 20)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the median is reported (default: 3)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to this JSON file")
+    parser.add_argument("--min-calls-per-s", type=float, help="Exit with 1 when concurrent dispatch makes fewer calls per second than this")
+    args = parser.parse_args()
+
+    server = start_api(args.latency_ms)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        multijob = load_multijob(endpoint)
+        calls = job_calls(multijob, args.jobs)
+        print(f"{len(calls)} calls for {args.jobs} jobs at {endpoint}, {args.latency_ms:g} ms latency, "
+              f"{multijob.API_POOL_SIZE} pooled connections")
+        print(f"{'mode':>10} {'seconds':>8} {'calls/s':>8} {'median ms':>10} {'p95 ms':>8}")
+        results = []
+        for mode in ("unpooled", "pooled", "concurrent"):
+            runs = sorted((run_benchmark(multijob, mode, calls, endpoint) for _ in range(args.repeat)), key=lambda run: run["seconds"])
+            result = runs[len(runs) // 2]
+            results.append(result)
+            print(f"{mode:>10} {result['seconds']:>8.2f} {result['calls_per_s']:>8.1f} "
+                  f"{result['latency_ms_median']:>10.1f} {result['latency_ms_p95']:>8.1f}")
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"jobs": args.jobs, "latency_ms": args.latency_ms, "repeat": args.repeat, "results": results}, file, indent=2)
+
+    if args.min_calls_per_s is not None:
+        concurrent = next(r for r in results if r["mode"] == "concurrent")
+        if concurrent["calls_per_s"] < args.min_calls_per_s:
+            print(f"Concurrent dispatch made {concurrent['calls_per_s']} calls/s, below the required {args.min_calls_per_s}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+This program infers the dependencies between SAS and R programs by scanning them for the datasets they read and write.
+
+SAS programs are scanned for DATA, SET, MERGE, UPDATE and MODIFY statements, DATA= and OUT= options, PROC SQL
+CREATE TABLE / FROM / JOIN clauses, LIBNAME statements and %xpt2loc calls. A library._ALL_ reference, as passed to
+the %s_compare macro, is a read of every dataset that the scanned programs write to that library. R programs are scanned for haven's
+read_sas, read_xpt, write_sas and write_xpt. Library references are resolved to directories using the LIBNAME
+statements of domino.sas and of the program itself, so a dataset written as adam.adsl and read as
+/mnt/data/ADAM/adsl.sas7bdat is recognised as the same file.
+
+The result is written as a multijob configuration file. Each program becomes a section whose input list holds the
+datasets it reads and whose depends list names the programs producing them. When several programs write the same
+dataset, the program named after it (ADSL.sas or qc_ADSL.sas for adsl) is taken as its producer, and only the
+producer lists the dataset as an output. Programs writing the same dataset would race on it if they ran side by
+side, so each of them depends on the one before it: the producer first, then the others in program order. Scan
+results are cached per file content hash, so only changed programs are parsed again.
+"""
+
+from argparse import ArgumentParser
+import fnmatch
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+# Bump when the patterns below change, so cached scan results are not reused
+SCANNER_VERSION = 2
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SETUP_PROGRAM = "domino.sas"
+DEFAULT_PATTERNS = ["prod/**/*.sas", "prod/**/*.R", "qc/**/*.sas", "qc/**/*.R"]
+# Programs written for Flows, which only read and write the /workflow inputs and outputs
+DEFAULT_EXCLUDES = ["*/adam_flows_sdtm/*"]
+DEFAULT_CACHE_PATH = os.path.join(".multijob", "dependency-scan.json")
+
+# Libraries that never hold data shared between programs; Flow inputs and outputs under /workflow are ignored as well
+IGNORED_LIBRARIES = {"work", "inputs", "outputs", "sashelp", "sasuser"}
+
+SAS_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+SAS_DATASET = re.compile(r"^([a-z_][a-z0-9_]{0,7})\.([a-z_&][a-z0-9_&.]*)$", re.IGNORECASE)
+SAS_STEP_STATEMENT = re.compile(r"^(data|set|merge|update|modify)\s+(.*)$", re.IGNORECASE | re.DOTALL)
+SAS_LIBNAME = re.compile(r"^libname\s+([a-z_][a-z0-9_]*)\s+(?:\w+\s+)?[\"']([^\"']+)[\"']", re.IGNORECASE)
+SAS_DATA_OPTION = re.compile(r"\bdata\s*=\s*([a-z_][a-z0-9_]*\.[a-z_&][a-z0-9_&.]*)", re.IGNORECASE)
+SAS_OUT_OPTION = re.compile(r"\bout\s*=\s*([a-z_][a-z0-9_]*\.[a-z_&][a-z0-9_&.]*)", re.IGNORECASE)
+SAS_CREATE_TABLE = re.compile(r"\bcreate\s+table\s+([a-z_][a-z0-9_]*\.[a-z_&][a-z0-9_&.]*)", re.IGNORECASE)
+SAS_FROM_JOIN = re.compile(r"\b(?:from|join)\s+([a-z_][a-z0-9_]*\.[a-z_&][a-z0-9_&.]*)", re.IGNORECASE)
+SAS_XPT2LOC = re.compile(r"%xpt2loc\s*\(\s*filespec\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE)
+SAS_LET = re.compile(r"%let\s+([a-z_][a-z0-9_]*)\s*=\s*([^;]*);", re.IGNORECASE)
+SAS_MACRO_VARIABLE = re.compile(r"&([a-z_][a-z0-9_]*)\.?", re.IGNORECASE)
+SAS_ALL_MEMBERS = re.compile(r"\b([a-z_][a-z0-9_]{0,7})\._all_\b", re.IGNORECASE)
+
+R_COMMENT = re.compile(r"#.*$", re.MULTILINE)
+R_READ = re.compile(r"\bread_(?:sas|xpt)\s*\(\s*(?:data_file\s*=\s*)?[\"']([^\"']+)[\"']")
+R_WRITE = re.compile(r"\bwrite_(?:sas|xpt)\s*\([^,()]+,\s*(?:path\s*=\s*)?[\"']([^\"']+)[\"']")
+
+
+def strip_parentheses(text):
+    # Drop dataset options such as (in = ae) or (where = (...)), which may nest
+    result = []
+    depth = 0
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            result.append(char)
+    return "".join(result)
+
+
+def sas_statements(text):
+    # Split a SAS program into statements, dropping /* */ comments and * ...; comment statements
+    text = SAS_BLOCK_COMMENT.sub(" ", text)
+    for statement in text.split(";"):
+        statement = statement.strip()
+        if statement and not statement.startswith("*") and not statement.startswith("%*"):
+            yield statement
+
+
+def scan_sas(text):
+    # Returns the libnames, datasets, libraries and files read and written by a SAS program
+    libnames = {}
+    reads = set()
+    writes = set()
+    read_libraries = set()
+    read_files = set()
+
+    for statement in sas_statements(text):
+        # A %xpt2loc call needs no semicolon, so it may share a statement with the code after it
+        read_files.update(SAS_XPT2LOC.findall(statement))
+        # library._ALL_ names every member of a library, in macro calls as well as in SAS statements
+        read_libraries.update(library.lower() for library in SAS_ALL_MEMBERS.findall(statement))
+        match = SAS_LIBNAME.match(statement)
+        if match:
+            libnames[match.group(1).lower()] = match.group(2)
+            continue
+
+        match = SAS_STEP_STATEMENT.match(statement)
+        if match:
+            keyword = match.group(1).lower()
+            target = writes if keyword == "data" else reads
+            for token in strip_parentheses(match.group(2)).split():
+                if SAS_DATASET.match(token):
+                    target.add(token)
+                elif "=" in token or token.startswith("/"):
+                    break
+
+        writes.update(SAS_OUT_OPTION.findall(statement))
+        writes.update(SAS_CREATE_TABLE.findall(statement))
+        reads.update(SAS_DATA_OPTION.findall(statement))
+        reads.update(SAS_FROM_JOIN.findall(statement))
+
+    return {
+        "libnames": libnames,
+        "reads": sorted(d for d in reads if not d.lower().endswith("._all_")),
+        "writes": sorted(writes),
+        "read_libraries": sorted(read_libraries),
+        "read_files": sorted(read_files),
+        "write_files": [],
+    }
+
+
+def scan_r(text):
+    text = R_COMMENT.sub("", text)
+    return {
+        "libnames": {},
+        "reads": [],
+        "writes": [],
+        "read_libraries": [],
+        "read_files": sorted(set(R_READ.findall(text))),
+        "write_files": sorted(set(R_WRITE.findall(text))),
+    }
+
+
+def scan_program(path):
+    with open(path, "r", errors="replace") as file:
+        text = file.read()
+    if path.lower().endswith(".r"):
+        return scan_r(text)
+    return scan_sas(text)
+
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ScanCache:
+    # Scan results keyed on the content hash of each program, stored as JSON
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == SCANNER_VERSION:
+                    self.entries = data.get("entries", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable scan cache {path}: {e}")
+
+    def scan(self, path):
+        digest = file_hash(path)
+        result = self.entries.get(digest)
+        if result is None:
+            result = scan_program(path)
+            self.entries[digest] = result
+            self.changed = True
+        return result
+
+    def save(self):
+        if not self.path or not self.changed:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": SCANNER_VERSION, "entries": self.entries}, f)
+        os.replace(temp_path, self.path)
+
+
+def read_setup_libnames(path):
+    # Library locations assigned by the setup program. Macro variables take the first value they are given, which
+    # in domino.sas is the git-based project layout (/mnt/data, /mnt/imported/data).
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", errors="replace") as file:
+        text = SAS_BLOCK_COMMENT.sub(" ", file.read())
+    variables = {}
+    for name, value in SAS_LET.findall(text):
+        variables.setdefault(name.lower(), value.strip())
+    libnames = {}
+    for statement in sas_statements(text):
+        match = SAS_LIBNAME.match(statement)
+        if match:
+            libnames.setdefault(match.group(1).lower(), resolve_macro_variables(match.group(2), variables))
+    return libnames
+
+
+def resolve_macro_variables(text, variables):
+    return SAS_MACRO_VARIABLE.sub(lambda m: variables.get(m.group(1).lower(), m.group(0)), text)
+
+
+def is_resolved(location):
+    # Locations that still depend on macro variables or macro functions are only known at run time
+    return "&" not in location and "%" not in location
+
+
+def dataset_key(dataset, libnames):
+    # Returns the path of a library.member dataset, or None for datasets that are not shared between programs.
+    # Datasets in libraries whose location is unknown, or which contain unresolved macro variables, are keyed
+    # on the upper cased library.member name instead.
+    library, member = dataset.split(".", 1)
+    library = library.lower()
+    if library in IGNORED_LIBRARIES or "&" in member:
+        return None
+    location = libnames.get(library)
+    if location and location.startswith("/workflow/"):
+        return None
+    if location and is_resolved(location):
+        return os.path.join(location, f"{member.lower()}.sas7bdat")
+    return f"{library.upper()}.{member.lower()}"
+
+
+def dataset_library(key):
+    # The library part of a dataset key: the directory of a path, or the library of a library.member key
+    if os.sep in key:
+        return os.path.dirname(key)
+    return key.split(".", 1)[0]
+
+
+def task_id_for(relative_path, basenames):
+    # The program name without its extension, prefixed with its directories when the name is not unique
+    name = os.path.splitext(os.path.basename(relative_path))[0]
+    if basenames[name] > 1:
+        name = os.path.splitext(relative_path)[0].replace(os.sep, "_")
+    return name
+
+
+def find_programs(patterns, excludes):
+    programs = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(REPO_ROOT, pattern), recursive=True):
+            relative_path = os.path.relpath(path, REPO_ROOT)
+            if any(fnmatch.fnmatch(relative_path, exclude) for exclude in excludes):
+                continue
+            if any(c.isspace() for c in relative_path):
+                logger.warning(f"Skipping {relative_path}: the path cannot be used as a job command")
+                continue
+            programs.add(relative_path)
+    return sorted(programs)
+
+
+def build_index(programs, cache, setup_libnames):
+    # Returns {task_id: {"program", "reads", "writes"}} with every dataset resolved to a key
+    basenames = {}
+    for program in programs:
+        name = os.path.splitext(os.path.basename(program))[0]
+        basenames[name] = basenames.get(name, 0) + 1
+
+    index = {}
+    read_libraries = {}
+    for program in programs:
+        result = cache.scan(os.path.join(REPO_ROOT, program))
+        libnames = dict(setup_libnames)
+        libnames.update({ref: path for ref, path in result["libnames"].items() if is_resolved(path)})
+        reads = {dataset_key(d, libnames) for d in result["reads"]} | set(result["read_files"])
+        writes = {dataset_key(d, libnames) for d in result["writes"]} | set(result["write_files"])
+        reads.discard(None)
+        writes.discard(None)
+        task_id = task_id_for(program, basenames)
+        libraries = {dataset_key(f"{library}._all_", libnames) for library in result["read_libraries"]}
+        libraries.discard(None)
+        read_libraries[task_id] = {dataset_library(key) for key in libraries}
+        index[task_id] = {"program": program, "reads": reads, "writes": writes}
+
+    # A whole library read is a read of every dataset written to the library
+    written = set().union(*(entry["writes"] for entry in index.values()))
+    for task_id, entry in index.items():
+        entry["reads"] |= {d for d in written if dataset_library(d) in read_libraries[task_id]}
+        entry["reads"] = sorted(entry["reads"] - entry["writes"])
+        entry["writes"] = sorted(entry["writes"])
+    return index
+
+
+def dataset_member(dataset):
+    return os.path.splitext(os.path.basename(dataset))[0].split(".")[-1].lower()
+
+
+def program_member(program):
+    # The dataset a program is named after: adsl for ADSL.sas and for its QC program qc_ADSL.sas
+    member = dataset_member(program)
+    return member[3:] if member.startswith("qc_") else member
+
+
+def find_producers(index):
+    # Returns {dataset: [task_id, ...]} of the programs producing each dataset. When several programs write the
+    # same dataset and one of them is named after it (ADSL.sas writing adam.adsl), that program is taken as its
+    # producer; otherwise all of the writers are.
+    producers = {}
+    for task_id, entry in index.items():
+        for dataset in entry["writes"]:
+            producers.setdefault(dataset, []).append(task_id)
+    for dataset, task_ids in producers.items():
+        if len(task_ids) > 1:
+            owners = [t for t in task_ids if program_member(index[t]["program"]) == dataset_member(dataset)]
+            if len(owners) == 1:
+                logger.warning(f"{dataset} is written by {', '.join(task_ids)}; using {owners[0]} as its producer")
+                producers[dataset] = owners
+            else:
+                logger.warning(f"{dataset} is written by {', '.join(task_ids)}; programs reading it depend on all of them")
+    return producers
+
+
+def infer_dependencies(index, producers=None):
+    # Each program depends on the programs producing the datasets it reads, and on the writer before it of each
+    # dataset it shares with other writers
+    if producers is None:
+        producers = find_producers(index)
+    dependencies = {}
+    writers = {}
+    for task_id, entry in index.items():
+        deps = set()
+        for dataset in entry["reads"]:
+            deps.update(producers.get(dataset, []))
+        for dataset in entry["writes"]:
+            writers.setdefault(dataset, []).append(task_id)
+        deps.discard(task_id)
+        dependencies[task_id] = deps
+    for dataset, task_ids in writers.items():
+        if len(task_ids) < 2:
+            continue
+        owners = producers.get(dataset, []) if len(producers.get(dataset, [])) == 1 else []
+        ordered = sorted(task_ids, key=lambda t: t not in owners)
+        for before, after in zip(ordered, ordered[1:]):
+            logger.info(f"{after} runs after {before}, since both write {dataset}")
+            dependencies[after].add(before)
+    return dependencies
+
+
+def transitive_reduction(dependencies):
+    # Drop a dependency when it is already reached through another one, so depends lists stay minimal.
+    # Cycles are left untouched and reported by the caller.
+    reachable = {}
+
+    def ancestors(task_id, visiting):
+        if task_id in reachable:
+            return reachable[task_id]
+        if task_id in visiting:
+            return set()
+        visiting.add(task_id)
+        result = set()
+        for dep in dependencies[task_id]:
+            result.add(dep)
+            result |= ancestors(dep, visiting)
+        visiting.discard(task_id)
+        reachable[task_id] = result
+        return result
+
+    reduced = {}
+    for task_id, deps in dependencies.items():
+        # Two dependencies that reach each other are on a cycle, and both are kept
+        reduced[task_id] = sorted(
+            dep for dep in deps
+            if not any(dep in ancestors(other, set()) and other not in ancestors(dep, set()) for other in deps if other != dep)
+        )
+    return reduced
+
+
+def find_cycle_members(dependencies):
+    # Tasks left over by Kahn's algorithm are on, or downstream of, a cycle
+    pending = {task_id: len(deps) for task_id, deps in dependencies.items()}
+    dependents = {task_id: [] for task_id in dependencies}
+    for task_id, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(task_id)
+    queue = [task_id for task_id, count in pending.items() if count == 0]
+    while queue:
+        task_id = queue.pop()
+        for dependent in dependents[task_id]:
+            pending[dependent] -= 1
+            if pending[dependent] == 0:
+                queue.append(dependent)
+    return sorted(task_id for task_id, count in pending.items() if count > 0)
+
+
+def write_config(out, index, dependencies, producers=None, environment=None, tier=None):
+    if producers is None:
+        producers = find_producers(index)
+    out.write("# Generated by dependency_scan.py from the datasets each program reads and writes\n")
+    for task_id, entry in index.items():
+        out.write(f"\n[{task_id}]\n")
+        out.write(f"command: {entry['program']}\n")
+        if environment:
+            out.write(f"environment: {environment}\n")
+        if tier:
+            out.write(f"tier: {tier}\n")
+        if dependencies[task_id]:
+            out.write(f"depends: {','.join(dependencies[task_id])}\n")
+        # Only file paths are usable by multijob's rerun checks; library.member keys are left out. multijob makes
+        # the readers of an output depend on the one task listing it, so a dataset is only listed as an output
+        # of its single producer; datasets with several producers are covered by the depends lists.
+        inputs = [d for d in entry["reads"] if os.path.isabs(d)]
+        outputs = [d for d in entry["writes"] if os.path.isabs(d) and producers.get(d) == [task_id]]
+        if inputs:
+            out.write(f"input: {','.join(inputs)}\n")
+        if outputs:
+            out.write(f"output: {','.join(outputs)}\n")
+
+
+def main():
+    parser = ArgumentParser(description="Generate a multijob config file from the datasets that SAS and R programs read and write.")
+    parser.add_argument('patterns', nargs='*', default=DEFAULT_PATTERNS, metavar='PATTERN',
+                        help=f"glob patterns of programs to scan, relative to the repository root (default: {' '.join(DEFAULT_PATTERNS)})")
+    parser.add_argument('-x', '--exclude', action='append', metavar='PATTERN',
+                        help=f"glob pattern of programs to leave out; may be repeated (default: {' '.join(DEFAULT_EXCLUDES)})")
+    parser.add_argument('-o', '--output', metavar='PATH',
+                        help='path of the config file to write (default: standard output)')
+    parser.add_argument('--environment', help='environment id to set on every job')
+    parser.add_argument('--tier', help='hardware tier to set on every job')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, metavar='PATH',
+                        help=f"scan cache file, keyed on program content (default: {DEFAULT_CACHE_PATH}); pass an empty string to disable")
+    parser.add_argument('--json', action='store_true',
+                        help='write the read/write index and the inferred dependencies as JSON instead of a config file')
+    args = parser.parse_args()
+
+    programs = find_programs(args.patterns, DEFAULT_EXCLUDES if args.exclude is None else args.exclude)
+    if not programs:
+        logger.error("No programs matched")
+        exit(1)
+
+    cache = ScanCache(args.cache)
+    index = build_index(programs, cache, read_setup_libnames(os.path.join(REPO_ROOT, SETUP_PROGRAM)))
+    cache.save()
+    producers = find_producers(index)
+    dependencies = infer_dependencies(index, producers)
+
+    cycle_members = find_cycle_members(dependencies)
+    if cycle_members:
+        logger.warning(f"Programs on or downstream of a dependency cycle: {', '.join(cycle_members)}. "
+                       "Exclude one of the programs writing a shared dataset to break it.")
+    reduced = transitive_reduction(dependencies)
+    logger.info(f"Scanned {len(programs)} programs, inferred {sum(len(d) for d in reduced.values())} dependencies")
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.json:
+            json.dump({task_id: dict(entry, depends=reduced[task_id]) for task_id, entry in index.items()}, out, indent=2)
+            out.write("\n")
+        else:
+            write_config(out, index, reduced, producers, args.environment, args.tier)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
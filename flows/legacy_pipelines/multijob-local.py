@@ -12,7 +12,11 @@ the appropriate order.  Jobs without dependencies may run in parallel.
 from argparse import ArgumentParser
 import backoff
 import configparser
+import hashlib
+import heapq
+import itertools
 import logging
+import math
 import os
 import os.path
 from pathlib import Path
@@ -22,8 +26,14 @@ import pprint
 import logging
 import re
 import requests
+import selectors
+import shlex
+import signal
+import sqlite3
 import subprocess
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 from http import HTTPStatus
 
@@ -87,42 +97,393 @@ except KeyError:
 
 KEEP_EMPTY_LOGS = False
 FORCE_RERUN = False
+# What to do when a task's log matches a failure signature: "off", "warn", "fail" or "abort" (see LogWatcher)
+LOG_ERRORS = 'warn'
 
+# Task states in which there is nothing to poll; any other state means the job is in flight
+# Skipped marks tasks that a cancelled pipeline will not reach
+INACTIVE_STATUSES = ("Succeeded", "Unsubmitted", "Error", "Failed", "Stopped", "Skipped")
+FAILED_STATUSES = ("Error", "Failed")
 
-class LogThread(threading.Thread):
-    def __init__(self, task_id, in_pipe, log_file_path, is_error=False, add_timestamp=True):
-        super().__init__()
+
+class TaskLogs:
+    # The output and error logs of one local job, written by the LogMultiplexer
+    def __init__(self, task_id, process, out_log_path, err_log_path, add_timestamp, on_exit=None):
         self.task_id = task_id
-        self.in_pipe = in_pipe
-        self.log_file_path = log_file_path
-        self.is_error = is_error
-        t = "err" if is_error else "out"
-        logger_name = f'{__name__}.{task_id}.{t}'
-        self.logger = logging.getLogger(logger_name)
-        handler = logging.FileHandler(log_file_path, mode="w", encoding="utf8", delay=False)
-        handler.setLevel(logging.INFO)
-        if add_timestamp:
-            formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+        self.process = process
+        self.out_log_path = out_log_path
+        self.err_log_path = err_log_path
+        self.add_timestamp = add_timestamp
+        self.on_exit = on_exit  # called once both pipes are closed and the child process has exited
+        self.open_streams = 2
+        self.done = threading.Event()
+
+    def wait(self):
+        self.done.wait()
+
+
+class LogMultiplexer(threading.Thread):
+    """
+    Drains the stdout and stderr pipes of every local job from a single thread, so the logging overhead stays
+    flat however many jobs run in parallel. Pipes are read with large non-blocking reads as soon as the selector
+    reports data, which keeps chatty jobs from blocking on a full pipe, and lines are written to buffered log
+    files that are flushed at most once per LOG_FLUSH_INTERVAL. With timestamps, each line is prefixed like the
+    logging module would ("2024-01-31 12:00:00,123 INFO "), using one timestamp for all lines of a read.
+
+    An error reading a pipe or writing a log file only closes that stream: the other jobs keep being drained, and the
+    done event of the job is still set once it exits.
+    """
+    READ_SIZE = 64 * 1024
+    FILE_BUFFER_SIZE = 256 * 1024
+    # A line longer than this is written out in pieces rather than buffered until its newline
+    MAX_LINE_LENGTH = 1024 * 1024
+    LOG_FLUSH_INTERVAL = 1
+    # Poll interval for jobs whose pipes are closed but whose exit status is not available yet
+    EXIT_POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        super().__init__(name="log-multiplexer", daemon=True)
+        self.selector = selectors.DefaultSelector()
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        # Registrations from other threads are queued and signalled through this pipe, so the selector is only
+        # ever touched by the multiplexer thread
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ)
+        self.dirty_files = set()
+        self.exiting = []  # TaskLogs whose pipes are closed, waiting for the process exit status
+        self.last_second = None
+        self.second_prefix = ""
+
+    def add(self, logs):
+        # The log files are opened here, so a failure to create them is raised to the caller
+        streams = []
+        for pipe, path, level in ((logs.process.stdout, logs.out_log_path, b"INFO"),
+                                  (logs.process.stderr, logs.err_log_path, b"ERROR")):
+            os.set_blocking(pipe.fileno(), False)
+            streams.append({"logs": logs, "pipe": pipe, "path": path, "level": level, "tail": b"",
+                            "file": open(path, "wb", buffering=self.FILE_BUFFER_SIZE)})
+        with self.pending_lock:
+            self.pending.extend(streams)
+        os.write(self.wakeup_write, b"\0")
+
+    def timestamp(self):
+        now = time.time()
+        second = int(now)
+        if second != self.last_second:
+            self.last_second = second
+            self.second_prefix = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return f"{self.second_prefix},{int((now - second) * 1000):03d}"
+
+    def register_pending(self):
+        os.read(self.wakeup_read, 4096)
+        with self.pending_lock:
+            pending, self.pending = self.pending, []
+        for stream in pending:
+            try:
+                self.selector.register(stream["pipe"].fileno(), selectors.EVENT_READ, stream)
+            except (OSError, ValueError) as e:
+                logger.error(f"{stream['logs'].task_id}: Could not read the output for {stream['path']}: {e}")
+                self.close_stream(stream["pipe"], stream)
+
+    def write_lines(self, stream, data, final=False):
+        data = stream["tail"] + data
+        if final:
+            lines, stream["tail"] = data, b""
         else:
-            formatter = logging.Formatter('%(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
-        self.logger.propagate = False
+            end = data.rfind(b"\n") + 1
+            if end == 0 and len(data) > self.MAX_LINE_LENGTH:
+                end = len(data)
+            lines, stream["tail"] = data[:end], data[end:]
+        if not lines:
+            return
+        if LOG_WATCHER is not None:
+            LOG_WATCHER.scan(stream["logs"].task_id, stream["path"], lines)
+        if stream["logs"].add_timestamp:
+            prefix = f"{self.timestamp()} ".encode() + stream["level"] + b" "
+            lines = prefix + lines.replace(b"\n", b"\n" + prefix)
+            if lines.endswith(prefix):
+                lines = lines[:-len(prefix)]
+        if not lines.endswith(b"\n"):
+            lines += b"\n"
+        stream["file"].write(lines)
+        self.dirty_files.add(stream["file"])
+
+    def close_stream(self, fd, stream):
+        # Also called after a stream failed, so every step goes ahead even if an earlier one raised, and the stream
+        # always counts as closed
+        try:
+            self.write_lines(stream, b"", final=True)
+        except Exception as e:
+            logger.error(f"{stream['logs'].task_id}: Could not write {stream['path']}: {e}")
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+        for resource in (stream["pipe"], stream["file"]):
+            try:
+                resource.close()
+            except Exception as e:
+                logger.error(f"{stream['logs'].task_id}: Could not close the stream for {stream['path']}: {e}")
+        self.dirty_files.discard(stream["file"])
+        logs = stream["logs"]
+        logs.open_streams -= 1
+        if logs.open_streams == 0:
+            self.exiting.append(logs)
+
+    def check_exits(self):
+        # The pipes close just before the exit status is available, so signal only once the process has exited
+        for logs in list(self.exiting):
+            try:
+                exited = reap_process(logs.process) is not None
+            except Exception as e:
+                logger.error(f"{logs.task_id}: Could not get the exit status of the command: {e}")
+                exited = True
+            if exited:
+                self.exiting.remove(logs)
+                logs.done.set()
+                if logs.on_exit is not None:
+                    try:
+                        logs.on_exit()
+                    except Exception as e:
+                        logger.error(f"{logs.task_id}: Exit callback failed: {e}")
 
     def run(self):
-        t = "error" if self.is_error else "output"
-        logger.debug(f"Started {t} logging thread for {self.task_id}")
-        with self.in_pipe:
-            for line in iter(self.in_pipe.readline, b''):  # b'\n'-separated lines
-                if self.is_error:
-                    self.logger.error(line.decode().rstrip())
-                else:
-                    self.logger.info(line.decode().rstrip())
-        logger.debug(f"Terminating {t} logging thread for {self.task_id}")
-        self.logger.handlers.clear()
+        last_flush = time.monotonic()
+        while True:
+            timeout = self.EXIT_POLL_INTERVAL if self.exiting else self.LOG_FLUSH_INTERVAL
+            for key, _ in self.selector.select(timeout):
+                if key.fd == self.wakeup_read:
+                    self.register_pending()
+                    continue
+                try:
+                    data = os.read(key.fd, self.READ_SIZE)
+                    if data:
+                        self.write_lines(key.data, data)
+                        continue
+                except BlockingIOError:
+                    continue
+                except Exception as e:
+                    logger.error(f"{key.data['logs'].task_id}: Stopped logging {key.data['path']}: {e}")
+                    key.data["tail"] = b""
+                self.close_stream(key.fd, key.data)
+            self.check_exits()
+            if LOG_WATCHER is not None:
+                try:
+                    LOG_WATCHER.poll_files()
+                except Exception as e:
+                    logger.error(f"Could not scan the program logs: {e}")
+            if self.dirty_files and time.monotonic() - last_flush >= self.LOG_FLUSH_INTERVAL:
+                for file in self.dirty_files:
+                    try:
+                        file.flush()
+                    except Exception as e:
+                        logger.error(f"Could not write {file.name}: {e}")
+                self.dirty_files.clear()
+                last_flush = time.monotonic()
+
+
+LOG_MULTIPLEXER = None
+LOG_WATCHER = None
+
+
+def get_log_multiplexer():
+    global LOG_MULTIPLEXER
+    if LOG_MULTIPLEXER is None:
+        LOG_MULTIPLEXER = LogMultiplexer()
+        LOG_MULTIPLEXER.start()
+    return LOG_MULTIPLEXER
+
+
+# Log lines that mean a SAS or R program failed, whatever its exit code. SAS exits with 1 on warnings, which
+# multijob accepts, and also when a program reports its own errors with %put ERROR: and carries on.
+DEFAULT_LOG_SIGNATURES = [
+    r'^ERROR( \d+-\d+)?:',  # SAS errors, including syntax errors such as "ERROR 180-322:"
+    r'^FATAL:',
+    r'^Error( in .*)?:',  # R errors: "Error in f(x) : ..." and "Error: ..."
+    r'^Execution halted',
+]
 
 
-def extract_program_name(command_line):
+def read_log_signatures(path):
+    # One regular expression per line; blank lines and lines starting with # are ignored
+    with open(path, 'r') as file:
+        return [line.rstrip('\n') for line in file if line.strip() and not line.startswith('#')]
+
+
+class LogFileTail:
+    """
+    Reads what was appended to a log file since the last call. A log that is rewritten rather than appended to,
+    as SAS does with PROC PRINTTO NEW, is recognised by its first bytes changing and is read from the start.
+    """
+    HEAD_SIZE = 256
+    MAX_READ_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.head = b""
+        self.tail = b""
+        # Content from before the task started is skipped
+        try:
+            with open(path, 'rb') as file:
+                self.inode = os.fstat(file.fileno()).st_ino
+                self.head = file.read(self.HEAD_SIZE)
+                self.offset = os.fstat(file.fileno()).st_size
+        except OSError:
+            pass
+
+    def read_lines(self, final=False):
+        # Complete lines appended since the last call, plus the incomplete last line when final
+        try:
+            with open(self.path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                head = file.read(self.HEAD_SIZE)
+                if stat.st_ino != self.inode or stat.st_size < self.offset or head[:len(self.head)] != self.head[:len(head)]:
+                    self.offset, self.tail = 0, b""
+                self.inode, self.head = stat.st_ino, head
+                file.seek(self.offset)
+                data = self.tail + file.read(self.MAX_READ_SIZE)
+        except OSError:
+            return b""
+        self.offset += len(data) - len(self.tail)
+        end = len(data) if final else data.rfind(b"\n") + 1
+        lines, self.tail = data[:end], data[end:]
+        return lines
+
+
+class LogWatcher:
+    """
+    Matches the logs of running tasks against failure signatures, so a failing program is noticed at its first
+    error rather than when it ends. The signatures are combined into a single regular expression, so each log
+    chunk is scanned once however many signatures there are.
+
+    Local jobs are scanned as the log multiplexer reads their output, and their program logs (the SAS log written
+    by PROC PRINTTO, the logrx log of R programs) are tailed about once a second. With LOG_ERRORS "fail" or "abort",
+    remote jobs are polled through the Domino job logs API every REMOTE_POLL_INTERVAL seconds; this only covers
+    what the job prints to stdout. The API returns the whole log each time, so only the lines added since the last
+    poll are scanned.
+
+    The first match of each task attempt is queued for the runner, which acts on it according to LOG_ERRORS:
+    "warn" only reports it, "fail" also fails the task when it ends, whatever its exit code, and blocks the tasks
+    that depend on it, and "abort" also stops the job at once.
+
+    self.pattern        # compiled alternation of all signatures, matching bytes
+    self.files          # task_id -> LogFileTail of each program log of a running local task
+    self.matches        # task_id -> (source, line) of the first match of the current attempt
+    self.pending        # matches not taken by the runner yet
+    self.on_match       # called from the thread that found a match, e.g. to wake the runner
+    """
+    FILE_POLL_INTERVAL = 1
+    REMOTE_POLL_INTERVAL = 30
+
+    def __init__(self, signatures, on_match=None):
+        self.pattern = re.compile(b'|'.join(b'(?:' + s.encode() + b')' for s in signatures), re.MULTILINE)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.matches = {}
+        self.pending = []
+        self.on_match = on_match
+        self.last_file_poll = 0
+        self.remote_offsets = {}  # job_id -> characters of the log already scanned, up to the last complete line
+        self.remote_polled = {}  # job_id -> time of the last poll
+
+    def start(self, task_id, log_paths):
+        # A new attempt of a task: forget the matches of earlier attempts and start tailing its program logs
+        with self.lock:
+            self.matches.pop(task_id, None)
+            self.files[task_id] = [LogFileTail(path) for path in log_paths]
+
+    def scan(self, task_id, source, data):
+        match = self.pattern.search(data)
+        if match is None:
+            return
+        end = data.find(b"\n", match.start())
+        line = data[match.start():end if end >= 0 else len(data)].decode(errors='replace').rstrip()
+        with self.lock:
+            if task_id in self.matches:
+                return
+            self.matches[task_id] = (source, line)
+            self.pending.append((task_id, source, line))
+        if self.on_match is not None:
+            self.on_match()
+
+    def poll_files(self):
+        if time.monotonic() - self.last_file_poll < self.FILE_POLL_INTERVAL:
+            return
+        self.last_file_poll = time.monotonic()
+        with self.lock:
+            files = [(task_id, tail) for task_id, tails in self.files.items() for tail in tails]
+        for task_id, tail in files:
+            lines = tail.read_lines()
+            if lines:
+                self.scan(task_id, tail.path, lines)
+
+    def finish(self, task_id):
+        # Scan what the program logs of a finished local task gained since the last poll. Returns the first match.
+        with self.lock:
+            tails = self.files.pop(task_id, [])
+        for tail in tails:
+            lines = tail.read_lines(final=True)
+            if lines:
+                self.scan(task_id, tail.path, lines)
+        with self.lock:
+            return self.matches.get(task_id)
+
+    def poll_remote(self, tasks, force=False):
+        # Scan the new stdout lines of remote jobs that were not polled for REMOTE_POLL_INTERVAL seconds. With force,
+        # which is used once a job has ended, the incomplete last line is scanned too.
+        now = time.monotonic()
+        due = [task for task in tasks if force or now - self.remote_polled.get(task.job_id, 0) >= self.REMOTE_POLL_INTERVAL]
+        for task in due:
+            self.remote_polled[task.job_id] = now
+        def read_log(job_id):
+            try:
+                return get_job_log(job_id)
+            except Exception as e:
+                return e
+        for task, log in zip(due, run_concurrently(read_log, [(task.job_id, ) for task in due])):
+            if isinstance(log, Exception):
+                logger.debug(f"{task.task_id}: Could not read the log of job {task.job_id}: {log}")
+                continue
+            offset = self.remote_offsets.get(task.job_id, 0)
+            if len(log) < offset:
+                # Not the log that was scanned before, so all of it is new
+                offset = 0
+            end = len(log) if force else log.rfind('\n', offset) + 1
+            if end > offset:
+                self.remote_offsets[task.job_id] = end
+                self.scan(task.task_id, f"job {task.job_id}", log[offset:end].encode())
+
+    def match(self, task_id):
+        with self.lock:
+            return self.matches.get(task_id)
+
+    def take_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+
+def get_program_log_paths(command, log_path):
+    # Where the log of a SAS or R program run in batch ends up. SAS writes <program>.log to the working directory
+    # until domino.sas redirects it to the results directory; logrx writes it to the multijob log directory.
+    program_name = extract_program_name(command)
+    base_name, extension = os.path.splitext(program_name)
+    if extension.lower() == '.sas':
+        if DOMINO_IS_GIT_BASED == 'true':
+            results_path = '/mnt/artifacts/results'
+        else:
+            results_path = os.path.join(os.environ.get('DOMINO_WORKING_DIR', os.getcwd()), 'results')
+        return [os.path.join(os.getcwd(), f'{base_name}.log'), os.path.join(results_path, f'{base_name}.log')]
+    if extension.lower() == '.r' and log_path:
+        return [os.path.join(log_path, f'{base_name}.log')]
+    return []
+
+
+def extract_program_path(command_line):
     # Split the command line into parts
     parts = command_line.split()
 
@@ -131,7 +492,11 @@ def extract_program_name(command_line):
         parts = parts[1:]
 
     # The first part is the program name with its path
-    program_with_path = parts[0]
+    return parts[0]
+
+
+def extract_program_name(command_line):
+    program_with_path = extract_program_path(command_line)
 
     # Split the program_with_path into path and program name
     path_parts = program_with_path.split('/')
@@ -142,18 +507,233 @@ def extract_program_name(command_line):
     return program_name
 
 
-def start_background_job(task, command, out_log_path, err_log_path, add_timestamp):
+REAP_LOCK = threading.Lock()
+
+
+def reap_process(process):
+    """
+    Same as process.poll(), but reaps the process with wait4 so that its peak RSS, including the descendants it
+    waited for, is available as process.peak_rss (in bytes). Called from the runner and the log multiplexer.
+    """
+    with REAP_LOCK:
+        if process.returncode is None:
+            try:
+                pid, wait_status, rusage = os.wait4(process.pid, os.WNOHANG)
+            except ChildProcessError:
+                return process.poll()
+            if pid == 0:
+                return None
+            process.returncode = os.waitstatus_to_exitcode(wait_status)
+            process.peak_rss = rusage.ru_maxrss * 1024  # ru_maxrss is in kilobytes on Linux
+        return process.returncode
+
+
+def start_background_job(task, command, out_log_path, err_log_path, add_timestamp, on_exit=None):
     logger.info(f'{task}: Starting command: {command}')
 
-    # Launch the command as a background job
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # Launch the command as a background job in its own session, so that the job and everything it starts
+    # form one process group that can be signalled as a whole
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+
+    logs = TaskLogs(task, process, out_log_path, err_log_path, add_timestamp, on_exit)
+    try:
+        get_log_multiplexer().add(logs)
+    except BaseException:
+        # Nothing would drain the job's pipes and the caller has no process to stop, so the job is not left running
+        logger.error(f'{task}: Could not open the logs {out_log_path} and {err_log_path}, stopping the command')
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+        raise
+    return process, logs
+
+
+MEMORY_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_memory(value):
+    # "512M", "4G", "1.5G" or a plain number of megabytes, in bytes
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in MEMORY_UNITS:
+        return int(float(value[:-1]) * MEMORY_UNITS[value[-1]])
+    return int(float(value) * MEMORY_UNITS['M'])
+
+
+def format_memory(value):
+    if value < MEMORY_UNITS['G']:
+        return f"{value / MEMORY_UNITS['M']:.0f} MB"
+    return f"{value / MEMORY_UNITS['G']:.1f} GB"
+
+
+def read_first_line(path):
+    try:
+        with open(path, 'r') as file:
+            return file.readline().strip()
+    except OSError:
+        return None
+
+
+def read_meminfo():
+    # /proc/meminfo values in bytes
+    meminfo = {}
+    with open('/proc/meminfo', 'r') as file:
+        for line in file:
+            name, _, value = line.partition(':')
+            parts = value.split()
+            if parts:
+                meminfo[name] = int(parts[0]) * (1024 if len(parts) > 1 else 1)
+    return meminfo
+
+
+def read_cgroup_memory():
+    # (limit, usage) in bytes of the cgroup this process runs in, or (None, None) without a memory limit.
+    # Workspaces run in containers, where /proc/meminfo shows the memory of the whole node.
+    for limit_path, usage_path in (('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+                                   ('/sys/fs/cgroup/memory/memory.limit_in_bytes', '/sys/fs/cgroup/memory/memory.usage_in_bytes')):
+        limit, usage = read_first_line(limit_path), read_first_line(usage_path)
+        if limit and usage and limit.isdigit() and int(limit) < 2 ** 60:
+            return int(limit), int(usage)
+    return None, None
+
+
+def read_available_cpus():
+    # CPUs this process may run on, reduced to the container's CPU quota when there is one
+    cpus = len(os.sched_getaffinity(0))
+    quota = read_first_line('/sys/fs/cgroup/cpu.max')  # cgroup v2: "<quota> <period>" or "max <period>"
+    if quota and not quota.startswith('max'):
+        limit, period = (int(x) for x in quota.split())
+        cpus = min(cpus, max(1, -(-limit // period)))
+    else:
+        limit = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if limit and period and int(limit) > 0:
+            cpus = min(cpus, max(1, -(-int(limit) // int(period))))
+    return cpus
+
+
+def read_process_group_rss():
+    # Resident memory in bytes of every process group, summed over its processes
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    rss = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat', 'r') as file:
+                # the command name in parentheses may contain spaces, so split after it
+                fields = file.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        pgid = int(fields[2])
+        rss[pgid] = rss.get(pgid, 0) + int(fields[21]) * page_size
+    return rss
 
-    out_thread = LogThread(task, process.stdout, out_log_path, False, add_timestamp)
-    out_thread.start()
-    err_thread = LogThread(task, process.stderr, err_log_path, True, add_timestamp)
-    err_thread.start()
 
-    return process, out_thread, err_thread
+class LocalExecutor:
+    """
+    Decides which ready tasks to start locally, so a workspace stays busy without running out of memory.
+
+    Each task asks for the CPUs in its "cpus" option and the memory in its "mem" option, e.g. "cpus: 4" and
+    "mem: 6G". A task without "cpus" is not counted against the CPUs, so only -j and its memory bound how many such
+    tasks run side by side; set "cpus" on multi-threaded tasks to keep them from oversubscribing the CPUs. Without
+    "mem", the largest peak RSS of the task's earlier successful local runs is used, or DEFAULT_TASK_MEMORY for a
+    task without history. A ready task is started when its CPUs fit next to the CPUs of the running tasks, and its
+    memory fits into the available memory (from /proc/meminfo and the container's cgroup limit) minus the memory
+    that running tasks are expected to allocate but have not allocated yet. Lower priority tasks that fit may start
+    ahead of a higher priority task that does not. A task is always started when nothing else runs, however large
+    it is.
+
+    self.cpus           # CPUs available to local jobs
+    self.task_memory    # memory estimates of tasks without a "mem" option, by task id
+    self.waiting        # ids of tasks that were logged as waiting for resources
+    """
+    DEFAULT_TASK_MEMORY = 1024 ** 3
+    # Fraction of the memory limit that is kept free for the runner, the file cache and estimation errors
+    MEMORY_RESERVE = 0.05
+    # Seconds between SIGTERM and SIGKILL when local jobs are cancelled
+    TERMINATE_GRACE_PERIOD = 10
+
+    def __init__(self, task_memory=None):
+        self.cpus = read_available_cpus()
+        self.task_memory = task_memory or {}
+        self.waiting = set()
+        logger.info(f"Local jobs may use {self.cpus} CPUs and {format_memory(self.memory_limit())} of memory")
+
+    def task_cpus(self, task):
+        return task.cpus if task.cpus is not None else 0
+
+    def task_mem(self, task):
+        if task.mem is not None:
+            return task.mem
+        return self.task_memory.get(task.task_id, self.DEFAULT_TASK_MEMORY)
+
+    def memory_limit(self):
+        limit, _ = read_cgroup_memory()
+        total = read_meminfo()['MemTotal']
+        return min(limit, total) if limit is not None else total
+
+    def available_memory(self):
+        meminfo = read_meminfo()
+        available = meminfo.get('MemAvailable', meminfo['MemFree'])
+        limit, usage = read_cgroup_memory()
+        if limit is not None:
+            available = min(available, limit - usage)
+        return available
+
+    def admit(self, ready_tasks, running_tasks, slots):
+        # The ready tasks, in priority order, that can start now next to the running tasks
+        free_cpus = self.cpus - sum(self.task_cpus(task) for task in running_tasks)
+        free_mem = self.available_memory() - self.MEMORY_RESERVE * self.memory_limit()
+        if running_tasks:
+            # A job that has not reached its expected size yet will take more of the available memory
+            rss = read_process_group_rss()
+            free_mem -= sum(max(0, self.task_mem(task) - rss.get(task.process.pid, 0)) for task in running_tasks)
+        admitted = []
+        for task in ready_tasks:
+            if len(admitted) >= slots:
+                break
+            cpus, mem = self.task_cpus(task), self.task_mem(task)
+            if (running_tasks or admitted) and (cpus > free_cpus or mem > free_mem):
+                if task.task_id not in self.waiting:
+                    self.waiting.add(task.task_id)
+                    logger.info(f"{task.task_id}: Waiting for {cpus:g} CPUs and {format_memory(mem)} of memory "
+                                f"({max(free_cpus, 0):g} CPUs and {format_memory(max(free_mem, 0))} free)")
+                continue
+            self.waiting.discard(task.task_id)
+            admitted.append(task)
+            free_cpus -= cpus
+            free_mem -= mem
+        return admitted
+
+    def stop(self, task):
+        # Ask a running local task to stop; its exit is picked up like any other
+        try:
+            os.killpg(task.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def terminate(self, tasks):
+        # Stop the process groups of running local tasks: SIGTERM first, then SIGKILL for any still running
+        # after TERMINATE_GRACE_PERIOD
+        processes = [task.process for task in tasks if task.process is not None]
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            processes = [process for process in processes if reap_process(process) is None]
+            for process in processes:
+                logger.info(f"Sending {sig.name} to process group {process.pid}")
+                try:
+                    os.killpg(process.pid, sig)
+                except ProcessLookupError:
+                    pass
+            deadline = time.monotonic() + self.TERMINATE_GRACE_PERIOD
+            while processes and time.monotonic() < deadline:
+                processes = [process for process in processes if reap_process(process) is None]
+                time.sleep(0.1)
+            if not processes:
+                break
 
 
 class DominoRun:
@@ -171,10 +751,25 @@ class DominoRun:
     once submitted, it polls status, and retries (submits re-runs) up to max_retries
 
     self.process        # the Popen object for tracking locally run jobs
+    self.logs           # the TaskLogs of a locally run job, written by the LogMultiplexer
+    self.returncode     # exit code of the last local run
+    self.peak_rss       # peak resident memory in bytes of the last local run
+    self.cpus           # CPUs a local run needs, from the "cpus" option
+    self.mem            # memory in bytes a local run needs, from the "mem" option
+    self.log_paths      # program log files watched for failure signatures, from the "log" option or inferred
+    self.log_match      # (source, line) of the first failure signature in the logs of the last attempt
+    self.source_command # command as written in the config; self.command becomes the command that is launched
+    self.batchable      # whether --batch may run the task in a BatchJob with others, from the "batch" option
+    self.batch          # the BatchJob the last attempt ran in, or None
+    self.start_time     # time the current attempt was submitted
+    self.run_start_time # time the current attempt started running, after any time queued
+    self.on_status_change  # callback(task, old_status, new_status), set by the Dag that owns the task
+    self.status_cache   # JobStatusCache serving remote job statuses, set by the Dag that owns the task
     """
-    def __init__(self, task_id, command, inputs, outputs, max_retries=0, tier=None, environment=None, project_repo_git_ref=None, imported_repo_git_refs=None):
+    def __init__(self, task_id, command, inputs, outputs, max_retries=0, tier=None, environment=None, project_repo_git_ref=None, imported_repo_git_refs=None, cpus=None, mem=None, log_paths=None, batchable=True):
         self.task_id = task_id
         self.command = command
+        self.source_command = command
         self.inputs = inputs
         self.outputs = outputs
         self.max_retries = max_retries
@@ -182,70 +777,108 @@ class DominoRun:
         self.environment = environment
         self.project_repo_git_ref = project_repo_git_ref
         self.imported_repo_git_refs = imported_repo_git_refs
+        self.cpus = cpus
+        self.mem = mem
+        self.log_paths = log_paths
+        self.log_match = None
+        self.batchable = batchable
+        self.batch = None
         self.job_id = None
         self.retries = 0
         self._status = "Unsubmitted"
         self.process = None
         self.success_codes = (0, )
-        self.out_thread = None
-        self.err_thread = None
+        self.logs = None
         self.start_time = None
+        self.run_start_time = None
+        self.returncode = None
+        self.peak_rss = None
+        self.on_status_change = None
+        self.status_cache = None
 
     def status(self):
         global KEEP_EMPTY_LOGS
         if self.process is None and self.job_id is not None:
             # call Domino to get the job status
-            if self._status not in ("Succeeded", "Unsubmitted", "Error", "Failed", "Stopped"):
-                job_status = get_job_status(self.job_id)
-                self.set_status(job_status)
-                if self._status == 'Succeeded':
+            if self._status not in INACTIVE_STATUSES:
+                if self.status_cache is not None:
+                    job_status = self.status_cache.get(self.job_id)
+                else:
+                    job_status = get_job_status(self.job_id)
+                if self.batch is not None and job_status in ('Succeeded', 'Stopped') + FAILED_STATUSES:
+                    # The tasks of a batch share its job, which only ends once all of them have ended
+                    job_status = self.batch.task_status(self.task_id, job_status)
+                elif job_status == 'Succeeded' and LOG_WATCHER is not None and LOG_ERRORS in ('fail', 'abort'):
+                    # The log is only polled now and then, so read the end of it before accepting the result
+                    LOG_WATCHER.poll_remote([self], force=True)
+                    self.log_match = LOG_WATCHER.match(self.task_id)
+                    job_status = self.check_log_match(job_status)
+                if job_status == 'Succeeded':
                     # If the job succeeded, touch the output files.  This is done to work around file
                     # attribute caching in NFS which causes the update to the file done in the remote
                     # job not to be seen right away by other NFS clients of the same file system.
+                    # It is done before the status change so the output digests are recorded afterwards.
                     for output in self.outputs:
                         Path(output).touch()
+                self.set_status(job_status)
         elif self.process is not None:
             # check the status of local process
-            returncode = self.process.poll()
+            returncode = reap_process(self.process)
             if returncode is not None:
-                # handle local process completion
+                # handle local process completion once all of its output has been read and scanned
+                self.logs.wait()
                 job_status = "Succeeded" if returncode in self.success_codes else 'Failed'
+                self.returncode = returncode
+                self.peak_rss = getattr(self.process, 'peak_rss', None)
                 if job_status == "Succeeded":
                     logger.info(f"{self.task_id}: Command {job_status.lower()} with exit code {returncode}")
                 else:
                     logger.error(f"{self.task_id}: Command {job_status.lower()} with exit code {returncode}")
+                if LOG_WATCHER is not None:
+                    self.log_match = LOG_WATCHER.finish(self.task_id)
+                    job_status = self.check_log_match(job_status)
                 self.set_status(job_status)
                 self.process = None
-                self.out_thread.join()
-                self.err_thread.join()
                 task_duration = time.time() - self.start_time
                 logger.info(f"{self.task_id}: Completed in {task_duration:.2f} seconds.")
 
                 # remove empty log files, unless --keep option is set
-                if os.path.getsize(self.out_thread.log_file_path) == 0 and not KEEP_EMPTY_LOGS:
-                    logger.info(f"{self.task_id}: Removing empty log file {self.out_thread.log_file_path}")
-                    os.remove(self.out_thread.log_file_path)
+                if os.path.getsize(self.logs.out_log_path) == 0 and not KEEP_EMPTY_LOGS:
+                    logger.info(f"{self.task_id}: Removing empty log file {self.logs.out_log_path}")
+                    os.remove(self.logs.out_log_path)
                 else:
-                    logger.info(f"{self.task_id}: Output log {self.out_thread.log_file_path}")
+                    logger.info(f"{self.task_id}: Output log {self.logs.out_log_path}")
 
-                if os.path.getsize(self.err_thread.log_file_path) == 0 and not KEEP_EMPTY_LOGS:
-                    logger.info(f"{self.task_id}: Removing empty log file {self.err_thread.log_file_path}")
-                    os.remove(self.err_thread.log_file_path)
+                if os.path.getsize(self.logs.err_log_path) == 0 and not KEEP_EMPTY_LOGS:
+                    logger.info(f"{self.task_id}: Removing empty log file {self.logs.err_log_path}")
+                    os.remove(self.logs.err_log_path)
                 else:
-                    logger.info(f"{self.task_id}: Error log {self.err_thread.log_file_path}")
+                    logger.info(f"{self.task_id}: Error log {self.logs.err_log_path}")
 
-                self.out_thread = None
-                self.err_thread = None
+                self.logs = None
             else:
                 # local process is still running
                 self.set_status('Submitted')
 
         return self._status
 
+    def check_log_match(self, job_status):
+        # With --log-errors fail or abort, a task whose log matched a failure signature fails whatever its exit code
+        if job_status == 'Succeeded' and self.log_match is not None and LOG_ERRORS in ('fail', 'abort'):
+            source, line = self.log_match
+            logger.error(f"{self.task_id}: Failing the task because {source} contains: {line}")
+            return 'Failed'
+        return job_status
+
     def set_status(self, status):
+        old_status = self._status
         self._status = status
-        if self.start_time is None and self._status not in ("Succeeded", "Unsubmitted", "Error", "Failed", "Stopped"):
+        if self.start_time is None and self._status not in INACTIVE_STATUSES:
             self.start_time = time.time()
+        if self.run_start_time is None and self._status == 'Running':
+            self.run_start_time = time.time()
+        if old_status != status and self.on_status_change is not None:
+            self.on_status_change(self, old_status, status)
 
     def is_complete(self):
         return self.status() == "Succeeded"
@@ -254,110 +887,458 @@ class DominoRun:
         return f"Task '{self.task_id}' with status '{self._status}' for command '{self.command}'"
 
 
+class BatchJob:
+    """
+    Ready leaf tasks that run together in one Domino Job, so that they share one job startup. The job runs this
+    script with --local --batch-job on a config of just these tasks: they run side by side inside the job, write
+    their logs where local runs write them, and the journal of that inner run tells how each of them ended.
+
+    self.tasks          # the DominoRun objects of the batch
+    self.task_id        # name of the batch, used as the job title
+    self.directory      # directory for the config and the state files of the inner run, on the project dataset
+    self.cfg_path       # config of the inner run
+    self.job_id         # ID of the Domino Job running the batch
+    self.results        # dictionary of task_id -> last status in the inner journal, read once the job has ended
+
+    The environment, hardware tier and git refs of the job are those of its tasks, which all have the same.
+    """
+    def __init__(self, directory, tasks=()):
+        self.tasks = list(tasks)
+        self.directory = directory
+        self.cfg_path = os.path.join(directory, 'batch.cfg')
+        self.task_id = f"{os.path.basename(directory)} ({', '.join(task.task_id for task in self.tasks)})"
+        self.job_id = None
+        self.results = None
+        first = self.tasks[0] if self.tasks else None
+        self.tier = first and first.tier
+        self.environment = first and first.environment
+        self.project_repo_git_ref = first and first.project_repo_git_ref
+        self.imported_repo_git_refs = first and first.imported_repo_git_refs
+
+    def write_config(self):
+        c = configparser.ConfigParser()
+        for task in self.tasks:
+            options = {'command': task.source_command}
+            if task.inputs:
+                options['input'] = ', '.join(task.inputs)
+            if task.outputs:
+                options['output'] = ', '.join(task.outputs)
+            if task.cpus is not None:
+                options['cpus'] = f"{task.cpus:g}"
+            if task.mem is not None:
+                options['mem'] = f"{task.mem // MEMORY_UNITS['K']}K"
+            if task.log_paths:
+                options['log'] = ', '.join(task.log_paths)
+            # values were interpolated when the outer config was read
+            c[task.task_id] = {name: value.replace('%', '%%') for name, value in options.items()}
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.cfg_path, 'w') as f:
+            c.write(f)
+
+    def command(self, options):
+        # The repository is mounted at the same path in the workspace and in the job
+        script = os.path.abspath(__file__)
+        args = ['python3', script, self.cfg_path, '--local', '-j', str(len(self.tasks)), '--force', '--batch-job',
+                '--state-dir', self.directory] + options
+        return ' '.join(shlex.quote(arg) for arg in args)
+
+    def task_status(self, task_id, job_status):
+        # How a task of the batch ended, once the batch job has ended with job_status
+        if self.results is None:
+            journal = RunJournal(get_state_file_path(self.directory, self.cfg_path, 'journal.jsonl'), None)
+            _, entries = journal.last_run()
+            self.results = {entry_task_id: entry['status'] for entry_task_id, entry in entries.items()}
+        if self.results.get(task_id) == 'Succeeded':
+            return 'Succeeded'
+        # The job succeeds or fails as a whole, but a task that did not succeed in it failed either way
+        return job_status if job_status != 'Succeeded' else 'Failed'
+
+
 class Dag:
     """
     self.tasks              # dictionary of task_ids -> DominoRun objects
     self.dependency_graph   # dictionary of task_ids -> list of dependency task_ids
+    self.dependents         # dictionary of task_ids -> list of task_ids that depend on it
+    self.pending_deps       # dictionary of task_ids -> number of dependencies not yet Succeeded (in-degree)
+    self.ready_queue        # dictionary of task_ids that can be submitted -> sequence number of their ready_heap entry
+    self.ready_heap         # heap of (-priority, sequence, task_id); entries whose sequence no longer matches ready_queue are stale
+    self.priorities         # dictionary of task_ids -> longest expected run time from the task to the end of the graph
+    self.task_order         # list of task_ids in topological order (dependencies first), set by validate_dag()
+    self.active_tasks       # set of task_ids that are in flight; only these are polled for status
+    self.failed_tasks       # set of task_ids that failed with no retries left
+    self.blocked_tasks      # dictionary of task_ids -> task_id whose log matched a failure signature, upstream of them
+    self.succeeded_count    # number of tasks in Succeeded state
+    self.status_cache       # JobStatusCache shared by all tasks, refreshed once per scheduling step
+    self.manifest           # optional RunManifest of content digests used by is_rerun_required()
+    self.journal            # optional RunJournal that every task state transition is written to
+    self.history            # optional TaskHistory that the timing of every finished attempt is written to
+
+    The bookkeeping is updated by task_status_changed() whenever a task changes state, so a
+    scheduling step costs work proportional to the number of changed tasks rather than the graph size.
     """
     def __init__(self, tasks, dependency_graph, allow_partial_failure=False):
         self.tasks = tasks
         self.dependency_graph = dependency_graph
         self.allow_partial_failure = allow_partial_failure
+        self.dependents = {task_id: [] for task_id in tasks}
+        self.pending_deps = {}
+        self.ready_queue = {}
+        self.ready_heap = []
+        self.priorities = {task_id: 0 for task_id in tasks}
+        self.sequence = itertools.count()
+        self.task_order = None  # topological order, set by validate_dag()
+        self.unchecked_tasks = {}  # ordered set of ready task_ids that still need the rerun check
+        self.active_tasks = set()
+        self.failed_tasks = set()
+        self.blocked_tasks = {}
+        self.succeeded_count = 0
+        self.status_cache = JobStatusCache()
+        self.manifest = None
+        self.journal = None
+        self.history = None
+
+        for task_id, deps in dependency_graph.items():
+            deps = list(dict.fromkeys(deps))  # ignore duplicate entries
+            # unknown dependencies are never satisfied; validate_dag() reports them
+            self.pending_deps[task_id] = len(deps)
+            for dep in deps:
+                if dep in self.dependents:
+                    self.dependents[dep].append(task_id)
+        for task_id, task in tasks.items():
+            task.on_status_change = self.task_status_changed
+            task.status_cache = self.status_cache
+            self.task_status_changed(task, "Unsubmitted", task._status, initial=True)
+
+    def task_status_changed(self, task, old_status, new_status, initial=False):
+        task_id = task.task_id
+        if self.journal is not None and not initial:
+            self.journal.record(task)
+        if self.history is not None and not initial and old_status not in INACTIVE_STATUSES and new_status in INACTIVE_STATUSES:
+            self.history.record(task)
+        if new_status in INACTIVE_STATUSES:
+            self.active_tasks.discard(task_id)
+        else:
+            self.active_tasks.add(task_id)
+
+        # Succeeded is the only state that satisfies a dependency
+        if new_status == 'Succeeded' and (initial or old_status != 'Succeeded'):
+            self.succeeded_count += 1
+            if self.manifest is not None and not initial:
+                self.manifest.record(task)
+            for dependent in self.dependents[task_id]:
+                self.pending_deps[dependent] -= 1
+                self.enqueue_if_ready(dependent)
+        elif old_status == 'Succeeded' and not initial:
+            self.succeeded_count -= 1
+            for dependent in self.dependents[task_id]:
+                self.pending_deps[dependent] += 1
+                self.dequeue(dependent)
+
+        if new_status in FAILED_STATUSES and task.retries >= task.max_retries:
+            self.failed_tasks.add(task_id)
+        else:
+            self.failed_tasks.discard(task_id)
+
+        if self.is_task_ready(task_id):
+            self.enqueue_if_ready(task_id)
+        else:
+            self.dequeue(task_id)
+
+    def resume(self, journal_entries):
+        """
+        Restore task states from the last journal entry of each task in an interrupted run.
+        Succeeded tasks are not run again and in-flight Domino Jobs are polled again. Local jobs
+        died with the previous driver and failed tasks get a fresh set of retries, so both run again.
+        """
+        for task_id, entry in journal_entries.items():
+            if task_id not in self.tasks:
+                continue
+            task = self.tasks[task_id]
+            if entry['status'] == 'Succeeded':
+                logger.info(f"{task_id}: Succeeded in the resumed run.")
+                task.job_id = entry['job_id']
+                task.set_status('Succeeded')
+            elif entry['status'] not in INACTIVE_STATUSES and entry['job_id'] is not None:
+                logger.info(f"{task_id}: Reattaching to job {entry['job_id']}.")
+                task.job_id = entry['job_id']
+                task.retries = entry['retries']
+                if entry.get('batch'):
+                    task.batch = BatchJob(entry['batch'])
+                task.set_status(entry['status'])
+            elif entry['status'] not in INACTIVE_STATUSES:
+                logger.warning(f"{task_id}: Local job was interrupted with the previous run, it will run again.")
+
+    def is_task_ready(self, task_id):
+        task = self.tasks[task_id]
+        task_status_ready = (task._status in FAILED_STATUSES and task.retries < task.max_retries) or task._status == 'Unsubmitted'
+        return self.pending_deps[task_id] == 0 and task_status_ready
+
+    def enqueue_if_ready(self, task_id):
+        if self.is_task_ready(task_id) and task_id not in self.ready_queue:
+            sequence = next(self.sequence)
+            self.ready_queue[task_id] = sequence
+            heapq.heappush(self.ready_heap, (-self.priorities[task_id], sequence, task_id))
+            if self.tasks[task_id]._status == 'Unsubmitted':
+                self.unchecked_tasks[task_id] = None
+
+    def dequeue(self, task_id):
+        # the heap entry becomes stale and is dropped when it reaches the top
+        self.ready_queue.pop(task_id, None)
+        self.unchecked_tasks.pop(task_id, None)
+
+    def topological_order(self):
+        # Kahn's algorithm in O(tasks + dependencies); tasks on a cycle or behind an unknown dependency are left out
+        if self.task_order is not None:
+            return self.task_order
+        in_degree = {task_id: len(set(deps)) for task_id, deps in self.dependency_graph.items()}
+        order = [task_id for task_id, degree in in_degree.items() if degree == 0]
+        for task_id in order:
+            for dependent in self.dependents[task_id]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    order.append(dependent)
+        return order
+
+    def set_priorities(self, durations):
+        """
+        Prioritise ready tasks by the longest path from each task to the end of the graph, weighted
+        by the historical run time of each task in seconds, so long dependency chains start first.
+        Tasks without history are assumed to take the median of the known durations.
+        """
+        known_durations = sorted(durations[task_id] for task_id in self.tasks if task_id in durations)
+        default_duration = known_durations[len(known_durations) // 2] if known_durations else 1.0
+        for task_id in reversed(self.topological_order()):
+            path_to_end = max((self.priorities[dependent] for dependent in self.dependents[task_id]), default=0)
+            self.priorities[task_id] = durations.get(task_id, default_duration) + path_to_end
+        self.ready_heap = [(-self.priorities[task_id], sequence, task_id) for task_id, sequence in self.ready_queue.items()]
+        heapq.heapify(self.ready_heap)
+
+    def get_critical_path(self):
+        # follow the highest priority dependent from the highest priority start task
+        start_tasks = [task_id for task_id, deps in self.dependency_graph.items() if len(deps) == 0]
+        path = []
+        while start_tasks:
+            task_id = max(start_tasks, key=lambda t: self.priorities[t])
+            path.append(task_id)
+            start_tasks = self.dependents[task_id]
+        return path
 
     def get_dependency_statuses(self, task_id):
         dependency_statuses = []
         deps = self.dependency_graph[task_id]
         for dep in deps:
-            dependency_statuses += [self.tasks[dep].status()]
+            dependency_statuses += [self.tasks[dep]._status]
         return dependency_statuses
 
     def are_task_dependencies_complete(self, task_id):
-        dependency_statuses = self.get_dependency_statuses(task_id)
-        if dependency_statuses:
-            all_deps_succeeded = all(status == 'Succeeded' for status in dependency_statuses)
-        else:
-            all_deps_succeeded = True
-        return all_deps_succeeded
+        return self.pending_deps[task_id] == 0
 
-    def get_ready_tasks(self):
+    def refresh_active_tasks(self):
+        # poll only the jobs that are in flight; set_status() keeps the rest of the bookkeeping current
+        remote_job_ids = [task.job_id for task in self.get_remote_running_tasks()]
+        if remote_job_ids:
+            self.status_cache.refresh(remote_job_ids)
+        for task_id in list(self.active_tasks):
+            self.tasks[task_id].status()
+
+    def get_ready_tasks(self, limit=None):
+        """
+        Returns up to limit ready tasks, highest priority first. The tasks stay in the ready
+        queue until they are submitted.
+        """
         global FORCE_RERUN
-        ready_tasks = []
-        for task_id, task in self.tasks.items():
-            task.status()  # update the task status - do it once, since it could be expensive
-            deps_complete = self.are_task_dependencies_complete(task_id)
-            rerun_required = deps_complete and (FORCE_RERUN or self.is_rerun_required(task))
-            if task._status == 'Unsubmitted' and deps_complete and not rerun_required:
+        # Skipping a task marks it Succeeded, which can release its dependents into the ready queue
+        while self.unchecked_tasks:
+            task_id = next(iter(self.unchecked_tasks))
+            del self.unchecked_tasks[task_id]
+            task = self.tasks[task_id]
+            if not (FORCE_RERUN or self.is_rerun_required(task)):
                 # Skip task if all dependencies are satisfied
                 task.set_status("Succeeded")
                 logger.info(f"Dependencies satisfied. Skipping task {task.task_id}.")
-            task_status_ready = (task._status in ("Error", "Failed") and task.retries < task.max_retries) or task._status == 'Unsubmitted'
-            if deps_complete and task_status_ready:
-                ready_tasks.append(task)
-        return ready_tasks
+
+        if limit is None:
+            # All ready tasks: sort the ready set in heap order rather than draining and refilling the heap
+            task_ids = sorted((task_id for task_id in self.ready_queue if task_id not in self.blocked_tasks),
+                              key=lambda task_id: (-self.priorities[task_id], self.ready_queue[task_id]))
+            return [self.tasks[task_id] for task_id in task_ids]
+
+        ready_entries = []
+        blocked_entries = []
+        while self.ready_heap and len(ready_entries) < limit:
+            entry = heapq.heappop(self.ready_heap)
+            if self.ready_queue.get(entry[2]) == entry[1]:
+                if entry[2] in self.blocked_tasks:
+                    blocked_entries.append(entry)
+                else:
+                    ready_entries.append(entry)
+        for entry in ready_entries + blocked_entries:
+            heapq.heappush(self.ready_heap, entry)
+        return [self.tasks[task_id] for _, _, task_id in ready_entries]
+
+    def block_dependents(self, task_id):
+        # Block everything downstream of a task that is expected to fail; returns the task_ids newly blocked
+        blocked = []
+        pending = list(self.dependents[task_id])
+        while pending:
+            dependent = pending.pop()
+            if dependent not in self.blocked_tasks:
+                self.blocked_tasks[dependent] = task_id
+                blocked.append(dependent)
+                pending.extend(self.dependents[dependent])
+        return sorted(blocked)
+
+    def unblock_dependents(self, task_id):
+        # A new attempt of the task may succeed, so the tasks it blocked may run after all
+        for dependent, blocker in list(self.blocked_tasks.items()):
+            if blocker == task_id:
+                del self.blocked_tasks[dependent]
 
     def is_rerun_required(self, task):
         """
         Algorithm:
         1. For each task, check if all the output files exists.
         2. If any output file does not exist, rerun is required.
-        3. If all the output files exists, compare the modification times of the output files and the input files.
-        4. If any input file is newer than any output file, rerun is required.
-        5. If the task has no defined inputs or no defined outputs, rerun is required.
-        6. If no input file is newer than an output file, skip the task.
+        3. If the task has no defined inputs or no defined outputs, rerun is required.
+        4. If any input file does not exist, rerun is required so that the task reports the problem.
+        5. If the manifest has a record of the last successful run, rerun is required only if the
+           content digest of an input, an output or the program file differs from that record.
+        6. Otherwise, compare the modification times of the output files and the input files.
+           If any input file is newer than any output file, rerun is required.
+        7. If none of the above apply, skip the task.
         """
         rerun = False
         if any([not os.path.exists(s) for s in task.outputs]):
             rerun = True
-        elif len(task.inputs) == 0 or len(task.outputs) == 0 or max([os.path.getmtime(s) for s in task.inputs]) > min([os.path.getmtime(s) for s in task.outputs]):
+        elif len(task.inputs) == 0 or len(task.outputs) == 0:
+            rerun = True
+        elif any([not os.path.exists(s) for s in task.inputs]):
+            rerun = True
+        elif self.manifest is not None and self.manifest.has_record(task):
+            rerun = not self.manifest.is_unchanged(task)
+        elif max([os.path.getmtime(s) for s in task.inputs]) > min([os.path.getmtime(s) for s in task.outputs]):
             rerun = True
         return rerun
 
     def count_local_submitted_jobs(self):
-        count = 0
-        for task_id, task in self.tasks.items():
-            task.status()  # update internal status
-            if task.process is not None:
-                count += 1
-        return count
+        return len(self.get_local_running_tasks())
+
+    def get_local_running_tasks(self):
+        return [self.tasks[task_id] for task_id in self.active_tasks if self.tasks[task_id].process is not None]
 
     def get_failed_tasks(self):
-        failed_tasks = []
-        for task_id, task in self.tasks.items():
-            if task.status() in ('Error', 'Failed') and task.retries >= task.max_retries:
-                failed_tasks.append(task)
-        return failed_tasks
+        return [self.tasks[task_id] for task_id in self.failed_tasks]
+
+    def get_remote_running_tasks(self):
+        return [self.tasks[task_id] for task_id in self.active_tasks
+                if self.tasks[task_id].process is None and self.tasks[task_id].job_id is not None]
+
+    def skip_unsubmitted_tasks(self):
+        # Mark the tasks that never started as Skipped once the pipeline is cancelled; returns their task_ids
+        skipped = [task_id for task_id in self.topological_order() if self.tasks[task_id]._status == 'Unsubmitted']
+        for task_id in skipped:
+            self.tasks[task_id].set_status('Skipped')
+        return skipped
 
     def pipeline_status(self):
+        self.refresh_active_tasks()
         status = 'Running'
-        if len(self.get_failed_tasks()) > 0 and self.allow_partial_failure == False:
+        if len(self.failed_tasks) > 0 and self.allow_partial_failure == False:
             status = 'Failed'
-        elif all(task.is_complete() for task_id, task in self.tasks.items()):
+        elif self.succeeded_count == len(self.tasks):
             status = 'Succeeded'
+        elif len(self.failed_tasks) > 0 and not self.active_tasks and not self.ready_queue:
+            # with partial failure allowed, the pipeline ends once nothing runs and nothing more can start
+            status = 'Failed'
         return status
 
+    def find_cycles(self):
+        """
+        Returns one dependency cycle, as a list of task_ids starting and ending with the same task,
+        for every strongly connected component of the graph that contains a cycle. Uses an iterative
+        Tarjan's algorithm, so it runs in O(tasks + dependencies).
+        """
+        index = {}
+        low_link = {}
+        stack = []
+        on_stack = set()
+        components = []
+        counter = itertools.count()
+        for root in self.dependency_graph:
+            if root in index:
+                continue
+            index[root] = low_link[root] = next(counter)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.dependency_graph[root]))]
+            while work:
+                task_id, deps = work[-1]
+                for dep in deps:
+                    if dep not in self.dependency_graph:
+                        continue
+                    if dep not in index:
+                        index[dep] = low_link[dep] = next(counter)
+                        stack.append(dep)
+                        on_stack.add(dep)
+                        work.append((dep, iter(self.dependency_graph[dep])))
+                        break
+                    elif dep in on_stack:
+                        low_link[task_id] = min(low_link[task_id], index[dep])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low_link[parent] = min(low_link[parent], low_link[task_id])
+                    if low_link[task_id] == index[task_id]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == task_id:
+                                break
+                        if len(component) > 1 or task_id in self.dependency_graph[task_id]:
+                            components.append(component)
+
+        cycles = []
+        for component in components:
+            # walk dependencies inside the component until a task repeats; that closes a cycle
+            members = set(component)
+            path = [component[0]]
+            position = {component[0]: 0}
+            while True:
+                next_task = next(dep for dep in self.dependency_graph[path[-1]] if dep in members)
+                if next_task in position:
+                    cycles.append(path[position[next_task]:] + [next_task])
+                    break
+                position[next_task] = len(path)
+                path.append(next_task)
+        return cycles
+
     def validate_dag(self):
-        def recurse(task, original_task):
-            dag_valid = True
-            for dependency in self.dependency_graph[task]:
-                if dependency not in self.dependency_graph.keys():
-                    dag_valid = False
-                    logger.error(f"ERROR: Dependency '{dependency}' is not found in the graph.")
-                elif original_task in self.dependency_graph[dependency]:
+        """
+        Checks that every dependency refers to a task in the graph and that there are no circular
+        dependencies, reporting every problem found before exiting. On success, stores and returns
+        a topological order of the tasks (dependencies first) in self.task_order.
+        """
+        dag_valid = True
+        for task_id, deps in self.dependency_graph.items():
+            for dependency in deps:
+                if dependency not in self.dependency_graph:
                     dag_valid = False
-                    logger.error(f"ERROR: Circular dependency detected. {original_task} won't start because {task} depends on {dependency}, but {dependency} depends on {original_task}.\nPlease review your config and resolve any circular references.")
-                if dag_valid == False:
-                    break
-                else:
-                    dag_valid = recurse(dependency, original_task)
-        
-            return dag_valid
+                    logger.error(f"ERROR: Dependency '{dependency}' of task '{task_id}' is not found in the graph.")
 
-        for task in self.dependency_graph:
-            dag_valid = recurse(task, task)
-        
-            if not dag_valid:
-                logger.error('ERROR: Exiting due to invalid dependency structure.')
-                exit(1)
+        order = self.topological_order()
+        if len(order) < len(self.dependency_graph):
+            for cycle in self.find_cycles():
+                dag_valid = False
+                logger.error(f"ERROR: Circular dependency detected: {' depends on '.join(cycle)}.\nPlease review your config and resolve any circular references.")
+
+        if not dag_valid:
+            logger.error('ERROR: Exiting due to invalid dependency structure.')
+            exit(1)
+        self.task_order = order
+        return order
 
     def validate_run_command(self):
         pass
@@ -365,9 +1346,36 @@ class Dag:
     def __str__(self):
         return pprint.pformat(self.dependency_graph, width=132, compact=True)
 
+# Keep-alive connection pool shared by all API calls, and a worker pool for dispatching independent calls
+API_POOL_SIZE = 10
+API_SESSION = requests.Session()
+API_SESSION.mount('http://', HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE))
+API_SESSION.mount('https://', HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE))
+API_EXECUTOR = ThreadPoolExecutor(max_workers=API_POOL_SIZE)
+
+# The token file is rewritten in place when Domino refreshes the token, so it is only re-read when its mtime changes
+TOKEN_CACHE = {'path': None, 'mtime': None, 'token': None}
+TOKEN_CACHE_LOCK = threading.Lock()
+
+
 def read_token_file():
-    with open(os.environ['DOMINO_TOKEN_FILE']) as f:
-        return f.read()
+    token_file = os.environ['DOMINO_TOKEN_FILE']
+    with TOKEN_CACHE_LOCK:
+        mtime = os.stat(token_file).st_mtime_ns
+        if TOKEN_CACHE['path'] != token_file or TOKEN_CACHE['mtime'] != mtime:
+            with open(token_file) as f:
+                TOKEN_CACHE.update(path=token_file, mtime=mtime, token=f.read())
+        return TOKEN_CACHE['token']
+
+
+def run_concurrently(function, args_list):
+    """
+    Run function once per argument tuple on the API worker pool and return the results in order.
+    Any exception raised by a call is re-raised here.
+    """
+    futures = [API_EXECUTOR.submit(function, *args) for args in args_list]
+    return [future.result() for future in futures]
+
 
 @backoff.on_exception(backoff.expo, RetryException, max_time=600)
 def submit_mc_wh_call(method, endpoint, data=None): 
@@ -382,7 +1390,7 @@ def submit_mc_wh_call(method, endpoint, data=None):
     verify = '/mnt/imported/code/space-tech-util/ssl/full-bundle.crt'
 
     try:
-        response = requests.request(method, url, headers=headers, data=data, verify=verify)
+        response = API_SESSION.request(method, url, headers=headers, data=data, verify=verify)
         response.raise_for_status()
     except HTTPError as err:
         if data:
@@ -403,7 +1411,7 @@ def submit_api_call(method, endpoint, data=None):
     url = f'{DOMINO_API_HOST}/{endpoint}'
 
     try:
-        response = requests.request(method, url, headers=headers, data=data)
+        response = API_SESSION.request(method, url, headers=headers, data=data)
         response.raise_for_status()
     except HTTPError as err:
         if data:
@@ -433,6 +1441,419 @@ def get_job_status(job_id):
 
     return job_status
 
+
+def get_job_log(job_id):
+    # The stdout of a job so far, as one string. The logs API has no paging cursor, so the whole log is returned
+    # every time and callers keep track of how much of it they have already seen. The response lists the log in
+    # chunks: {"logContent": [{"logType": "stdout", "log": "..."}, ...], "isComplete": false}
+    endpoint = f'api/jobs/beta/jobs/{job_id}/logs?logType=stdout'
+    response = submit_api_call('GET', endpoint)
+    if isinstance(response, str):
+        return response
+    return ''.join(chunk.get('log', '') for chunk in response.get('logContent', []))
+
+
+def stop_job(job_id):
+    endpoint = 'v4/jobs/stop'
+    data = json.dumps({'projectId': DOMINO_PROJECT_ID, 'jobId': job_id, 'commitResults': False})
+    submit_api_call('POST', endpoint, data)
+
+class RunManifest:
+    """
+    Persistent record of the content digests that each task last succeeded with, so that touched
+    or remounted files do not trigger reruns. A task that succeeds is hashed on a worker thread, so large
+    outputs do not hold up the scheduler, and the file is written once the hashing of all the tasks that
+    succeeded meanwhile is done. close() waits for the worker and writes what is left.
+
+    self.path           # JSON file the manifest is stored in
+    self.tasks          # dictionary of task_id -> dictionary of file path -> digest (inputs, outputs and program)
+    self.file_cache     # dictionary of file path -> size, mtime and digest; a file is only re-hashed when its size or mtime changes
+    self.changed        # whether tasks were recorded since the last save
+    self.pending        # number of tasks waiting to be hashed
+    """
+    def __init__(self, path):
+        self.path = path
+        self.tasks = {}
+        self.file_cache = {}
+        self.changed = False
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='manifest')
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            self.tasks = manifest.get('tasks', {})
+            self.file_cache = manifest.get('files', {})
+
+    def file_digest(self, path):
+        # Called from the scheduler and the worker; the file is hashed outside the lock
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.file_cache.get(path)
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['digest']
+        digest = hashlib.blake2b(digest_size=32)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        with self.lock:
+            self.file_cache[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def task_paths(self, task):
+        paths = list(task.inputs) + list(task.outputs)
+        program_path = extract_program_path(task.command)
+        if os.path.isfile(program_path):
+            paths.append(program_path)
+        return paths
+
+    def has_record(self, task):
+        with self.lock:
+            return task.task_id in self.tasks
+
+    def is_unchanged(self, task):
+        digests = {path: self.file_digest(path) for path in self.task_paths(task)}
+        with self.lock:
+            return self.tasks[task.task_id] == digests
+
+    def record(self, task):
+        # Queue a task that just succeeded for hashing
+        if len(task.inputs) == 0 or len(task.outputs) == 0:
+            return
+        if not all(os.path.exists(s) for s in list(task.inputs) + list(task.outputs)):
+            return
+        with self.lock:
+            self.pending += 1
+        self.executor.submit(self.record_digests, task.task_id, self.task_paths(task))
+
+    def record_digests(self, task_id, paths):
+        try:
+            digests = {path: self.file_digest(path) for path in paths}
+        except OSError as e:
+            logger.warning(f"{task_id}: Could not record the content digests of the task: {e}")
+            digests = None
+        with self.lock:
+            self.pending -= 1
+            if digests is not None:
+                self.tasks[task_id] = digests
+                self.changed = True
+            save = self.pending == 0
+        if save:
+            try:
+                self.save()
+            except OSError as e:
+                logger.warning(f"Could not save the manifest {self.path}: {e}")
+
+    def save(self):
+        # write to a temporary file and rename, so an interrupted run never leaves a truncated manifest
+        with self.lock:
+            if not self.changed:
+                return
+            self.changed = False
+            manifest = json.dumps({'tasks': self.tasks, 'files': self.file_cache}, indent=1)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(manifest)
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        # Wait for the tasks still being hashed and write the manifest
+        self.executor.shutdown(wait=True)
+        self.save()
+
+
+class RunJournal:
+    """
+    Append-only JSON lines journal of task state transitions. Each entry is flushed to disk
+    as it is written, so a run that is interrupted or crashes can be resumed with --resume.
+
+    self.path           # JSONL file the journal is written to
+    self.run_id         # identifier of the run; entries from earlier runs are kept for their history
+    """
+    def __init__(self, path, run_id):
+        self.path = path
+        self.run_id = run_id
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def read_entries(self):
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass  # a partially written last line from a crash
+        return entries
+
+    def last_run(self):
+        """
+        Returns the run_id of the latest run in the journal and a dictionary of
+        task_id -> last entry for that run, or (None, {}) if the journal is empty.
+        """
+        entries = self.read_entries()
+        if len(entries) == 0:
+            return None, {}
+        last_run_id = entries[-1]['run_id']
+        return last_run_id, {entry['task_id']: entry for entry in entries if entry['run_id'] == last_run_id}
+
+    def record(self, task):
+        entry = {
+            'run_id': self.run_id,
+            'time': time.time(),
+            'task_id': task.task_id,
+            'status': task._status,
+            'job_id': task.job_id,
+            'retries': task.retries,
+            'batch': task.batch.directory if task.batch is not None else None,
+        }
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def percentile(values, fraction):
+    # nearest-rank percentile of a non-empty list
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))]
+
+
+class TaskHistory:
+    """
+    SQLite store of the timing of every finished task attempt, for local and remote runs, keyed by
+    config path and task id. Used for critical-path priorities and by the "stats" subcommand.
+
+    self.path           # SQLite database file
+    self.config_path    # absolute path of the config that attempts are recorded for
+    self.run_id         # identifier of the run that attempts are recorded for
+    """
+    def __init__(self, path, config_path, run_id=None):
+        self.path = path
+        self.config_path = os.path.abspath(config_path)
+        self.run_id = run_id
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS task_runs (
+                   config_path TEXT NOT NULL,
+                   run_id TEXT NOT NULL,
+                   task_id TEXT NOT NULL,
+                   mode TEXT NOT NULL,
+                   job_id TEXT,
+                   submitted_at REAL,
+                   started_at REAL,
+                   finished_at REAL NOT NULL,
+                   queue_time REAL,
+                   run_time REAL,
+                   retries INTEGER NOT NULL,
+                   status TEXT NOT NULL,
+                   exit_code INTEGER,
+                   peak_rss INTEGER
+               )""")
+        # Histories written before peak_rss was recorded lack the column
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(task_runs)")]
+        if 'peak_rss' not in columns:
+            self.connection.execute("ALTER TABLE task_runs ADD COLUMN peak_rss INTEGER")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS task_runs_config ON task_runs (config_path, task_id)")
+        self.connection.commit()
+
+    def record(self, task):
+        finished_at = time.time()
+        submitted_at = task.start_time
+        # local jobs start running as soon as they are launched; remote jobs may be queued first
+        started_at = task.run_start_time or submitted_at
+        queue_time = started_at - submitted_at if submitted_at is not None else None
+        run_time = finished_at - started_at if started_at is not None else None
+        mode = 'local' if task.job_id is None else 'remote'
+        self.connection.execute(
+            "INSERT INTO task_runs (config_path, run_id, task_id, mode, job_id, submitted_at, started_at, finished_at, "
+            "queue_time, run_time, retries, status, exit_code, peak_rss) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.config_path, self.run_id, task.task_id, mode, task.job_id, submitted_at, started_at, finished_at,
+             queue_time, run_time, task.retries, task._status, task.returncode if mode == 'local' else None,
+             task.peak_rss if mode == 'local' else None))
+        self.connection.commit()
+
+    def task_durations(self):
+        # median run time of the successful attempts of each task
+        run_times = {}
+        rows = self.connection.execute(
+            "SELECT task_id, run_time FROM task_runs WHERE config_path = ? AND status = 'Succeeded' AND run_time IS NOT NULL",
+            (self.config_path, ))
+        for task_id, run_time in rows:
+            run_times.setdefault(task_id, []).append(run_time)
+        return {task_id: percentile(values, 0.5) for task_id, values in run_times.items()}
+
+    def task_peak_rss(self):
+        # largest peak RSS of the successful local runs of each task
+        rows = self.connection.execute(
+            "SELECT task_id, MAX(peak_rss) FROM task_runs WHERE config_path = ? AND status = 'Succeeded' AND peak_rss IS NOT NULL "
+            "GROUP BY task_id", (self.config_path, ))
+        return dict(rows)
+
+    def task_stats(self):
+        stats = {}
+        rows = self.connection.execute(
+            "SELECT task_id, queue_time, run_time, retries, status FROM task_runs WHERE config_path = ? ORDER BY finished_at",
+            (self.config_path, ))
+        for task_id, queue_time, run_time, retries, status in rows:
+            task_stats = stats.setdefault(task_id, {'attempts': 0, 'failures': 0, 'retries': 0, 'queue_times': [], 'run_times': []})
+            task_stats['attempts'] += 1
+            task_stats['retries'] = max(task_stats['retries'], retries)
+            if status != 'Succeeded':
+                task_stats['failures'] += 1
+            elif run_time is not None:
+                task_stats['run_times'].append(run_time)
+                if queue_time is not None:
+                    task_stats['queue_times'].append(queue_time)
+        return stats
+
+    def last_run_parallelism(self):
+        """
+        Returns the id of the latest run, its wall-clock time, the total run time of its attempts
+        and the parallelism achieved (total run time divided by wall-clock time).
+        """
+        row = self.connection.execute(
+            "SELECT run_id FROM task_runs WHERE config_path = ? ORDER BY finished_at DESC LIMIT 1", (self.config_path, )).fetchone()
+        if row is None:
+            return None
+        run_id = row[0]
+        first_submitted, last_finished, total_run_time = self.connection.execute(
+            "SELECT MIN(submitted_at), MAX(finished_at), SUM(run_time) FROM task_runs WHERE config_path = ? AND run_id = ?",
+            (self.config_path, run_id)).fetchone()
+        wall_time = last_finished - first_submitted
+        return run_id, wall_time, total_run_time, total_run_time / wall_time if wall_time > 0 else 1.0
+
+
+def get_default_state_dir():
+    if DOMINO_IS_GIT_BASED == 'true':
+        dataset_root = '/mnt/data'
+    else:
+        dataset_root = '/domino/datasets/local'
+    if os.path.exists(f'{dataset_root}/{DOMINO_PROJECT_NAME}'):
+        return f'{dataset_root}/{DOMINO_PROJECT_NAME}/.multijob'
+    return os.path.abspath('.multijob')
+
+
+def is_on_dataset(path):
+    # Whether a path is on a dataset, which Domino Jobs of the project mount at the same path
+    if DOMINO_IS_GIT_BASED == 'true':
+        dataset_root = '/mnt/data'
+    else:
+        dataset_root = '/domino/datasets/local'
+    return os.path.realpath(path).startswith(f'{dataset_root}/')
+
+
+def get_state_file_path(state_dir, cfg_file_path, suffix):
+    # State files are per config; the hash keeps configs with the same file name apart
+    cfg_file_path = os.path.abspath(cfg_file_path)
+    cfg_hash = hashlib.sha1(cfg_file_path.encode()).hexdigest()[:8]
+    cfg_name = os.path.splitext(os.path.basename(cfg_file_path))[0]
+    return os.path.join(state_dir, f'{cfg_name}-{cfg_hash}.{suffix}')
+
+
+class JobStatusCache:
+    """
+    Snapshot of Domino job statuses, so every status check in a scheduling step is served
+    from one paged list call instead of one GET per job per check.
+
+    self.page_size      # number of jobs requested per page of the list call
+    self.statuses       # dictionary of job_id -> executionStatus from the latest snapshot
+    """
+    def __init__(self, page_size=100):
+        self.page_size = page_size
+        self.statuses = {}
+
+    def refresh(self, job_ids):
+        statuses = {}
+        offset = 0
+        while True:
+            endpoint = f'api/jobs/beta/jobs?projectId={DOMINO_PROJECT_ID}&statusFilter=active&offset={offset}&limit={self.page_size}'
+            method = 'GET'
+            active_jobs = submit_api_call(method, endpoint)
+            for job in active_jobs['jobs']:
+                statuses[job['id']] = job['status']['executionStatus']
+            offset += len(active_jobs['jobs'])
+            if len(active_jobs['jobs']) == 0 or offset >= active_jobs['metadata']['totalCount']:
+                break
+
+        # Jobs that finished since the last snapshot are no longer listed as active,
+        # so look up their final status individually, once.
+        finished_job_ids = [job_id for job_id in job_ids if job_id not in statuses]
+        finished_statuses = run_concurrently(get_job_status, [(job_id, ) for job_id in finished_job_ids])
+        statuses.update(zip(finished_job_ids, finished_statuses))
+        self.statuses = statuses
+
+    def get(self, job_id):
+        # jobs submitted after the latest snapshot are looked up directly
+        if job_id not in self.statuses:
+            self.statuses[job_id] = get_job_status(job_id)
+        return self.statuses[job_id]
+
+
+class ProjectMetadataCache:
+    """
+    Hardware tiers and imported repositories of the project, fetched once per run (or again after ttl
+    seconds) instead of once per submitted task, with the hardware tiers indexed by name.
+
+    The imported repository defaults are what multijob restores after a job with imported_repo_git_refs
+    has started, so a change made to them in the project settings during a run is only seen after ttl.
+
+    self.ttl            # seconds before an entry is fetched again, or None to keep it for the whole run
+    self.hardware_tiers # dictionary of hardware tier name -> id
+    self.imported_repos # dictionary of imported repository name -> repository, as returned by the API
+    self.loaded_at      # dictionary of "hardware_tiers" / "imported_repos" -> time they were fetched
+    """
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.hardware_tiers = {}
+        self.imported_repos = {}
+        self.loaded_at = {}
+        self.lock = threading.Lock()
+
+    def fetch_hardware_tiers(self):
+        endpoint = f'v4/projects/{DOMINO_PROJECT_ID}/hardwareTiers'
+        method = 'GET'
+        available_hardware_tiers = submit_api_call(method, endpoint)
+        return {tier['hardwareTier']['name']: tier['hardwareTier']['id'] for tier in available_hardware_tiers}
+
+    def fetch_imported_repos(self):
+        endpoint = f'api/projects/v1/projects/{DOMINO_PROJECT_ID}/repositories'
+        method = 'GET'
+        imported_repos = submit_api_call(method, endpoint)
+        return {repo['name']: repo for repo in imported_repos['repositories']}
+
+    def is_fresh(self, kind):
+        loaded_at = self.loaded_at.get(kind)
+        return loaded_at is not None and (self.ttl is None or time.time() - loaded_at < self.ttl)
+
+    def load(self, kinds=("hardware_tiers", "imported_repos")):
+        # Fetch the given kinds of metadata that are missing or expired, side by side
+        with self.lock:
+            kinds = [kind for kind in kinds if not self.is_fresh(kind)]
+            results = run_concurrently(lambda kind: getattr(self, f"fetch_{kind}")(), [(kind,) for kind in kinds])
+            for kind, result in zip(kinds, results):
+                setattr(self, kind, result)
+                self.loaded_at[kind] = time.time()
+
+    def get_hardware_tier_id(self, hardware_tier_name):
+        self.load(["hardware_tiers"])
+        if hardware_tier_name not in self.hardware_tiers:
+            # The tier may have been added to the project since the list was fetched
+            self.loaded_at.pop("hardware_tiers", None)
+            self.load(["hardware_tiers"])
+        if hardware_tier_name not in self.hardware_tiers:
+            raise Exception(f"Unknown hardware tier '{hardware_tier_name}', available tiers: {', '.join(sorted(self.hardware_tiers))}")
+        return self.hardware_tiers[hardware_tier_name]
+
+    def get_imported_repos(self):
+        self.load(["imported_repos"])
+        return self.imported_repos
+
+
 def get_project_datasets():
     endpoint = f'api/datasetrw/v2/datasets?projectIdsToInclude={DOMINO_PROJECT_ID}'
     method = 'GET'
@@ -537,9 +1958,10 @@ def cleanup_dataset():
     dataset_path = f'{dataset_root}/{DOMINO_PROJECT_NAME}'
     if os.path.exists(dataset_path):
         PROTECTED_DIR = 'inputdata'
+        STATE_DIR = '.multijob'  # keep the run journal and manifests of multijob
         for (root, dirs, files) in os.walk(dataset_path, topdown=True):
             for name in files:
-                if PROTECTED_DIR not in root:
+                if PROTECTED_DIR not in root and STATE_DIR not in root:
                     os.remove(os.path.join(root, name))
 
 
@@ -596,7 +2018,7 @@ def build_dag(cfg_file_path):
         command = str(command_str)
         domino_run_kwargs = {}
         if c.has_option(task_id, "max_retries"):
-            max_retries = c.get(task_id, "max_retries")
+            max_retries = c.getint(task_id, "max_retries")
             domino_run_kwargs["max_retries"] = max_retries
         if c.has_option(task_id, "tier"):
             tier = c.get(task_id, "tier")
@@ -611,6 +2033,17 @@ def build_dag(cfg_file_path):
         if c.has_option(task_id, 'imported_repo_git_refs'):
             imported_repo_git_refs = c.get(task_id, 'imported_repo_git_refs')
             domino_run_kwargs['imported_repo_git_refs'] = imported_repo_git_refs
+        # Resources a local run needs, used to decide how many tasks run side by side
+        if c.has_option(task_id, 'cpus'):
+            domino_run_kwargs['cpus'] = c.getfloat(task_id, 'cpus')
+        if c.has_option(task_id, 'mem'):
+            domino_run_kwargs['mem'] = parse_memory(c.get(task_id, 'mem'))
+        # Program logs to watch for failure signatures, when they are not where SAS or logrx put them by default
+        if c.has_option(task_id, 'log'):
+            domino_run_kwargs['log_paths'] = [os.path.expandvars(s.strip()) for s in c.get(task_id, 'log').split(',')]
+        # "batch: false" keeps a task in a job of its own when running with --batch
+        if c.has_option(task_id, 'batch'):
+            domino_run_kwargs['batchable'] = c.getboolean(task_id, 'batch')
         tasks[task_id] = DominoRun(task_id, command, inputs, outputs, **domino_run_kwargs)
 
     # add dependencies defined only by input-output file dependencies
@@ -639,12 +2072,26 @@ class PipelineRunner:
 
     Attributes:
     dag (DAG): The DAG object that stores the state of tasks.
-    tick_freq (int): The number of seconds to wait between job submissions, default is 5.
+    tick_freq (int): The maximum number of seconds to wait between status checks, default is 5.
     is_local (bool): A flag indicating if the pipeline is running in a local environment, default is False.
     queue_limit (int): The max number of jobs to run in parallel.
+    executor (LocalExecutor): Decides which ready tasks fit on the workspace when running locally.
+    cancel_remote_jobs (bool): Stop the Domino Jobs still in flight when the pipeline fails or is interrupted.
+    metadata (ProjectMetadataCache): Hardware tiers and imported repositories, fetched when the run starts.
+    batch_size (int): The max number of ready leaf tasks to run together in one Domino Job (see BatchJob).
+    batch_dir (str): Directory on the project dataset for the configs and state of the batch jobs.
+    batch_options (list): Command line options passed on to the multijob runs inside batch jobs.
+
+    The runner is event driven: each iteration submits every ready task that fits below the queue
+    limit, then sleeps until a local job exits (signalled through task_event) or, for Domino Jobs,
+    until the next tick when remote status transitions are polled.
+
+    When the pipeline fails or is interrupted, run() cancels it: local jobs are terminated, Domino
+    Jobs in flight are stopped unless cancel_remote_jobs is False, and the tasks that were never
+    submitted are marked Skipped.
     '''
 
-    def __init__(self, dag, tick_freq=5, is_local=False, queue_limit=10, add_timestamp=True, job_name="job1", job_title="title"):
+    def __init__(self, dag, tick_freq=5, is_local=False, queue_limit=10, add_timestamp=True, job_name="job1", job_title="title", executor=None, cancel_remote_jobs=True, metadata_ttl=None, batch_size=1, batch_dir=None, batch_options=()):
         self.dag = dag
         self.tick_freq = tick_freq
         self.is_local = is_local
@@ -652,13 +2099,78 @@ class PipelineRunner:
         self.add_timestamp = add_timestamp
         self.job_name = job_name
         self.job_title = job_title
+        self.task_event = threading.Event()
+        self.executor = executor
+        self.cancel_remote_jobs = cancel_remote_jobs
+        self.metadata = ProjectMetadataCache(metadata_ttl)
+        self.batch_size = batch_size if not is_local else 1
+        self.batch_dir = batch_dir
+        self.batch_options = list(batch_options)
+        self.batch_count = itertools.count(1)
 
     def run(self):
+        try:
+            if not self.is_local:
+                self.load_metadata()
+            self.run_tasks()
+        except BaseException:
+            self.cancel()
+            raise
+        finally:
+            if self.dag.manifest is not None:
+                self.dag.manifest.close()
+
+    def cancel(self):
+        # Stop all work of a pipeline that failed or was interrupted, so no job keeps a hardware tier busy
+        # for results that will not be used
+        running_tasks = self.dag.get_local_running_tasks()
+        if running_tasks and self.executor is not None:
+            # Local jobs run in their own process groups, which an interrupt of the runner does not reach
+            logger.warning(f"Stopping local jobs: {', '.join(task.task_id for task in running_tasks)}")
+            self.executor.terminate(running_tasks)
+            for task in running_tasks:
+                task.set_status('Stopped')
+
+        remote_tasks = self.dag.get_remote_running_tasks()
+        if remote_tasks and not self.cancel_remote_jobs:
+            logger.warning(f"Leaving Domino Jobs running: {', '.join(f'{task.task_id} ({task.job_id})' for task in remote_tasks)}")
+        elif remote_tasks:
+            logger.warning(f"Stopping Domino Jobs: {', '.join(f'{task.task_id} ({task.job_id})' for task in remote_tasks)}")
+            # The tasks of a batch share one job
+            jobs = {}
+            for task in remote_tasks:
+                jobs.setdefault(task.job_id, []).append(task)
+
+            def stop(job_id):
+                # A job may finish or the API may fail while the others are being stopped; report it, keep going
+                try:
+                    stop_job(job_id)
+                except Exception as e:
+                    return e
+
+            results = run_concurrently(stop, [(job_id,) for job_id in jobs])
+            for (job_id, tasks), error in zip(jobs.items(), results):
+                for task in tasks:
+                    if error is not None:
+                        logger.error(f"{task.task_id}: Could not stop job {job_id}: {error}")
+                    else:
+                        task.set_status('Stopped')
+
+        skipped = self.dag.skip_unsubmitted_tasks()
+        if skipped:
+            logger.warning(f"Skipped tasks: {', '.join(skipped)}")
+
+    def run_tasks(self):
+        limit_logged = False
         while True:
-            if self.dag.pipeline_status() == 'Succeeded':
+            # Clear before checking statuses, so a job finishing during this iteration wakes the next wait
+            self.task_event.clear()
+            pipeline_status = self.dag.pipeline_status()
+            if pipeline_status == 'Succeeded':
                 break
-            elif self.dag.pipeline_status() == 'Failed':
+            elif pipeline_status == 'Failed':
                 raise Exception(f"Pipeline Execution Failed for tasks: {[str(t) for t in self.dag.get_failed_tasks()]}")
+            self.handle_log_matches()
             if not self.is_local:
                 # Suspend job submission until the "multijob_locked" project tag is removed
                 while True:
@@ -666,36 +2178,75 @@ class PipelineRunner:
                     if jobs_locked == False:
                         break
                     time.sleep(self.tick_freq)
-            # Suspend job submission until the number of jobs is below the queue limit
-            message_logged = False
-            while True:
-                queued_job_count = self.check_queue_limit()
-                if queued_job_count < self.queue_limit:
-                    break
-                if not message_logged:
-                    logger.info('At limit for queued jobs, waiting for jobs to complete.')
-                    message_logged = True
-                time.sleep(max(self.tick_freq, 1))
-
-            ready_tasks = self.dag.get_ready_tasks()
-            if ready_tasks:
-                logger.info("Ready tasks: {0}".format(", ".join([task.task_id for task in ready_tasks])))
-            # Pull one task out of the ready queue, submit it, wait 1 tick, and repeat tag check
-            for task in ready_tasks:
-                self.submit_task(task)
-                break
-            time.sleep(self.tick_freq)
 
+            # Submit every ready task that fits below the queue limit in one batch
+            submitted_count = 0
+            available_slots = self.queue_limit - self.check_queue_limit()
+            if available_slots > 0:
+                limit_logged = False
+                if self.executor is not None:
+                    ready_tasks = self.executor.admit(self.dag.get_ready_tasks(), self.dag.get_local_running_tasks(), available_slots)
+                elif self.batch_size > 1:
+                    ready_tasks = self.form_batches(self.dag.get_ready_tasks(), available_slots)
+                else:
+                    ready_tasks = self.dag.get_ready_tasks(available_slots)
+                if ready_tasks:
+                    logger.info("Ready tasks: {0}".format(", ".join([task.task_id for task in ready_tasks])))
+                self.submit_tasks(ready_tasks)
+                submitted_count = len(ready_tasks)
+            elif not limit_logged:
+                logger.info('At limit for queued jobs, waiting for jobs to complete.')
+                limit_logged = True
+
+            # Skipped or submitted tasks may unblock others, so only sleep when nothing was submitted
+            if submitted_count == 0:
+                self.wait_for_event()
+
+    def handle_log_matches(self):
+        # Act on the failure signatures found in the logs of running tasks since the last step
+        if LOG_WATCHER is None:
+            return
+        if not self.is_local and LOG_ERRORS in ('fail', 'abort'):
+            # Remote logs are only downloaded when a match changes the result; the multijob run inside a batch job
+            # watches the logs of its own tasks
+            LOG_WATCHER.poll_remote([self.dag.tasks[task_id] for task_id in self.dag.active_tasks
+                                     if self.dag.tasks[task_id].job_id is not None and self.dag.tasks[task_id].batch is None])
+        for task_id, source, line in LOG_WATCHER.take_pending():
+            task = self.dag.tasks[task_id]
+            if LOG_ERRORS == 'warn':
+                logger.warning(f"{task_id}: {source} contains: {line}")
+                continue
+            logger.error(f"{task_id}: {source} contains: {line}")
+            blocked = self.dag.block_dependents(task_id)
+            if blocked:
+                logger.error(f"Blocked until {task_id} is fixed: {', '.join(blocked)}")
+            if LOG_ERRORS == 'abort' and task._status not in INACTIVE_STATUSES:
+                logger.error(f"{task_id}: Stopping the job")
+                if task.process is not None:
+                    self.executor.stop(task)
+                elif task.job_id is not None:
+                    stop_job(task.job_id)
+
+    def load_metadata(self):
+        # Fetch the metadata that task submissions will need up front, so submitting a task costs no lookups
+        tasks = self.dag.tasks.values()
+        kinds = []
+        if any(task.tier for task in tasks):
+            kinds.append("hardware_tiers")
+        if any(task.imported_repo_git_refs for task in tasks):
+            kinds.append("imported_repos")
+        self.metadata.load(kinds)
+        # An unknown tier would otherwise only fail its task once everything upstream of it has run
+        for tier in sorted({task.tier for task in tasks if task.tier}):
+            self.metadata.get_hardware_tier_id(tier)
+
+    def wait_for_event(self):
+        # Local jobs set task_event when they exit; remote jobs are only visible by polling at the next tick
+        self.task_event.wait(timeout=max(self.tick_freq, 1))
 
-    def get_hardware_tier_id(self, hardware_tier_name):
-        endpoint = f'v4/projects/{DOMINO_PROJECT_ID}/hardwareTiers'
-        method = 'GET'
-        available_hardware_tiers = submit_api_call(method, endpoint)
-        for hardware_tier in available_hardware_tiers:
-            if hardware_tier['hardwareTier']['name'] == hardware_tier_name:
-                hardware_tier_id = hardware_tier['hardwareTier']['id']
 
-        return hardware_tier_id
+    def get_hardware_tier_id(self, hardware_tier_name):
+        return self.metadata.get_hardware_tier_id(hardware_tier_name)
 
 
     def set_project_tag(self):
@@ -747,11 +2298,7 @@ class PipelineRunner:
 
 
     def get_imported_repos(self):
-        endpoint = f'api/projects/v1/projects/{DOMINO_PROJECT_ID}/repositories'
-        method = 'GET'
-        imported_repos = submit_api_call(method, endpoint)
-        
-        return imported_repos
+        return self.metadata.get_imported_repos()
 
     # Imported repo configs are specified in 3 parts, delimited with commas.
     # The format is: repo_name,ref_type,ref_value
@@ -772,22 +2319,23 @@ class PipelineRunner:
             # the second is the ref type, but there may not be a third, for example if the ref type is 'HEAD'.
             modified_repo_name, *modified_git_ref = repo.split(',')
             modified_ref_type = modified_git_ref[0]
+            modified_ref_value = None
             if len(modified_git_ref) == 2:
                 modified_ref_value = modified_git_ref[1]
-            for current_repo in current_imported_repos['repositories']:
-                if current_repo['name'] == modified_repo_name:
-                    temp_config[i] = {
-                        'id': current_repo['id'],
-                        'ref_type': modified_ref_type,
-                    }
-                    original_config[i] = {
-                        'id': current_repo['id'],
-                        'ref_type': current_repo['defaultRef']['refType']
-                    }
-                    if 'value' in current_repo['defaultRef']:
-                        original_config[i]['ref_value'] = current_repo['defaultRef']['value']
-                    if modified_ref_value is not None:
-                        temp_config[i]['ref_value'] = modified_ref_value
+            current_repo = current_imported_repos.get(modified_repo_name)
+            if current_repo is not None:
+                temp_config[i] = {
+                    'id': current_repo['id'],
+                    'ref_type': modified_ref_type,
+                }
+                original_config[i] = {
+                    'id': current_repo['id'],
+                    'ref_type': current_repo['defaultRef']['refType']
+                }
+                if 'value' in current_repo['defaultRef']:
+                    original_config[i]['ref_value'] = current_repo['defaultRef']['value']
+                if modified_ref_value is not None:
+                    temp_config[i]['ref_value'] = modified_ref_value
 
         # The resulting dicts have the minimum required info to update the repo config for the project
         # and are formatted as such:
@@ -827,24 +2375,131 @@ class PipelineRunner:
             response = submit_api_call(method, endpoint, data=json.dumps(git_ref_config))
 
 
-    def submit_task(self, task):
-        logger.info(f"## Submitting task ## task_id: {task.task_id}, command: {task.command}, tier override: {task.tier}, environment override: {task.environment}, main repo override: {task.project_repo_git_ref}, imported repo overrides: {task.imported_repo_git_refs}")
-        request_body = {
-            'projectId': DOMINO_PROJECT_ID,
-            'title': task.task_id
-        }
+    def form_batches(self, tasks, slots):
+        """
+        Returns up to slots tasks and BatchJobs to submit, highest priority first. Ready leaf tasks that run
+        with the same environment, hardware tier and git refs are packed into BatchJobs of up to batch_size
+        tasks. Only leaf tasks are batched, since a batch reports its tasks when the whole job ends, which
+        would hold back the tasks depending on them.
+        """
+        units = []
+        open_batches = {}
+        for task in tasks:
+            if task.batchable and not self.dag.dependents[task.task_id]:
+                refs = ' '.join(sorted((task.imported_repo_git_refs or '').split()))
+                key = (task.environment, task.tier, task.project_repo_git_ref, refs)
+                members = open_batches.get(key)
+                if members is not None and len(members) < self.batch_size:
+                    members.append(task)
+                elif len(units) < slots:
+                    members = [task]
+                    open_batches[key] = members
+                    units.append(members)
+            elif len(units) < slots:
+                units.append(task)
+        batches = []
+        for unit in units:
+            if not isinstance(unit, list):
+                batches.append(unit)
+            elif len(unit) == 1:
+                batches.append(unit[0])
+            else:
+                batches.append(BatchJob(os.path.join(self.batch_dir, f"batch{next(self.batch_count)}"), unit))
+        return batches
+
+    def submit_tasks(self, tasks):
+        """
+        Submit a batch of ready tasks and BatchJobs. Domino Jobs that pin imported repo git refs are grouped by
+        their refs, and each group is submitted under one acquisition of the "multijob_locked" tag, so tasks
+        that pin the same branches do not each wait for the previous job to start up.
+        """
+        groups = {}
+        for task in tasks:
+            if task.imported_repo_git_refs and not self.is_local:
+                # the order of the repos in the option does not change the configuration
+                refs = ' '.join(sorted(task.imported_repo_git_refs.split()))
+                groups.setdefault(refs, []).append(task)
+        for refs, group in groups.items():
+            self.submit_imported_repo_group(refs, group)
+        # Tasks without custom refs are submitted once the project's own repo config is back in place
+        for task in tasks:
+            if not (task.imported_repo_git_refs and not self.is_local):
+                self.submit(task)
+
+    def submit(self, task):
+        if isinstance(task, BatchJob):
+            self.submit_batch(task)
+        else:
+            self.submit_task(task)
 
+    def submit_imported_repo_group(self, imported_repo_git_refs, tasks):
+        # Set the "multijob_locked" tag before doing anything else, then save the current imported repo
+        # config to revert later before setting the user config.
+        logger.info(f"Submitting {', '.join(task.task_id for task in tasks)} with imported repo refs {imported_repo_git_refs}")
+        tag_id = self.set_project_tag()
+        try:
+            original_config, temp_config = self.build_imported_repo_configs(imported_repo_git_refs)
+            self.set_imported_repo_config(temp_config)
+            try:
+                for task in tasks:
+                    self.submit(task)
+                # Domino doesn't load the imported git repo config as part of the job submission.
+                # Instead, it's loaded during job startup, which is the 'Preparing' state.
+                # Keep the custom config until every job of the group is starting up.
+                self.wait_for_jobs_to_start([task.job_id for task in tasks if task.job_id is not None])
+            finally:
+                self.set_imported_repo_config(original_config)
+        finally:
+            self.delete_project_tag(tag_id)
+
+    def wait_for_jobs_to_start(self, job_ids):
+        # One status snapshot per poll covers every job of the group
+        waiting = list(job_ids)
+        while waiting:
+            self.dag.status_cache.refresh(waiting)
+            waiting = [job_id for job_id in waiting if self.dag.status_cache.get(job_id) in ('Queued', 'Pending')]
+            if waiting:
+                time.sleep(3)
+
+    def prepare_attempt(self, task):
+        # Bookkeeping for a new attempt of a task; returns the log directory on the project dataset, if any
         if DOMINO_IS_GIT_BASED == 'true':
             dataset_root = '/mnt/data'
         else:
             dataset_root = '/domino/datasets/local'
+        log_path = None
         if os.path.exists(f'{dataset_root}/{DOMINO_PROJECT_NAME}'):
             log_path = f'{dataset_root}/{DOMINO_PROJECT_NAME}/logs'
             if not os.path.exists(log_path):
                 os.makedirs(log_path)
         
+        # A failed task that still has retries left is resubmitted
+        is_retry = task._status in FAILED_STATUSES
+        if is_retry:
+            task.retries += 1
+            task.start_time = None
+            task.run_start_time = None
+            logger.info(f"{task.task_id}: Retry {task.retries} of {task.max_retries}")
+            self.dag.unblock_dependents(task.task_id)
+
+        if task.log_paths is None:
+            task.log_paths = get_program_log_paths(task.command, log_path)
+        task.log_match = None
+        task.batch = None
+        if LOG_WATCHER is not None:
+            # Remote jobs write their program logs inside the job, so only their stdout can be watched
+            LOG_WATCHER.start(task.task_id, task.log_paths if self.is_local else [])
+        return log_path
+
+    def submit_task(self, task):
+        logger.info(f"## Submitting task ## task_id: {task.task_id}, command: {task.command}, tier override: {task.tier}, environment override: {task.environment}, main repo override: {task.project_repo_git_ref}, imported repo overrides: {task.imported_repo_git_refs}")
+        is_retry = task._status in FAILED_STATUSES
+        log_path = self.prepare_attempt(task)
+
         program_name = extract_program_name(task.command)
-        if program_name.lower().endswith('.r'):
+        if is_retry:
+            pass  # the command was already prepared on the first attempt
+        elif program_name.lower().endswith('.r'):
             logger.info('R script detected. Running via logrx::axecute().')
             task.command = f'R -e "tryCatch(expr={{logrx::axecute(\'{task.command}\',log_path=\'{log_path}\')}},error=function(e){{source(\'{task.command}\')}})"'
         elif program_name.lower().endswith('.sas') and not task.command.startswith('sas '):
@@ -859,60 +2514,74 @@ class PipelineRunner:
             task.command = f'node {task.command}'
 
         if self.is_local:
-            task.set_status('Submitted')
+            if log_path is None:
+                # Without a project dataset the logs of local jobs are kept in the working directory
+                log_path = os.path.join(os.getcwd(), 'logs')
+                os.makedirs(log_path, exist_ok=True)
             out_log_path = f"{log_path}/{task.task_id}_out.txt"
             err_log_path = f"{log_path}/{task.task_id}_err.txt"
-            task.process, task.out_thread, task.err_thread = start_background_job(task.task_id,
-                                                                                  task.command,
-                                                                                  out_log_path,
-                                                                                  err_log_path,
-                                                                                  self.add_timestamp)
+            task.run_start_time = time.time()
+            # The task only counts as submitted once its job is running with its logs open
+            task.process, task.logs = start_background_job(task.task_id,
+                                                           task.command,
+                                                           out_log_path,
+                                                           err_log_path,
+                                                           self.add_timestamp,
+                                                           self.task_event.set)
+            task.set_status('Submitted')
         else:
-            logger.info(f'Launching job for command: {task.command}')
-            request_body['runCommand'] = task.command
-            # If the user has specified custom git refs, set the "multijob_locked" tag before doing anything else
-            # Then, save the current imported repo config to revert later before setting the user config.
-            if task.imported_repo_git_refs:
-                tag_id = self.set_project_tag()
-                original_config, temp_config = self.build_imported_repo_configs(task.imported_repo_git_refs)
-                self.set_imported_repo_config(temp_config)
-            if task.tier:
-                hardware_tier_id = self.get_hardware_tier_id(task.tier)
-                request_body['hardwareTier'] = hardware_tier_id
-            if task.environment:
-                request_body['environmentId'] = task.environment
-            if task.project_repo_git_ref:
-                project_repo_config = task.project_repo_git_ref.split(',')
-                if len(project_repo_config) == 2:
-                    request_body['mainRepoGitRef'] = { 'refType': project_repo_config[0], 'value': project_repo_config[1] }
-                else:    
-                    request_body['mainRepoGitRef'] = { 'refType': project_repo_config[0] }
-
-            endpoint = 'api/jobs/v1/jobs'
-            method = 'POST'
-            job_info = submit_api_call(method, endpoint, data=json.dumps(request_body))
-            logger.info(job_info)
-            # Domino doesn't load the imported git repo config as part of the job submission.
-            # Instead, it's loaded during job startup, which is the 'Preparing' state.
-            # If using a custom git ref, Multijob should block until that job is Preparing.
-            # Once the job is starting up, revert the git config and delete the "multijob_lock" tag.
-            if task.imported_repo_git_refs:
-                while True:
-                    job_state = get_job_status(job_info['job']['id'])
-                    if job_state not in ['Queued', 'Pending']:
-                        break
-                    time.sleep(3)
-                self.set_imported_repo_config(original_config)
-                self.delete_project_tag(tag_id)
+            # record the job straight away, so that it can be reattached if multijob is interrupted
+            task.job_id = self.launch_job(task.task_id, task.command, task)
+            task.set_status('Submitted') # will technically be Queued or something else, but this will update on the next status check
 
             logger.info("## Submitted task: {0} ##".format(task.task_id))
-            task.job_id = job_info['job']['id']
-            task.set_status('Submitted') # will technically be Queued or something else, but this will update on the next status check
+            self.tag_job(task.job_id)
+
+    def submit_batch(self, batch):
+        logger.info(f"## Submitting batch ## {batch.task_id}, tier override: {batch.tier}, environment override: {batch.environment}, main repo override: {batch.project_repo_git_ref}, imported repo overrides: {batch.imported_repo_git_refs}")
+        for task in batch.tasks:
+            self.prepare_attempt(task)
+        batch.write_config()
+        batch.job_id = self.launch_job(batch.task_id, batch.command(self.batch_options), batch)
+        for task in batch.tasks:
+            task.batch = batch
+            task.job_id = batch.job_id
+            task.set_status('Submitted')
+        logger.info(f"## Submitted batch: {batch.task_id} ##")
+        self.tag_job(batch.job_id)
 
-            # add multijob tags to the job for reporting
-            set_job_tag(DOMINO_PROJECT_ID, task.job_id, "muiltijob")
-            set_job_tag(DOMINO_PROJECT_ID, task.job_id, self.job_name)
-            set_job_tag(DOMINO_PROJECT_ID, task.job_id, "title:" + self.job_title)
+    def launch_job(self, title, command, task):
+        # Start a Domino Job running command with the tier, environment and main repo ref of task; returns the job id
+        logger.info(f'Launching job for command: {command}')
+        request_body = {
+            'projectId': DOMINO_PROJECT_ID,
+            'title': title,
+            'runCommand': command,
+        }
+        # Custom imported repo git refs are set around the submission by submit_imported_repo_group()
+        if task.tier:
+            hardware_tier_id = self.get_hardware_tier_id(task.tier)
+            request_body['hardwareTier'] = hardware_tier_id
+        if task.environment:
+            request_body['environmentId'] = task.environment
+        if task.project_repo_git_ref:
+            project_repo_config = task.project_repo_git_ref.split(',')
+            if len(project_repo_config) == 2:
+                request_body['mainRepoGitRef'] = { 'refType': project_repo_config[0], 'value': project_repo_config[1] }
+            else:    
+                request_body['mainRepoGitRef'] = { 'refType': project_repo_config[0] }
+
+        endpoint = 'api/jobs/v1/jobs'
+        method = 'POST'
+        job_info = submit_api_call(method, endpoint, data=json.dumps(request_body))
+        logger.info(job_info)
+        return job_info['job']['id']
+
+    def tag_job(self, job_id):
+        # add multijob tags to the job for reporting; the tag writes are independent, so send them together
+        run_concurrently(set_job_tag, [(DOMINO_PROJECT_ID, job_id, "muiltijob"),
+                                       (DOMINO_PROJECT_ID, job_id, self.job_name),
+                                       (DOMINO_PROJECT_ID, job_id, "title:" + self.job_title)])
         
  
 def set_job_tag(project_id, job_id, tag):
@@ -924,14 +2593,71 @@ def set_job_tag(project_id, job_id, tag):
     }
     tag_info = submit_api_call(tag_method, tag_endpoint, data=json.dumps(tag_payload))
 
+def print_stats(args):
+    history_path = os.path.join(args.state_dir or get_default_state_dir(), 'history.sqlite')
+    if not os.path.exists(history_path):
+        logger.error(f"No run history found at {history_path}")
+        sys.exit(1)
+    history = TaskHistory(history_path, args.config_path)
+    task_stats = history.task_stats()
+    if len(task_stats) == 0:
+        logger.error(f"No run history found for {os.path.abspath(args.config_path)}")
+        sys.exit(1)
+
+    def format_seconds(values, fraction):
+        return f"{percentile(values, fraction):10.1f}" if values else f"{'-':>10}"
+
+    peak_rss = history.task_peak_rss()
+    print(f"{'task':30} {'attempts':>8} {'failures':>8} {'retries':>7} {'run p50':>10} {'run p95':>10} {'queue p50':>10} {'queue p95':>10} {'peak RSS':>10}")
+    for task_id, stats in sorted(task_stats.items(), key=lambda item: -percentile(item[1]['run_times'] or [0], 0.5)):
+        rss = format_memory(peak_rss[task_id]) if task_id in peak_rss else '-'
+        print(f"{task_id:30} {stats['attempts']:8} {stats['failures']:8} {stats['retries']:7} "
+              f"{format_seconds(stats['run_times'], 0.5)} {format_seconds(stats['run_times'], 0.95)} "
+              f"{format_seconds(stats['queue_times'], 0.5)} {format_seconds(stats['queue_times'], 0.95)} {rss:>10}")
+
+    if os.path.exists(args.config_path):
+        dag = build_dag(args.config_path)
+        durations = history.task_durations()
+        dag.set_priorities(durations)
+        critical_path = dag.get_critical_path()
+        print(f"\nCritical path ({dag.priorities[critical_path[0]]:.1f} seconds at p50):")
+        for task_id in critical_path:
+            duration = f"{durations[task_id]:.1f} seconds" if task_id in durations else "no history"
+            print(f"  {task_id} ({duration})")
+
+    run_id, wall_time, total_run_time, parallelism = history.last_run_parallelism()
+    print(f"\nLast run {run_id}: {wall_time:.1f} seconds wall-clock, {total_run_time:.1f} seconds of task run time, "
+          f"parallelism achieved {parallelism:.2f}")
+
+
 """
 Parse command line arguments.  Read and validate the configuration file and initiate jobs.
 """
 
+def stats_main(argv):
+    parser = ArgumentParser(prog="multijob stats",
+                            description="Report task timings recorded by previous runs of a config: p50/p95 run and queue "
+                            "times and peak RSS per task, the critical path and the parallelism achieved by the last run.")
+    parser.add_argument('config_path',
+                        type=str,
+                        help='path to the config file the runs were made with')
+    parser.add_argument('--state-dir',
+                        type=str,
+                        default=None,
+                        help='directory multijob keeps its state in (default: .multijob in the project dataset, '
+                        'or in the current directory if there is no project dataset)')
+    print_stats(parser.parse_args(argv))
+
+
 def main():
-    global KEEP_EMPTY_LOGS, FORCE_RERUN
+    global KEEP_EMPTY_LOGS, FORCE_RERUN, LOG_ERRORS, LOG_WATCHER
+    if len(sys.argv) > 1 and sys.argv[1] == 'stats':
+        stats_main(sys.argv[2:])
+        return
+
     parser = ArgumentParser(description="Run a directed, acyclic graph of jobs defined in a config file.",
-                            epilog="Multijob is designed to run only within a Domino workspace.")
+                            epilog="Multijob is designed to run only within a Domino workspace. "
+                            "Run with 'stats CONFIG_PATH' to report task timings from previous runs.")
     parser.add_argument('config_path',
                         type=str,
                         help='path to the config file defining the multijob DAG')
@@ -940,7 +2666,9 @@ def main():
                         type=int,
                         default=1,
                         metavar='N',
-                        help='number of jobs to run in parallel for local jobs or the maximum number of jobs in queued state for Domino Jobs (default: 1 for local, 10 for Domino Jobs)')
+                        help='maximum number of jobs to run in parallel for local jobs, which also start only when the memory they need, '
+                        'and the CPUs of tasks with a "cpus" option, are free, or the maximum number of jobs in queued state '
+                        'for Domino Jobs (default: 1 for local, 10 for Domino Jobs)')
     parser.add_argument('-l', '--local',
                         action='store_true',
                         help='if provided, jobs run locally rather than being launched as Domino Jobs (default: launch jobs)')
@@ -953,15 +2681,62 @@ def main():
                         help='if provided, keep output and error logs even if empty (default: false)')
     parser.add_argument('-f', '--force',
                         action='store_true',
-                        help='if provided, force the run of dependent jobs (default: false). Overrides input/output file timestamp checks.')
+                        help='if provided, force the run of dependent jobs (default: false). Overrides input/output file content checks.')
+    parser.add_argument('--resume',
+                        action='store_true',
+                        help='if provided, resume the last run of this config: tasks that succeeded are skipped and '
+                        'Domino Jobs that were still running are reattached instead of being submitted again (default: false)')
+    parser.add_argument('--state-dir',
+                        type=str,
+                        default=None,
+                        help='directory for the files multijob keeps between runs, such as the content digest manifest '
+                        '(default: .multijob in the project dataset, or in the current directory if there is no project dataset)')
+    parser.add_argument('--log-errors',
+                        choices=['off', 'warn', 'fail', 'abort'],
+                        default='warn',
+                        help='what to do when the log of a task matches a failure signature, such as a SAS "ERROR:" line: '
+                        'report it (warn), also fail the task whatever its exit code and block the tasks depending on it (fail), '
+                        'or also stop the job at once (abort). The logs of Domino Jobs are only polled with fail or abort (default: warn)')
+    parser.add_argument('--log-signatures',
+                        type=str,
+                        default=None,
+                        metavar='PATH',
+                        help='file of additional failure signatures, one regular expression per line')
+    parser.add_argument('--metadata-ttl',
+                        type=int,
+                        default=None,
+                        metavar='SECONDS',
+                        help='fetch the hardware tiers and imported repositories of the project again after this many seconds '
+                        '(default: fetch them once per run)')
+    parser.add_argument('--batch',
+                        type=int,
+                        default=1,
+                        metavar='N',
+                        help='for Domino Jobs, run up to N ready tasks that nothing depends on and that have the same environment, '
+                        'hardware tier and git refs together in one job, side by side, each reported as if it ran in a job of its own. '
+                        'Add "batch: false" to a task to keep it in a job of its own. The batch configs are kept in the state directory, '
+                        'which must be on a dataset that the jobs mount (default: 1, no batching)')
+    parser.add_argument('--batch-job',
+                        action='store_true',
+                        help='set by --batch for the run inside a batch job: run every task whatever the others do, '
+                        'and skip the dataset cleanup and the CX steps of the outer run')
+    parser.add_argument('--no-cancel',
+                        action='store_true',
+                        help='if provided, leave Domino Jobs running when the pipeline fails or is interrupted, so that --resume '
+                        'can reattach to them (default: stop them). Local jobs are always stopped.')
 
     args = parser.parse_args()
 
     cli_add_timestamp = not args.nots
     KEEP_EMPTY_LOGS = args.keep
     FORCE_RERUN = args.force
+    LOG_ERRORS = args.log_errors
+    if LOG_ERRORS != 'off':
+        signatures = DEFAULT_LOG_SIGNATURES + (read_log_signatures(args.log_signatures) if args.log_signatures else [])
+        LOG_WATCHER = LogWatcher(signatures)
 
-    tick_freq = 0 if args.local else 5
+    # Local job completions wake the runner immediately, so the tick is only a fallback poll interval
+    tick_freq = 1 if args.local else 5
     queue_limit = max(1, min(args.j, 128 if args.local else 10))
 
     job_start_time = re.sub("[-.:]", "", str(datetime.now())).replace(" ", "")[0:14]
@@ -969,22 +2744,64 @@ def main():
 
     pipeline_cfg_path = args.config_path
     if os.path.exists(pipeline_cfg_path):
-        if PRERUN_CLEANUP == 'true':
+        if PRERUN_CLEANUP == 'true' and not args.resume and not args.batch_job:
             cleanup_dataset()
         
         try:
             dag = build_dag(pipeline_cfg_path)
+            # the tasks of a batch are independent, and each of them reports its own status
+            dag.allow_partial_failure = args.batch_job
             logger.info(f"DAG: {dag}")
             dag.validate_dag()
+            state_dir = os.path.abspath(args.state_dir or get_default_state_dir())
+            batch_size = max(1, args.batch)
+            if batch_size > 1 and not args.local and not is_on_dataset(state_dir):
+                # The batch jobs read their configs from and write their journals to the state directory
+                logger.error(f"--batch needs a state directory on a dataset that the jobs mount, which {state_dir} is not; "
+                             "running every task in a job of its own. Pass --state-dir on the project dataset to batch tasks.")
+                batch_size = 1
+            journal = RunJournal(get_state_file_path(state_dir, pipeline_cfg_path, 'journal.jsonl'), f"{DOMINO_RUN_ID}-{job_start_time}")
+            history = TaskHistory(os.path.join(state_dir, 'history.sqlite'), pipeline_cfg_path)
+            dag.set_priorities(history.task_durations())
+            logger.info(f"Critical path: {' -> '.join(dag.get_critical_path())}")
+            if args.resume:
+                last_run_id, journal_entries = journal.last_run()
+                if last_run_id is None:
+                    logger.info("No previous run found in the journal, starting a new run.")
+                else:
+                    logger.info(f"Resuming run {last_run_id}.")
+                    journal.run_id = last_run_id
+                    dag.resume(journal_entries)
+            # set after resuming, so the restored tasks are neither journaled nor hashed again
+            dag.manifest = RunManifest(get_state_file_path(state_dir, pipeline_cfg_path, 'manifest.json'))
+            dag.journal = journal
+            history.run_id = journal.run_id
+            # the runs inside batch jobs handle logs like this run does
+            batch_options = ['--log-errors', LOG_ERRORS]
+            if args.log_signatures:
+                batch_options += ['--log-signatures', os.path.abspath(args.log_signatures)]
+            if args.nots:
+                batch_options.append('--nots')
+            if args.keep:
+                batch_options.append('--keep')
+            dag.history = history
             pipeline_runner = PipelineRunner(dag,
                                              tick_freq=tick_freq,
                                              is_local=args.local,
                                              queue_limit=queue_limit,
                                              add_timestamp=cli_add_timestamp,
                                              job_name=job_name,
-                                             job_title=pipeline_cfg_path)
+                                             job_title=pipeline_cfg_path,
+                                             executor=LocalExecutor(history.task_peak_rss()) if args.local else None,
+                                             cancel_remote_jobs=not args.no_cancel,
+                                             metadata_ttl=args.metadata_ttl,
+                                             batch_size=batch_size,
+                                             batch_dir=os.path.join(state_dir, 'batches', journal.run_id),
+                                             batch_options=batch_options)
+            if LOG_WATCHER is not None:
+                LOG_WATCHER.on_match = pipeline_runner.task_event.set
             pipeline_runner.run()
-            if CXRUN == 'true':
+            if CXRUN == 'true' and not args.batch_job:
                 full_cx()
                 """ 
                 Removing call to copy_analysis_outputs which copies the default analysis dataset to the source domain 
@@ -0,0 +1,88 @@
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Runs the programs of a batched Flow task side by side inside one Domino job. build_flow(..., batch_size=N)
+# packs Flow tasks that nothing depends on into one job to save a job startup per task; the job runs
+#
+#     python3 flows/run_batch.py 'prod/tfl/t_pop.sas' 'prod/tfl/t_vscat.sas' ...
+#
+# Each program reads its inputs from and writes its outputs to /workflow/inputs and /workflow/outputs as it does in a
+# job of its own. Its stdout and stderr go to <log dir>/<program>_out.txt and _err.txt, and the status, exit code and
+# run time of every program go to <log dir>/batch_status.json. The job fails when any program fails.
+
+# Exit codes that count as success, by program extension: SAS exits with 1 when the log has warnings
+SUCCESS_CODES = {".sas": (0, 1)}
+INTERPRETERS = {".sas": ["sas"], ".r": ["Rscript"], ".py": ["python3"]}
+
+
+def default_log_dir():
+    # The results directory, which Domino keeps with the job: /mnt/artifacts/results in git-based projects
+    if os.environ.get("DOMINO_IS_GIT_BASED") == "true" or os.path.isdir("/mnt/artifacts"):
+        return "/mnt/artifacts/results"
+    return os.path.join(os.environ.get("DOMINO_WORKING_DIR", os.getcwd()), "results")
+
+
+def program_args(command):
+    # The command line of a task command, with the interpreter that a job of its own would use
+    args = shlex.split(command)
+    extension = os.path.splitext(args[0])[1].lower()
+    return INTERPRETERS.get(extension, []) + args, SUCCESS_CODES.get(extension, (0,))
+
+
+def log_names(commands):
+    # Log file name of each command: the program name, numbered when the batch runs a program more than once
+    names = [os.path.splitext(os.path.basename(shlex.split(command)[0]))[0] for command in commands]
+    return [f"{name}_{i + 1}" if names.count(name) > 1 else name for i, name in enumerate(names)]
+
+
+def run_program(command, name, log_dir):
+    args, success_codes = program_args(command)
+    out_path = os.path.join(log_dir, f"{name}_out.txt")
+    err_path = os.path.join(log_dir, f"{name}_err.txt")
+    print(f"Starting {command}", flush=True)
+    started = time.monotonic()
+    try:
+        with open(out_path, "w") as out, open(err_path, "w") as err:
+            exit_code = subprocess.run(args, stdout=out, stderr=err, stdin=subprocess.DEVNULL).returncode
+    except OSError as e:
+        with open(err_path, "a") as err:
+            err.write(f"{e}\n")
+        exit_code = None
+    seconds = time.monotonic() - started
+    status = "Succeeded" if exit_code in success_codes else "Failed"
+    print(f"{status}: {command} (exit code {exit_code}, {seconds:.1f} s, logs {out_path} and {err_path})", flush=True)
+    return {"command": command, "status": status, "exit_code": exit_code, "seconds": round(seconds, 1),
+            "out_log": out_path, "err_log": err_path}
+
+
+def main():
+    parser = ArgumentParser(description="Run the programs of a batched Flow task side by side.")
+    parser.add_argument("commands", nargs="+", help="Task commands, relative to the repository root")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Programs running at the same time (default: the number of CPUs)")
+    parser.add_argument("--log-dir", default=None, help="Directory for the program logs and batch_status.json (default: the results directory)")
+    args = parser.parse_args()
+
+    log_dir = args.log_dir or default_log_dir()
+    os.makedirs(log_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, min(args.workers, len(args.commands)))) as executor:
+        results = list(executor.map(lambda command, name: run_program(command, name, log_dir), args.commands, log_names(args.commands)))
+
+    with open(os.path.join(log_dir, "batch_status.json"), "w") as file:
+        json.dump(results, file, indent=2)
+    failed = [result["command"] for result in results if result["status"] != "Succeeded"]
+    print(f"{len(results) - len(failed)} of {len(results)} programs succeeded")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
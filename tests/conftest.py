@@ -0,0 +1,157 @@
+import importlib.util
+import json
+import os
+import sys
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_PIPELINES_DIR = os.path.join(REPO_ROOT, "flows", "legacy_pipelines")
+
+# The scripts are run from their own directories and import their neighbours as top level modules
+for directory in (LEGACY_PIPELINES_DIR, os.path.join(REPO_ROOT, "flows"), os.path.join(REPO_ROOT, "utils"),
+                  os.path.join(REPO_ROOT, "utils", "SDTM_transfer")):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+# multijob-local.py reads its Domino settings from the environment when it is imported
+MULTIJOB_ENVIRONMENT = {
+    "DOMINO_RUN_ID": "test-run",
+    "DOMINO_STARTING_USERNAME": "test-user",
+    "DOMINO_API_PROXY": "http://127.0.0.1:9",
+    "DOMINO_PROJECT_ID": "test-project-id",
+    "DOMINO_PROJECT_OWNER": "test-owner",
+    "DOMINO_PROJECT_NAME": "test-project",
+    "DOMINO_IS_GIT_BASED": "true",
+}
+
+
+@pytest.fixture(scope="session")
+def multijob():
+    # multijob-local.py, imported under a name without the hyphen
+    pytest.importorskip("backoff")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, value in MULTIJOB_ENVIRONMENT.items():
+            monkeypatch.setenv(name, value)
+        spec = importlib.util.spec_from_file_location("multijob_local", os.path.join(LEGACY_PIPELINES_DIR, "multijob-local.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    # Writes a multijob config file from {task_id: {option: value}} and returns its path
+    def write(sections):
+        path = tmp_path / "pipeline.cfg"
+        path.write_text("".join(
+            f"[{task_id}]\n" + "".join(f"{option}: {value}\n" for option, value in options.items()) + "\n"
+            for task_id, options in sections.items()))
+        return str(path)
+    return write
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            from requests import HTTPError
+            raise HTTPError(f"{self.status_code} Error", response=self)
+
+
+class FakeDominoApi:
+    """
+    Stands in for the requests session of multijob-local.py. Handlers are registered by method and path, e.g.
+    api.route("GET", "api/jobs/beta/jobs", handler), and called with the query parameters and the decoded request
+    body; they return the JSON response, or a FakeResponse. Every request is kept in self.calls as
+    (method, path, params).
+    """
+    def __init__(self):
+        self.routes = {}
+        self.calls = []
+
+    def route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    def request(self, method, url, headers=None, data=None, **kwargs):
+        parts = urlsplit(url)
+        path = parts.path.lstrip("/")
+        params = dict(parse_qsl(parts.query))
+        self.calls.append((method, path, params))
+        handler = self.routes.get((method, path))
+        if handler is None:
+            return FakeResponse(404, {"message": f"No route for {method} {path}"})
+        response = handler(params, json.loads(data) if data else None)
+        return response if isinstance(response, FakeResponse) else FakeResponse(200, response)
+
+    @staticmethod
+    def response(status_code, body):
+        # A response other than 200, for handlers to return
+        return FakeResponse(status_code, body)
+
+    def paths(self, method=None):
+        return [path for call_method, path, params in self.calls if method is None or call_method == method]
+
+
+@pytest.fixture
+def domino_api(multijob, monkeypatch):
+    # The Domino API as seen by multijob-local.py, without a network
+    api = FakeDominoApi()
+    monkeypatch.setattr(multijob, "API_SESSION", api)
+    return api
+
+
+class FakeProc:
+    """
+    The /proc and /sys/fs/cgroup files that multijob-local.py reads to size local jobs, kept under a temporary
+    directory: the memory of the node, the memory and CPU limits of the container, and the resident memory of
+    process groups.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.pid = 1000
+
+    def write(self, path, text):
+        target = self.root / path.lstrip("/")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(text)
+
+    def meminfo(self, total, available):
+        self.write("/proc/meminfo", f"MemTotal: {total // 1024} kB\nMemFree: {available // 1024} kB\n"
+                                    f"MemAvailable: {available // 1024} kB\nHugePages_Total: 0\n")
+
+    def cgroup(self, memory_limit=None, memory_usage=0, cpu_quota=None):
+        # cgroup v2 limits; a CPU quota is given in CPUs
+        self.write("/sys/fs/cgroup/memory.max", f"{memory_limit}\n" if memory_limit else "max\n")
+        self.write("/sys/fs/cgroup/memory.current", f"{memory_usage}\n")
+        self.write("/sys/fs/cgroup/cpu.max", f"{int(cpu_quota * 100000)} 100000\n" if cpu_quota else "max 100000\n")
+
+    def process(self, pgid, rss):
+        # A process of the process group pgid with rss bytes resident
+        self.pid += 1
+        pages = rss // os.sysconf("SC_PAGE_SIZE")
+        fields = ["S", "1", str(pgid)] + ["0"] * 18 + [str(pages)]
+        self.write(f"/proc/{self.pid}/stat", f"{self.pid} (sas worker) {' '.join(fields)}\n")
+
+
+@pytest.fixture
+def fake_proc(multijob, tmp_path, monkeypatch):
+    # Redirects the /proc and /sys reads of multijob-local.py to a FakeProc with 8 CPUs and no container limits
+    proc = FakeProc(tmp_path / "root")
+    proc.cgroup()
+
+    def redirect(path):
+        return str(proc.root) + path if str(path).startswith(("/proc", "/sys/")) else path
+    monkeypatch.setattr(multijob, "open", lambda path, *args, **kwargs: open(redirect(path), *args, **kwargs), raising=False)
+    listdir = os.listdir
+    monkeypatch.setattr(multijob.os, "listdir", lambda path=".": listdir(redirect(path)))
+    monkeypatch.setattr(multijob.os, "sched_getaffinity", lambda pid: set(range(8)))
+    return proc
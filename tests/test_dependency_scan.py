@@ -0,0 +1,130 @@
+import io
+
+import pytest
+
+import dependency_scan
+
+
+def test_transitive_reduction_drops_implied_dependencies():
+    dependencies = {"a": set(), "b": {"a"}, "c": {"a", "b"}, "d": {"a", "b", "c"}, "e": {"a"}}
+    assert dependency_scan.transitive_reduction(dependencies) == {
+        "a": [], "b": ["a"], "c": ["b"], "d": ["c"], "e": ["a"],
+    }
+
+
+def test_transitive_reduction_leaves_cycles():
+    dependencies = {"a": {"b"}, "b": {"a"}, "c": {"a"}}
+    assert dependency_scan.transitive_reduction(dependencies) == {"a": ["b"], "b": ["a"], "c": ["a"]}
+    dependencies = {"a": {"x", "y"}, "x": {"y"}, "y": {"x"}}
+    assert dependency_scan.transitive_reduction(dependencies)["a"] == ["x", "y"]
+
+
+def test_find_cycle_members():
+    dependencies = {"a": {"b"}, "b": {"a"}, "c": {"a"}, "d": set()}
+    assert dependency_scan.find_cycle_members(dependencies) == ["a", "b", "c"]
+
+
+def test_scan_sas_reads_whole_libraries():
+    result = dependency_scan.scan_sas("""
+        data adam.adsl;
+            set adsl;
+        run;
+        %s_compare(base = ADAM._ALL_, comp = ADAMQC._ALL_, comprpt = '/mnt/artifacts/compare.pdf');
+        proc sql; create table work.x as select * from adam.adae; quit;
+    """)
+    assert result["read_libraries"] == ["adam", "adamqc"]
+    assert result["reads"] == ["adam.adae"]
+    assert result["writes"] == ["adam.adsl", "work.x"]
+
+
+# The ADaM programs, their QC programs and the compare program, which rewrites adam.adsl and compares the
+# ADAM and ADAMQC libraries as a whole
+PROGRAMS = {
+    "prod/adam/ADSL.sas": "data adam.adsl; set sdtm.dm; run;",
+    "prod/adam/ADAE.sas": "data adam.adae; merge adam.adsl sdtm.ae; run;",
+    "qc/adam/qc_ADSL.sas": "data adamqc.adsl; set sdtm.dm; run;",
+    "qc/adam/qc_ADAE.sas": "data adamqc.adae; merge adamqc.adsl sdtm.ae; run;",
+    "qc/adam/qc_t_dm1.sas": "data adamqc.adae; set adamqc.adsl; run;",
+    "qc/adam/compare_adam.sas": "data adam.adsl; set adsl; run; %s_compare(base = ADAM._ALL_, comp = ADAMQC._ALL_);",
+}
+LIBNAMES = {"adam": "/mnt/data/ADAM", "adamqc": "/mnt/data/ADAMQC", "sdtm": "/mnt/imported/data/SDTM"}
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(dependency_scan, "REPO_ROOT", str(tmp_path))
+    for program, text in PROGRAMS.items():
+        path = tmp_path / program
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return dependency_scan.build_index(sorted(PROGRAMS), dependency_scan.ScanCache(None), LIBNAMES)
+
+
+def test_build_index_expands_library_reads(index):
+    assert index["compare_adam"]["reads"] == [
+        "/mnt/data/ADAM/adae.sas7bdat",
+        "/mnt/data/ADAMQC/adae.sas7bdat",
+        "/mnt/data/ADAMQC/adsl.sas7bdat",
+    ]
+    assert index["ADAE"]["reads"] == ["/mnt/data/ADAM/adsl.sas7bdat", "/mnt/imported/data/SDTM/ae.sas7bdat"]
+
+
+def test_infer_dependencies_uses_the_producer_named_after_a_dataset(index):
+    producers = dependency_scan.find_producers(index)
+    assert producers["/mnt/data/ADAM/adsl.sas7bdat"] == ["ADSL"]
+    assert producers["/mnt/data/ADAMQC/adae.sas7bdat"] == ["qc_ADAE"]
+
+    dependencies = dependency_scan.infer_dependencies(index, producers)
+    assert dependencies["ADAE"] == {"ADSL"}
+    # compare_adam also rewrites adam.adsl, so it runs after ADSL
+    assert dependencies["compare_adam"] == {"ADAE", "ADSL", "qc_ADAE", "qc_ADSL"}
+    assert dependency_scan.transitive_reduction(dependencies)["compare_adam"] == ["ADAE", "qc_ADAE"]
+
+
+def test_infer_dependencies_with_several_producers():
+    index = {
+        "one": {"program": "prod/one.sas", "reads": [], "writes": ["/mnt/data/X/shared.sas7bdat"]},
+        "two": {"program": "prod/two.sas", "reads": [], "writes": ["/mnt/data/X/shared.sas7bdat"]},
+        "reader": {"program": "prod/reader.sas", "reads": ["/mnt/data/X/shared.sas7bdat"], "writes": []},
+    }
+    dependencies = dependency_scan.infer_dependencies(index)
+    assert dependencies == {"one": set(), "two": {"one"}, "reader": {"one", "two"}}
+
+    out = io.StringIO()
+    dependency_scan.write_config(out, index, dependency_scan.transitive_reduction(dependencies))
+    # with no single producer, the dataset is no output of either writer; depends covers the readers
+    assert "output:" not in out.getvalue()
+    assert "[two]\ncommand: prod/two.sas\ndepends: one\n" in out.getvalue()
+    assert "[reader]\ncommand: prod/reader.sas\ndepends: two\n" in out.getvalue()
+
+
+def test_infer_dependencies_orders_every_writer_of_a_dataset(index):
+    # qc_t_dm1 rewrites adamqc.adae after its producer qc_ADAE, and two programs sharing an output run one at a time
+    index = dict(index, compare_tfl={"program": "qc/tfl/compare_tfl.sas", "reads": [],
+                                     "writes": ["/mnt/data/COMPARE/summary.sas7bdat"]})
+    compare_adam = index["compare_adam"]
+    index["compare_adam"] = dict(compare_adam, writes=compare_adam["writes"] + ["/mnt/data/COMPARE/summary.sas7bdat"])
+    dependencies = dependency_scan.infer_dependencies(index)
+    assert dependencies["qc_t_dm1"] == {"qc_ADAE", "qc_ADSL"}
+    assert dependencies["compare_tfl"] == {"compare_adam"}
+    assert dependency_scan.find_cycle_members(dependencies) == []
+
+
+def test_write_config_lists_outputs_only_for_their_producer(index):
+    producers = dependency_scan.find_producers(index)
+    dependencies = dependency_scan.transitive_reduction(dependency_scan.infer_dependencies(index, producers))
+    out = io.StringIO()
+    dependency_scan.write_config(out, index, dependencies, producers, environment="env-1")
+    sections = {}
+    for block in out.getvalue().split("\n[")[1:]:
+        task_id, _, body = block.partition("]\n")
+        sections[task_id] = dict(line.split(": ", 1) for line in body.strip().splitlines())
+
+    assert sections["ADSL"]["output"] == "/mnt/data/ADAM/adsl.sas7bdat"
+    assert "output" not in sections["compare_adam"]
+    assert "output" not in sections["qc_t_dm1"]
+    assert sections["qc_ADAE"]["output"] == "/mnt/data/ADAMQC/adae.sas7bdat"
+    assert sections["ADAE"]["depends"] == "ADSL"
+    assert sections["compare_adam"]["depends"] == "ADAE,qc_ADAE"
+    assert sections["compare_adam"]["environment"] == "env-1"
+    assert sections["compare_adam"]["command"] == "qc/adam/compare_adam.sas"
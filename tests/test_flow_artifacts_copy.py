@@ -0,0 +1,93 @@
+import hashlib
+
+import pytest
+
+import flow_artifacts_copy
+
+SNIPPET = '''
+from flytekit.types.file import FlyteFile
+adsl = FlyteFile.from_source(BlobDataLocation("s3://flyte-data/ab/adsl", local_dir="", local_filename="adsl.sas7bdat", local_file_extension=""))
+adae = FlyteFile.from_source(BlobDataLocation(
+    's3://flyte-data/cd/adae',
+    local_dir='',
+    local_file_extension='.sas7bdat',
+))
+report = FlyteFile.from_source(BlobDataLocation("s3://flyte-data/ef/report.pdf"))
+'''
+
+
+def test_parse_snippet():
+    assert [(blob["uri"], blob["filename"]) for blob in flow_artifacts_copy.parse_snippet(SNIPPET)] == [
+        ("s3://flyte-data/ab/adsl", "adsl.sas7bdat"),
+        ("s3://flyte-data/cd/adae", "adae.sas7bdat"),
+        ("s3://flyte-data/ef/report.pdf", "report.pdf"),
+    ]
+
+
+def test_parse_snippet_without_blobs():
+    with pytest.raises(ValueError, match="no BlobDataLocation"):
+        flow_artifacts_copy.parse_snippet("print('hello')", "snippet.py")
+
+
+def test_parse_snippet_rejects_paths_as_filenames():
+    with pytest.raises(ValueError, match="plain file name"):
+        flow_artifacts_copy.parse_snippet('BlobDataLocation("s3://b/k", local_filename="../adsl.sas7bdat")')
+
+
+class FakeReader:
+    # A store that returns an ETag which is not the MD5 of the content, as for SSE-KMS encrypted objects
+    def __init__(self, data):
+        self.data = data
+
+    def stat(self, uri):
+        return len(self.data), '"0123456789abcdef0123456789abcdef"'
+
+    def chunks(self, uri, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+
+def blob(data=b"", **fields):
+    entry = {"uri": "s3://flyte-data/ab/adsl", "filename": "adsl.sas7bdat", **fields}
+    return flow_artifacts_copy.normalize_blob(entry, "test")
+
+
+def test_download_does_not_check_the_etag_as_md5(tmp_path):
+    data = b"x" * 1000
+    result, record = flow_artifacts_copy.download_blob(FakeReader(data), blob(), str(tmp_path), None, 64)
+    assert result == "downloaded"
+    assert (tmp_path / "adsl.sas7bdat").read_bytes() == data
+    assert record["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+def test_download_checks_the_etag_as_md5_when_asked(tmp_path):
+    with pytest.raises(ValueError, match="MD5"):
+        flow_artifacts_copy.download_blob(FakeReader(b"x" * 1000), blob(), str(tmp_path), None, 64, trust_etag=True)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_checks_the_manifest_checksums(tmp_path):
+    data = b"x" * 1000
+    with pytest.raises(ValueError, match="SHA-256"):
+        flow_artifacts_copy.download_blob(FakeReader(data), blob(sha256="0" * 64), str(tmp_path), None, 64)
+    with pytest.raises(ValueError, match="bytes"):
+        flow_artifacts_copy.download_blob(FakeReader(data), blob(size=999), str(tmp_path), None, 64)
+    result, _ = flow_artifacts_copy.download_blob(
+        FakeReader(data), blob(md5=hashlib.md5(data).hexdigest(), size=1000), str(tmp_path), None, 64)
+    assert result == "downloaded"
+
+
+def test_copy_blobs_drops_repeated_entries(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"y" * 5000)
+    entry = {"uri": str(source), "filename": "adsl.sas7bdat"}
+    blobs = [flow_artifacts_copy.normalize_blob(entry, "test") for _ in range(3)]
+    summary = flow_artifacts_copy.copy_blobs(blobs, str(tmp_path / "out"), workers=3)
+    assert (summary["downloaded"], summary["skipped"], summary["failed"]) == (1, 0, [])
+    assert (tmp_path / "out" / "adsl.sas7bdat").read_bytes() == source.read_bytes()
+
+
+def test_copy_blobs_rejects_two_blobs_for_one_file(tmp_path):
+    blobs = [blob(), flow_artifacts_copy.normalize_blob({"uri": "s3://flyte-data/other", "filename": "adsl.sas7bdat"}, "test")]
+    with pytest.raises(ValueError, match="would be written to adsl.sas7bdat"):
+        flow_artifacts_copy.copy_blobs(blobs, str(tmp_path))
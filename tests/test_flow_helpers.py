@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flytekit")
+pytest.importorskip("flytekitplugins.domino")
+
+import flow_helpers
+
+
+def task(environment="sas", hardware_tier="small", cache=False, batch=True, inputs=()):
+    return {"environment": environment, "hardware_tier": hardware_tier, "cache": cache, "batch": batch,
+            "inputs": list(inputs)}
+
+
+def plan(tasks, dependencies, batch_size):
+    spec = SimpleNamespace(tasks=tasks, dependencies={section: dependencies.get(section, []) for section in tasks})
+    return flow_helpers.plan_batches(spec, list(tasks), batch_size)
+
+
+def test_plan_batches_packs_leaves_after_their_dependencies():
+    tasks = {
+        "adsl": task(),
+        "t_pop": task(inputs=[("adsl", "adsl")]),
+        "t_ae": task(inputs=[("adsl", "adsl")]),
+        "t_vs": task(inputs=[("adsl", "adsl")]),
+    }
+    assert plan(tasks, {"t_pop": ["adsl"], "t_ae": ["adsl"], "t_vs": ["adsl"]}, 2) == [
+        ["adsl"], ["t_pop", "t_ae"], ["t_vs"]]
+
+
+def test_plan_batches_without_batching():
+    tasks = {"t_pop": task(), "t_ae": task()}
+    assert plan(tasks, {}, 1) == [["t_pop"], ["t_ae"]]
+
+
+def test_plan_batches_keeps_incompatible_tasks_apart():
+    tasks = {
+        "t_pop": task(inputs=[("adsl", "adsl")]),
+        "t_ae": task(inputs=[("adsl", "adsl_v2")]),
+        "t_vs": task(hardware_tier="large"),
+        "t_lb": task(batch=False),
+        "t_cm": task(inputs=[("adsl", "adsl")]),
+    }
+    assert plan(tasks, {}, 4) == [["t_ae"], ["t_vs"], ["t_lb"], ["t_pop", "t_cm"]]
@@ -0,0 +1,559 @@
+import itertools
+import os
+import signal
+import subprocess
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.mark.parametrize("fraction, expected", [
+    (0.0, 1),
+    (0.1, 1),
+    (0.25, 3),
+    (0.5, 5),
+    (0.75, 8),
+    (0.9, 9),
+    (0.95, 10),
+    (1.0, 10),
+])
+def test_percentile_is_nearest_rank(multijob, fraction, expected):
+    assert multijob.percentile(list(range(10, 0, -1)), fraction) == expected
+
+
+def test_percentile_of_a_single_value(multijob):
+    assert multijob.percentile([4.2], 0.5) == 4.2
+    assert multijob.percentile([4.2], 0.95) == 4.2
+
+
+def test_percentile_rounds_up_at_half_ranks(multijob):
+    # 0.5 * 5 = 2.5 ranks up to the 3rd value; banker's rounding would give the 2nd
+    assert multijob.percentile([1, 2, 3, 4, 5], 0.5) == 3
+
+
+def build(multijob, config_file, dependencies):
+    return multijob.build_dag(config_file({
+        task_id: dict(command=f"{task_id}.sas", **({"depends": ",".join(deps)} if deps else {}))
+        for task_id, deps in dependencies.items()
+    }))
+
+
+def normalize_cycle(cycle):
+    # The same cycle may start at any of its tasks
+    assert cycle[0] == cycle[-1]
+    members = cycle[:-1]
+    start = members.index(min(members))
+    return members[start:] + members[:start]
+
+
+def test_find_cycles_without_cycles(multijob, config_file):
+    dag = build(multijob, config_file, {"a": [], "b": ["a"], "c": ["a", "b"]})
+    assert dag.find_cycles() == []
+
+
+def test_find_cycles_reports_every_cycle(multijob, config_file):
+    dag = build(multijob, config_file, {
+        "a": ["c"], "b": ["a"], "c": ["b"],  # a -> c -> b -> a
+        "d": ["e"], "e": ["d"],
+        "f": ["f"],
+        "g": ["a"],  # downstream of a cycle, but not on one
+    })
+    cycles = sorted(normalize_cycle(cycle) for cycle in dag.find_cycles())
+    assert cycles == [["a", "c", "b"], ["d", "e"], ["f"]]
+
+
+def test_validate_dag_exits_on_a_cycle(multijob, config_file):
+    dag = build(multijob, config_file, {"a": ["b"], "b": ["a"]})
+    with pytest.raises(SystemExit):
+        dag.validate_dag()
+
+
+def test_journal_resume_restores_the_last_run(multijob, config_file, tmp_path):
+    dependencies = {"a": [], "b": ["a"], "c": ["b"], "d": []}
+    journal_path = str(tmp_path / "state" / "pipeline.journal.jsonl")
+
+    # An earlier run, then an interrupted one: a succeeded, b was running as a Domino Job, d was running locally
+    earlier = build(multijob, config_file, dependencies)
+    earlier.journal = multijob.RunJournal(journal_path, "run0")
+    earlier.tasks["a"].set_status("Failed")
+    interrupted = build(multijob, config_file, dependencies)
+    interrupted.journal = multijob.RunJournal(journal_path, "run1")
+    interrupted.tasks["a"].job_id = "job-a"
+    interrupted.tasks["a"].set_status("Succeeded")
+    interrupted.tasks["b"].job_id = "job-b"
+    interrupted.tasks["b"].retries = 1
+    interrupted.tasks["b"].set_status("Running")
+    interrupted.tasks["d"].set_status("Running")
+
+    run_id, entries = multijob.RunJournal(journal_path, "run2").last_run()
+    assert run_id == "run1"
+    assert sorted(entries) == ["a", "b", "d"]
+
+    dag = build(multijob, config_file, dependencies)
+    dag.resume(entries)
+    assert dag.tasks["a"]._status == "Succeeded"
+    assert dag.tasks["a"].job_id == "job-a"
+    assert dag.tasks["b"]._status == "Running"
+    assert (dag.tasks["b"].job_id, dag.tasks["b"].retries) == ("job-b", 1)
+    assert dag.tasks["c"]._status == "Unsubmitted"
+    # the local job died with the previous run, so d runs again; c still waits for b
+    assert dag.tasks["d"]._status == "Unsubmitted"
+    multijob.FORCE_RERUN, force_rerun = True, multijob.FORCE_RERUN
+    try:
+        assert [task.task_id for task in dag.get_ready_tasks()] == ["d"]
+    finally:
+        multijob.FORCE_RERUN = force_rerun
+
+
+def test_journal_ignores_a_partially_written_last_line(multijob, tmp_path):
+    journal = multijob.RunJournal(str(tmp_path / "pipeline.journal.jsonl"), "run1")
+    with open(journal.path, "w") as f:
+        f.write('{"run_id": "run1", "task_id": "a", "status": "Succeeded", "job_id": null}\n{"run_id": "run1", "task_')
+    run_id, entries = journal.last_run()
+    assert run_id == "run1"
+    assert entries["a"]["status"] == "Succeeded"
+
+
+def test_poll_remote_scans_each_log_line_once(multijob, monkeypatch):
+    logs = {"job-a": "NOTE: start\nERROR: first", "job-b": "NOTE: start\n"}
+    monkeypatch.setattr(multijob, "get_job_log", lambda job_id: logs[job_id])
+    watcher = multijob.LogWatcher(multijob.DEFAULT_LOG_SIGNATURES)
+    scanned = []
+    scan = watcher.scan
+    watcher.scan = lambda task_id, source, data: scanned.append((task_id, data)) or scan(task_id, source, data)
+    tasks = [SimpleNamespace(task_id="a", job_id="job-a"), SimpleNamespace(task_id="b", job_id="job-b")]
+
+    # Every poll downloads the whole log, but only the part added since the last poll is scanned
+    watcher.poll_remote(tasks, force=True)
+    logs["job-b"] += "NOTE: more\nERROR: in b\n"
+    watcher.poll_remote(tasks, force=True)
+    assert scanned == [("a", b"NOTE: start\nERROR: first"), ("b", b"NOTE: start\n"), ("b", b"NOTE: more\nERROR: in b\n")]
+    assert watcher.match("a") == ("job job-a", "ERROR: first")
+    assert watcher.match("b") == ("job job-b", "ERROR: in b")
+
+
+def test_poll_remote_waits_for_complete_lines(multijob, monkeypatch):
+    logs = {"job-a": "NOTE: start\nERR"}
+    monkeypatch.setattr(multijob, "get_job_log", lambda job_id: logs[job_id])
+    watcher = multijob.LogWatcher(multijob.DEFAULT_LOG_SIGNATURES)
+    task = SimpleNamespace(task_id="a", job_id="job-a")
+    watcher.poll_remote([task], force=True)
+    # A forced poll scanned the whole log; the next one only sees what was added after it
+    assert watcher.remote_offsets["job-a"] == len(logs["job-a"])
+
+    watcher = multijob.LogWatcher(multijob.DEFAULT_LOG_SIGNATURES)
+    watcher.poll_remote([task])
+    assert watcher.remote_offsets["job-a"] == len("NOTE: start\n")
+    logs["job-a"] += "OR: split across polls\n"
+    watcher.REMOTE_POLL_INTERVAL = 0
+    watcher.poll_remote([task])
+    assert watcher.match("a") == ("job job-a", "ERROR: split across polls")
+
+
+class FailingLogWatcher:
+    # Raises while scanning the output of one task, as a failed log write or decode would
+    def __init__(self, task_id):
+        self.task_id = task_id
+
+    def scan(self, task_id, source, data):
+        if task_id == self.task_id:
+            raise OSError("No space left on device")
+
+    def poll_files(self):
+        pass
+
+
+def test_log_multiplexer_keeps_draining_after_a_stream_fails(multijob, monkeypatch, tmp_path):
+    monkeypatch.setattr(multijob, "LOG_WATCHER", FailingLogWatcher("bad"))
+    multiplexer = multijob.LogMultiplexer()
+    multiplexer.start()
+    commands = {
+        # More output than a pipe buffer holds, so the job would block if its pipe stopped being drained
+        "bad": "head -c 1000000 /dev/zero; echo done",
+        "good": "sleep 0.2; seq 1 20000",
+    }
+    logs = {}
+    for task_id, command in commands.items():
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        logs[task_id] = multijob.TaskLogs(task_id, process, str(tmp_path / f"{task_id}.log"), str(tmp_path / f"{task_id}.err"), False)
+        multiplexer.add(logs[task_id])
+    assert logs["bad"].done.wait(10)
+    assert logs["good"].done.wait(10)
+    assert (tmp_path / "good.log").read_text().split() == [str(i) for i in range(1, 20001)]
+    assert multiplexer.is_alive()
+
+
+def test_background_job_is_stopped_when_its_logs_cannot_be_opened(multijob, monkeypatch, tmp_path):
+    started = []
+
+    class Multiplexer:
+        def add(self, logs):
+            started.append(logs.process)
+            open(logs.out_log_path, "wb")
+
+    monkeypatch.setattr(multijob, "get_log_multiplexer", Multiplexer)
+    with pytest.raises(FileNotFoundError):
+        multijob.start_background_job("t1", "sleep 30", str(tmp_path / "missing" / "t1_out.txt"),
+                                      str(tmp_path / "missing" / "t1_err.txt"), False)
+    assert started[0].returncode == -9
+
+
+def test_manifest_hashes_succeeded_tasks_off_the_scheduler(multijob, tmp_path, monkeypatch):
+    (tmp_path / "in.txt").write_text("input")
+    (tmp_path / "out.txt").write_text("output")
+    task = SimpleNamespace(task_id="t1", inputs=[str(tmp_path / "in.txt")], outputs=[str(tmp_path / "out.txt")],
+                           command="prog.sas")
+    manifest = multijob.RunManifest(str(tmp_path / "state" / "manifest.json"))
+    hashing = threading.Event()
+    file_digest = manifest.file_digest
+
+    def slow_file_digest(path):
+        hashing.wait(10)
+        return file_digest(path)
+    monkeypatch.setattr(manifest, "file_digest", slow_file_digest)
+
+    # record returns before the outputs are hashed, and nothing is written until they are
+    manifest.record(task)
+    assert not manifest.has_record(task)
+    assert not os.path.exists(manifest.path)
+    hashing.set()
+    manifest.close()
+
+    saved = multijob.RunManifest(manifest.path)
+    assert saved.has_record(task)
+    assert saved.is_unchanged(task)
+    (tmp_path / "out.txt").write_text("changed")
+    assert not saved.is_unchanged(task)
+    saved.close()
+
+
+def test_manifest_saves_once_the_queued_tasks_are_hashed(multijob, tmp_path, monkeypatch):
+    paths = []
+    for name in ("in.txt", "a.txt", "b.txt"):
+        (tmp_path / name).write_text(name)
+        paths.append(str(tmp_path / name))
+    manifest = multijob.RunManifest(str(tmp_path / "manifest.json"))
+    saves = []
+    save = manifest.save
+    monkeypatch.setattr(manifest, "save", lambda: saves.append(sorted(manifest.tasks)) or save())
+    hashing = threading.Event()
+    manifest.executor.submit(hashing.wait, 10)
+    for task_id, output in (("a", paths[1]), ("b", paths[2])):
+        manifest.record(SimpleNamespace(task_id=task_id, inputs=paths[:1], outputs=[output], command="prog.sas"))
+    hashing.set()
+    manifest.executor.shutdown(wait=True)
+    assert saves == [["a", "b"]]
+
+
+def active_jobs_api(domino_api, jobs, max_page_size=None, finished=None):
+    # The active job list, paged like the Domino API, which may return fewer jobs than the limit asks for
+    def list_jobs(params, body):
+        assert params["statusFilter"] == "active"
+        offset, limit = int(params["offset"]), int(params["limit"])
+        page = jobs[offset:offset + min(limit, max_page_size or limit)]
+        return {"jobs": [{"id": job_id, "status": {"executionStatus": "Running"}} for job_id in page],
+                "metadata": {"totalCount": len(jobs)}}
+    domino_api.route("GET", "api/jobs/beta/jobs", list_jobs)
+    for job_id, status in (finished or {}).items():
+        domino_api.route("GET", f"api/jobs/beta/jobs/{job_id}",
+                         lambda params, body, job_id=job_id, status=status: {"job": {"id": job_id, "status": {"executionStatus": status}}})
+
+
+def test_job_status_cache_serves_statuses_from_one_snapshot(multijob, domino_api):
+    jobs = [f"job{i}" for i in range(250)]
+    active_jobs_api(domino_api, jobs, finished={"done": "Succeeded", "late": "Queued"})
+    cache = multijob.JobStatusCache(page_size=100)
+    cache.refresh(["job0", "job249", "done"])
+    assert [params["offset"] for method, path, params in domino_api.calls if path == "api/jobs/beta/jobs"] == ["0", "100", "200"]
+    # A job missing from the active list finished since the last snapshot, and is looked up once
+    assert domino_api.paths().count("api/jobs/beta/jobs/done") == 1
+
+    calls = len(domino_api.calls)
+    assert [cache.get(job_id) for job_id in ("job0", "job249", "done")] == ["Running", "Running", "Succeeded"]
+    assert len(domino_api.calls) == calls
+    # A job submitted after the snapshot is looked up directly, once
+    assert cache.get("late") == "Queued"
+    assert cache.get("late") == "Queued"
+    assert domino_api.paths()[calls:] == ["api/jobs/beta/jobs/late"]
+
+
+def test_job_status_cache_pages_by_the_jobs_returned(multijob, domino_api):
+    jobs = [f"job{i}" for i in range(95)]
+    active_jobs_api(domino_api, jobs, max_page_size=40)
+    cache = multijob.JobStatusCache(page_size=100)
+    cache.refresh(jobs)
+    assert [params["offset"] for method, path, params in domino_api.calls] == ["0", "40", "80"]
+    assert sorted(cache.statuses) == sorted(jobs)
+
+
+GB = 1024 ** 3
+
+
+def local_task(task_id, cpus=None, mem=None, pgid=None):
+    return SimpleNamespace(task_id=task_id, cpus=cpus, mem=mem, process=SimpleNamespace(pid=pgid))
+
+
+def test_admit_starts_the_tasks_whose_memory_fits(multijob, fake_proc):
+    fake_proc.meminfo(total=16 * GB, available=8 * GB)
+    executor = multijob.LocalExecutor()
+    # 8 GB available less the 5% reserve of 16 GB leaves 7.2 GB
+    ready = [local_task("a", mem=4 * GB), local_task("b", mem=4 * GB), local_task("c", mem=2 * GB)]
+    assert [task.task_id for task in executor.admit(ready, [], slots=10)] == ["a", "c"]
+    assert executor.waiting == {"b"}
+    assert [task.task_id for task in executor.admit(ready, [], slots=1)] == ["a"]
+
+
+def test_admit_counts_the_memory_running_tasks_have_yet_to_allocate(multijob, fake_proc):
+    fake_proc.meminfo(total=16 * GB, available=8 * GB)
+    # r expects 6 GB and has 2 GB so far, so 4 GB of the available memory is spoken for
+    fake_proc.process(pgid=500, rss=1 * GB)
+    fake_proc.process(pgid=500, rss=1 * GB)
+    fake_proc.process(pgid=600, rss=3 * GB)
+    executor = multijob.LocalExecutor()
+    running = [local_task("r", mem=6 * GB, pgid=500)]
+    ready = [local_task("a", mem=4 * GB), local_task("c", mem=3 * GB)]
+    assert [task.task_id for task in executor.admit(ready, running, slots=10)] == ["c"]
+    # A task without mem or history is expected to take DEFAULT_TASK_MEMORY
+    executor = multijob.LocalExecutor(task_memory={"a": 2 * GB})
+    ready = [local_task("a"), local_task("d")]
+    assert [task.task_id for task in executor.admit(ready, running, slots=10)] == ["a", "d"]
+
+
+def test_admit_keeps_to_the_cpu_quota(multijob, fake_proc):
+    fake_proc.meminfo(total=64 * GB, available=60 * GB)
+    fake_proc.cgroup(cpu_quota=4)
+    executor = multijob.LocalExecutor()
+    assert executor.cpus == 4
+    running = [local_task("r", cpus=3, mem=GB, pgid=500)]
+    # Tasks without cpus are not counted against the CPUs
+    ready = [local_task("a", cpus=2), local_task("b"), local_task("c", cpus=1), local_task("d", cpus=1)]
+    assert [task.task_id for task in executor.admit(ready, running, slots=10)] == ["b", "c"]
+    # Nothing running: the first task starts however much it asks for
+    assert [task.task_id for task in executor.admit([local_task("e", cpus=16)], [], slots=10)] == ["e"]
+
+
+def test_admit_keeps_to_the_container_memory_limit(multijob, fake_proc):
+    fake_proc.meminfo(total=64 * GB, available=60 * GB)
+    fake_proc.cgroup(memory_limit=8 * GB, memory_usage=3 * GB)
+    executor = multijob.LocalExecutor()
+    assert executor.memory_limit() == 8 * GB
+    # 5 GB left in the container less the 5% reserve of 8 GB
+    ready = [local_task("a", mem=3 * GB), local_task("b", mem=2 * GB), local_task("c", mem=GB)]
+    assert [task.task_id for task in executor.admit(ready, [], slots=10)] == ["a", "c"]
+
+
+def run_local_pipeline(multijob, config_file, monkeypatch, tmp_path, sections, log_errors, allow_partial_failure=False):
+    # Runs sections as local jobs with the log watcher in log_errors mode; returns the dag and how long the run took
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(multijob, "LOG_ERRORS", log_errors)
+    dag = multijob.build_dag(config_file(sections))
+    dag.allow_partial_failure = allow_partial_failure
+    runner = multijob.PipelineRunner(dag, tick_freq=0.1, is_local=True, queue_limit=4, add_timestamp=False,
+                                     executor=multijob.LocalExecutor())
+    monkeypatch.setattr(multijob, "LOG_WATCHER", multijob.LogWatcher(multijob.DEFAULT_LOG_SIGNATURES, on_match=runner.task_event.set))
+    start = time.monotonic()
+    try:
+        runner.run()
+    except Exception as e:
+        assert "Pipeline Execution Failed" in str(e)
+    return dag, time.monotonic() - start
+
+
+LOGGED_ERROR = {
+    "a": {"command": "sh -c 'echo \"ERROR: Variable USUBJID not found.\"; sleep 1'"},
+    "b": {"command": "echo b", "depends": "a"},
+    "c": {"command": "echo c", "depends": "b"},
+    "d": {"command": "echo d"},
+}
+
+
+def statuses(dag):
+    return {task_id: task._status for task_id, task in dag.tasks.items()}
+
+
+def test_logged_error_only_warns_by_default(multijob, config_file, monkeypatch, tmp_path):
+    dag, seconds = run_local_pipeline(multijob, config_file, monkeypatch, tmp_path, LOGGED_ERROR, "warn")
+    assert set(statuses(dag).values()) == {"Succeeded"}
+
+
+def test_logged_error_fails_the_task_and_blocks_its_dependents(multijob, config_file, monkeypatch, tmp_path):
+    dag, seconds = run_local_pipeline(multijob, config_file, monkeypatch, tmp_path, LOGGED_ERROR, "fail",
+                                      allow_partial_failure=True)
+    # a exits with 0, but its log has an ERROR line
+    assert dag.tasks["a"].returncode == 0
+    assert statuses(dag) == {"a": "Failed", "b": "Skipped", "c": "Skipped", "d": "Succeeded"}
+    assert dag.blocked_tasks == {"b": "a", "c": "a"}
+
+
+def test_logged_error_stops_the_task_in_abort_mode(multijob, config_file, monkeypatch, tmp_path):
+    sections = dict(LOGGED_ERROR, a={"command": "sh -c 'echo \"ERROR: Variable USUBJID not found.\"; sleep 30'"})
+    dag, seconds = run_local_pipeline(multijob, config_file, monkeypatch, tmp_path, sections, "abort",
+                                      allow_partial_failure=True)
+    assert seconds < 10
+    assert dag.tasks["a"].returncode == -signal.SIGTERM
+    assert statuses(dag) == {"a": "Failed", "b": "Skipped", "c": "Skipped", "d": "Succeeded"}
+
+
+def test_cancel_stops_remote_jobs_and_skips_unsubmitted_tasks(multijob, config_file, domino_api):
+    stopped = []
+
+    def stop(params, body):
+        stopped.append(body["jobId"])
+        if body["jobId"] == "job-gone":
+            return domino_api.response(404, {"message": "Job not found"})
+        return {}
+    domino_api.route("POST", "v4/jobs/stop", stop)
+    dag = build(multijob, config_file, {"a": [], "b": [], "c": [], "d": ["a"], "e": []})
+    # b and c run in one batch job
+    for task_id, job_id in (("a", "job-a"), ("b", "job-batch"), ("c", "job-batch"), ("e", "job-gone")):
+        dag.tasks[task_id].job_id = job_id
+        dag.tasks[task_id].set_status("Running")
+
+    multijob.PipelineRunner(dag).cancel()
+    assert sorted(stopped) == ["job-a", "job-batch", "job-gone"]
+    # e could not be stopped, so it is left as it was
+    assert statuses(dag) == {"a": "Stopped", "b": "Stopped", "c": "Stopped", "d": "Skipped", "e": "Running"}
+
+
+def test_cancel_can_leave_remote_jobs_running(multijob, config_file, domino_api):
+    dag = build(multijob, config_file, {"a": [], "b": ["a"]})
+    dag.tasks["a"].job_id = "job-a"
+    dag.tasks["a"].set_status("Running")
+    multijob.PipelineRunner(dag, cancel_remote_jobs=False).cancel()
+    assert domino_api.calls == []
+    assert statuses(dag) == {"a": "Running", "b": "Skipped"}
+
+
+def test_failed_pipeline_stops_its_local_jobs(multijob, config_file, monkeypatch, tmp_path):
+    monkeypatch.setattr(multijob.LocalExecutor, "TERMINATE_GRACE_PERIOD", 2)
+    sections = {
+        "slow": {"command": "sleep 30"},
+        "after_slow": {"command": "echo after", "depends": "slow"},
+        "broken": {"command": "sh -c 'sleep 0.5; exit 3'"},
+    }
+    dag, seconds = run_local_pipeline(multijob, config_file, monkeypatch, tmp_path, sections, "warn")
+    assert seconds < 10
+    assert statuses(dag) == {"slow": "Stopped", "after_slow": "Skipped", "broken": "Failed"}
+    assert dag.tasks["slow"].process.returncode == -signal.SIGTERM
+
+
+def metadata_api(domino_api, tiers):
+    domino_api.route("GET", "v4/projects/test-project-id/hardwareTiers",
+                     lambda params, body: [{"hardwareTier": {"name": name, "id": tier_id}} for name, tier_id in tiers.items()])
+    domino_api.route("GET", "api/projects/v1/projects/test-project-id/repositories",
+                     lambda params, body: {"repositories": [{"name": "utils", "id": "repo-1", "defaultRef": {"type": "head"}}]})
+
+
+def test_project_metadata_is_fetched_once_per_run(multijob, domino_api):
+    metadata_api(domino_api, {"small": "tier-1", "large": "tier-2"})
+    cache = multijob.ProjectMetadataCache()
+    cache.load()
+    assert sorted(domino_api.paths()) == ["api/projects/v1/projects/test-project-id/repositories",
+                                          "v4/projects/test-project-id/hardwareTiers"]
+    cache.loaded_at = {kind: loaded_at - 24 * 60 * 60 for kind, loaded_at in cache.loaded_at.items()}
+    assert cache.get_hardware_tier_id("large") == "tier-2"
+    assert cache.get_imported_repos()["utils"]["id"] == "repo-1"
+    assert len(domino_api.calls) == 2
+
+
+def test_project_metadata_is_fetched_again_after_the_ttl(multijob, domino_api):
+    tiers = {"small": "tier-1"}
+    metadata_api(domino_api, tiers)
+    cache = multijob.ProjectMetadataCache(ttl=60)
+    assert cache.get_hardware_tier_id("small") == "tier-1"
+    cache.loaded_at["hardware_tiers"] -= 30
+    tiers["small"] = "tier-3"
+    assert cache.get_hardware_tier_id("small") == "tier-1"
+    cache.loaded_at["hardware_tiers"] -= 31
+    assert cache.get_hardware_tier_id("small") == "tier-3"
+    assert domino_api.paths() == ["v4/projects/test-project-id/hardwareTiers"] * 2
+
+
+def test_unknown_hardware_tier_is_looked_up_again_once(multijob, domino_api):
+    tiers = {"small": "tier-1"}
+    metadata_api(domino_api, tiers)
+    cache = multijob.ProjectMetadataCache()
+    cache.load(["hardware_tiers"])
+    # A tier added to the project during the run is found
+    tiers["gpu"] = "tier-9"
+    assert cache.get_hardware_tier_id("gpu") == "tier-9"
+    with pytest.raises(Exception, match="Unknown hardware tier 'huge', available tiers: gpu, small"):
+        cache.get_hardware_tier_id("huge")
+    assert len(domino_api.calls) == 3
+
+
+def submission_api(domino_api):
+    # Project lock tag, imported repo refs and job submission; returns the list of events in the order they happen
+    events = []
+    tag_ids = itertools.count(1)
+    project = "v4/projects/test-project-id"
+
+    def lock(params, body):
+        tag_id = f"tag-{next(tag_ids)}"
+        events.append(("lock", tag_id))
+        return [{"id": tag_id, "name": "multijob_locked"}]
+
+    def submit(params, body):
+        events.append(("submit", body["title"]))
+        return {"job": {"id": f"job-{body['title']}"}}
+
+    domino_api.route("POST", f"{project}/tags", lock)
+    for tag_id in ("tag-1", "tag-2", "tag-3"):
+        domino_api.route("DELETE", f"{project}/tags/{tag_id}", lambda params, body, tag_id=tag_id: events.append(("unlock", tag_id)) or {})
+    domino_api.route("GET", "api/projects/v1/projects/test-project-id/repositories", lambda params, body: {"repositories": [
+        {"name": "utils", "id": "repo-1", "defaultRef": {"refType": "head"}},
+        {"name": "macros", "id": "repo-2", "defaultRef": {"refType": "branches", "value": "main"}},
+    ]})
+    for repo_id in ("repo-1", "repo-2"):
+        domino_api.route("PUT", f"{project}/gitRepositories/{repo_id}/ref",
+                         lambda params, body, repo_id=repo_id: events.append(("ref", repo_id, body.get("value", body["type"]))) or {})
+    domino_api.route("POST", "api/jobs/v1/jobs", submit)
+    # No job is listed as active yet; their statuses are looked up one by one
+    domino_api.route("GET", "api/jobs/beta/jobs", lambda params, body: {"jobs": [], "metadata": {"totalCount": 0}})
+    for task_id in ("t1", "t2", "t3", "t4"):
+        domino_api.route("GET", f"api/jobs/beta/jobs/job-{task_id}", lambda params, body: {"job": {"status": {"executionStatus": "Running"}}})
+        domino_api.route("POST", f"v4/jobs/job-{task_id}/tag", lambda params, body: {})
+    return events
+
+
+def test_tasks_sharing_imported_repo_refs_are_submitted_under_one_lock(multijob, config_file, domino_api):
+    events = submission_api(domino_api)
+    dag = multijob.build_dag(config_file({
+        "t1": {"command": "t1.sas", "imported_repo_git_refs": "utils,branches,dev macros,tags,v2"},
+        "t2": {"command": "t2.sas", "imported_repo_git_refs": "macros,tags,v2 utils,branches,dev"},
+        "t3": {"command": "t3.sas"},
+        "t4": {"command": "t4.sas", "imported_repo_git_refs": "utils,branches,hotfix"},
+    }))
+    runner = multijob.PipelineRunner(dag)
+    runner.submit_tasks([dag.tasks[task_id] for task_id in ("t1", "t2", "t3", "t4")])
+
+    # The same refs in another order are one group; the project's refs are restored before the lock is released,
+    # and tasks without refs are only submitted once the project's own refs are back
+    assert events == [
+        ("lock", "tag-1"),
+        ("ref", "repo-2", "v2"), ("ref", "repo-1", "dev"),
+        ("submit", "t1"), ("submit", "t2"),
+        ("ref", "repo-2", "main"), ("ref", "repo-1", "head"),
+        ("unlock", "tag-1"),
+        ("lock", "tag-2"),
+        ("ref", "repo-1", "hotfix"),
+        ("submit", "t4"),
+        ("ref", "repo-1", "head"),
+        ("unlock", "tag-2"),
+        ("submit", "t3"),
+    ]
+    assert {task_id: task.job_id for task_id, task in dag.tasks.items()} == {
+        "t1": "job-t1", "t2": "job-t2", "t3": "job-t3", "t4": "job-t4"}
+    # The imported repos are fetched once for both groups
+    assert domino_api.paths("GET").count("api/projects/v1/projects/test-project-id/repositories") == 1
+
+
+def test_imported_repo_refs_are_restored_when_a_submission_fails(multijob, config_file, domino_api):
+    events = submission_api(domino_api)
+    domino_api.route("POST", "api/jobs/v1/jobs", lambda params, body: domino_api.response(400, {"message": "Bad request"}))
+    dag = multijob.build_dag(config_file({"t1": {"command": "t1.sas", "imported_repo_git_refs": "utils,branches,dev"}}))
+    with pytest.raises(multijob.HTTPError):
+        multijob.PipelineRunner(dag).submit_tasks([dag.tasks["t1"]])
+    assert events == [("lock", "tag-1"), ("ref", "repo-1", "dev"), ("ref", "repo-1", "head"), ("unlock", "tag-1")]
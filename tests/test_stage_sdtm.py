@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+import stage_sdtm
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    # An SDTM snapshot with two domains, staged by real copies: links and clones would share the source data
+    def no_link(*args):
+        raise OSError("links are not supported")
+    monkeypatch.setattr(stage_sdtm.os, "link", no_link)
+    monkeypatch.setattr(stage_sdtm.fcntl, "ioctl", no_link)
+    monkeypatch.setattr(stage_sdtm, "COPY_CHUNK_SIZE", 16)
+    sdtm_dir = tmp_path / "sdtm"
+    sdtm_dir.mkdir()
+    (sdtm_dir / "ae.sas7bdat").write_bytes(bytes(range(100)))
+    (sdtm_dir / "dm.sas7bdat").write_bytes(b"dm" * 40)
+    return sdtm_dir
+
+
+def stage(snapshot, output_dir, domains=("ae", "dm")):
+    return stage_sdtm.stage_domains(list(domains), sdtm_dir=str(snapshot), directory=str(output_dir))
+
+
+def test_stage_domains_writes_a_digest_manifest(snapshot, tmp_path):
+    output_dir = tmp_path / "out"
+    summary = stage(snapshot, output_dir, ("ae", "dm", "lb"))
+    assert (summary["staged"], summary["skipped"], summary["missing"], summary["failed"]) == (["ae", "dm"], [], ["lb"], [])
+    assert (output_dir / "ae.sas7bdat").read_bytes() == (snapshot / "ae.sas7bdat").read_bytes()
+    manifest = json.loads((output_dir / stage_sdtm.MANIFEST_NAME).read_text())["domains"]
+    assert sorted(manifest) == ["ae", "dm"]
+    assert manifest["ae"]["digest"] == stage_sdtm.file_digest(str(snapshot / "ae.sas7bdat"))
+    assert manifest["ae"]["size"] == 100
+
+
+def test_stage_domains_skips_unchanged_domains(snapshot, tmp_path):
+    output_dir = tmp_path / "out"
+    first = stage(snapshot, output_dir)
+    (snapshot / "dm.sas7bdat").write_bytes(b"DM" * 40)
+    # Same content with a new mtime is still unchanged
+    os.utime(snapshot / "ae.sas7bdat", ns=(1, 1))
+    second = stage(snapshot, output_dir)
+    assert (second["staged"], second["skipped"]) == (["dm"], ["ae"])
+    assert (output_dir / "dm.sas7bdat").read_bytes() == b"DM" * 40
+    assert second["snapshot_digest"] != first["snapshot_digest"]
+    third = stage(snapshot, output_dir)
+    assert (third["staged"], third["skipped"]) == ([], ["ae", "dm"])
+    assert third["snapshot_digest"] == second["snapshot_digest"]
+
+
+def test_stage_domains_copies_again_when_the_output_was_replaced(snapshot, tmp_path):
+    output_dir = tmp_path / "out"
+    stage(snapshot, output_dir)
+    (output_dir / "ae.sas7bdat").write_bytes(b"edited")
+    summary = stage(snapshot, output_dir)
+    assert (summary["staged"], summary["skipped"]) == (["ae"], ["dm"])
+    assert (output_dir / "ae.sas7bdat").read_bytes() == (snapshot / "ae.sas7bdat").read_bytes()
+
+
+def test_corrupted_partial_copy_is_copied_again(snapshot, tmp_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    source = snapshot / "ae.sas7bdat"
+    partial = stage_sdtm.partial_path(str(output_dir / "ae.sas7bdat"), os.stat(source))
+    with open(partial, "wb") as file:
+        file.write(b"\0" * 40)
+    summary = stage(snapshot, output_dir, ("ae",))
+    assert summary["staged"] == ["ae"]
+    assert summary["domains"][0]["bytes_resumed"] == 0
+    assert (output_dir / "ae.sas7bdat").read_bytes() == source.read_bytes()
+    assert sorted(os.listdir(output_dir)) == [stage_sdtm.MANIFEST_NAME, "ae.sas7bdat"]
+
+
+def test_copy_that_does_not_match_its_source_fails(snapshot, tmp_path, monkeypatch):
+    output_dir = tmp_path / "out"
+    digest = stage_sdtm.file_digest
+    monkeypatch.setattr(stage_sdtm, "file_digest", lambda path: "0" * 64 if path.endswith(".partial") else digest(path))
+    summary = stage(snapshot, output_dir, ("ae",))
+    assert summary["failed"] == ["ae"]
+    assert "Checksum mismatch" in summary["domains"][0]["error"]
+    assert sorted(os.listdir(output_dir)) == [stage_sdtm.MANIFEST_NAME]
@@ -0,0 +1,341 @@
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+# Stage one or more SDTM domains from the Dataset snapshot into /workflow/outputs in a single task.
+# Usage: stage_sdtm.py [--output-dir DIR] ae cm dm ...
+# Each domain is written to <output dir>/<domain>.sas7bdat, so every domain remains a separate named Flow output.
+# A digest manifest is kept next to the staged outputs: domains whose source is unchanged since the last run are
+# not copied again, and a JSON summary of the run, with a digest of the staged domains that can serve as a cache key,
+# is printed as the last line of the task log.
+
+# The name of the Flow input, which Domino places into a file blob under /workflow/inputs
+task_input_name = "sdtm_snapshot_task_input"
+input_location = f"/workflow/inputs/{task_input_name}"
+output_dir = "/workflow/outputs"
+
+# ioctl request that makes the target share the source's extents (btrfs, XFS with reflink=1)
+FICLONE = 0x40049409
+# Number of concurrent copies when the filesystem cannot link or clone the datasets
+MAX_COPY_WORKERS = 8
+# The manifest is not a Flow output, so it is hidden from the output listing
+MANIFEST_NAME = ".sdtm_manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+MB = 1024 * 1024
+# Copies advance in large aligned chunks; a resumed copy restarts at the last whole chunk. /workflow/outputs starts
+# empty in every Flow task, so unchanged domains are only skipped, and partial copies only resumed, in an
+# --output-dir that persists between runs.
+COPY_CHUNK_SIZE = 64 * MB
+# Read buffer for the user space fallback, which bounds the memory used by each concurrent copy
+BUFFER_SIZE = 8 * MB
+# Seconds between progress lines for a single copy
+PROGRESS_INTERVAL = 5
+# Errors that mean the filesystem does not support the in-kernel copy, rather than a failed copy
+FALLBACK_ERRNOS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)
+
+
+def read_sdtm_dir():
+    with open(input_location, "r") as file:
+        return file.read().strip()
+
+
+def file_digest(path):
+    # Streaming BLAKE2 digest, so multi-gigabyte domains never have to fit in memory
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_digest(manifest, domains):
+    # A single digest over the staged domains, suitable as a Flyte cache key
+    digest = hashlib.blake2b(digest_size=16)
+    for domain in sorted(domains):
+        record = manifest.get(domain)
+        digest.update(f"{domain}:{record['digest'] if record else 'missing'}\n".encode())
+    return digest.hexdigest()
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(path, "r") as file:
+            return json.load(file).get("domains", {})
+    except FileNotFoundError:
+        return {}
+    except (ValueError, AttributeError):
+        print(f"Ignoring unreadable manifest {path}")
+        return {}
+
+
+def save_manifest(directory, manifest):
+    # Write to a temporary file and rename it, so a preempted task never leaves a truncated manifest
+    path = os.path.join(directory, MANIFEST_NAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump({"domains": manifest}, file, indent=2, sort_keys=True)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+class CopyProgress:
+    # Prints the throughput and ETA of one copy to the task log, at most every PROGRESS_INTERVAL seconds
+
+    def __init__(self, label, total, resumed):
+        self.label = label
+        self.total = total
+        self.resumed = resumed
+        self.start = time.monotonic()
+        self.last_report = self.start
+
+    def rate(self, done):
+        elapsed = time.monotonic() - self.start
+        return (done - self.resumed) / elapsed if elapsed > 0 else 0.0
+
+    def update(self, done, final=False):
+        now = time.monotonic()
+        if not final and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        rate = self.rate(done)
+        percent = 100 * done / self.total if self.total else 100
+        eta = f"{(self.total - done) / rate:.0f}s" if rate > 0 else "unknown"
+        print(f"{self.label}: {done / MB:.1f}/{self.total / MB:.1f} MB ({percent:.0f}%) {rate / MB:.1f} MB/s ETA {eta}")
+
+
+def partial_path(target, source_stat):
+    # The source size and mtime are part of the name, so a partial copy is only resumed from the same source file
+    return f"{target}.{source_stat.st_size}-{source_stat.st_mtime_ns}.partial"
+
+
+def remove_stale_partials(target, keep=None):
+    directory, name = os.path.split(target)
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry.startswith(f"{name}.") and entry.endswith(".partial") and path != keep:
+            os.remove(path)
+
+
+def stream_copy(source, target, label, digest):
+    # Copies source to target in COPY_CHUNK_SIZE chunks through a .partial file that is renamed over the target once
+    # its digest matches the source digest. A .partial file left behind by a preempted task is resumed from its last
+    # whole chunk; if the resumed copy does not match, the copy is started again from the beginning.
+    # copy_file_range lets the filesystem do server-side or block-level copies, sendfile is the fallback for
+    # filesystems that refuse copy_file_range across mounts, and the last resort is a pread/pwrite loop with a
+    # bounded buffer. Returns (method, bytes copied, bytes resumed).
+    source_stat = os.stat(source)
+    size = source_stat.st_size
+    temp_path = partial_path(target, source_stat)
+    remove_stale_partials(target, keep=temp_path)
+
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            resumed = min(os.fstat(dst_fd).st_size, size)
+            resumed -= resumed % COPY_CHUNK_SIZE
+            os.ftruncate(dst_fd, resumed)
+            if resumed:
+                print(f"{label}: resuming partial copy at {resumed / MB:.1f} MB")
+
+            progress = CopyProgress(label, size, resumed)
+            method = "copy_file_range" if hasattr(os, "copy_file_range") else "sendfile"
+            offset = resumed
+            while offset < size:
+                count = min(COPY_CHUNK_SIZE, size - offset)
+                try:
+                    if method == "copy_file_range":
+                        copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+                    elif method == "sendfile":
+                        os.lseek(dst_fd, offset, os.SEEK_SET)
+                        copied = os.sendfile(dst_fd, src_fd, offset, count)
+                    else:
+                        data = os.pread(src_fd, min(count, BUFFER_SIZE), offset)
+                        copied = 0
+                        while copied < len(data):
+                            copied += os.pwrite(dst_fd, data[copied:], offset + copied)
+                except OSError as e:
+                    if method != "copy" and e.errno in FALLBACK_ERRNOS:
+                        method = "sendfile" if method == "copy_file_range" else "copy"
+                        continue
+                    raise
+                if copied == 0:
+                    raise OSError(errno.EIO, f"Short copy of {source}")
+                offset += copied
+                if offset < size:
+                    progress.update(offset)
+            os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    if file_digest(temp_path) != digest:
+        os.remove(temp_path)
+        if resumed:
+            print(f"{label}: resumed copy does not match {source}, copying it again")
+            return stream_copy(source, target, label, digest)
+        raise OSError(errno.EIO, f"Checksum mismatch after copying {source} to {target}")
+
+    shutil.copymode(source, temp_path)
+    os.replace(temp_path, target)
+    progress.update(size, final=True)
+    return method, size - resumed, resumed
+
+
+def stage_file(source, target, label, digest):
+    # Returns (method, bytes copied, bytes resumed), trying the cheapest method first. Every method writes a
+    # temporary name that is renamed over the target, so downstream tasks never see a half-written dataset.
+    # Links and clones share the source's data; real copies are checked against the source digest.
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return "hardlink", 0, 0
+    temp_path = f"{target}.tmp"
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+
+    # 1. Hardlink: no data is moved at all. The snapshot is read-only, so sharing the inode is safe.
+    try:
+        os.link(source, temp_path)
+        os.replace(temp_path, target)
+        return "hardlink", 0, 0
+    except OSError:
+        pass
+
+    # 2. Reflink: copy-on-write clone of the extents
+    try:
+        with open(source, "rb") as src, open(temp_path, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copymode(source, temp_path)
+        os.replace(temp_path, target)
+        return "reflink", 0, 0
+    except OSError:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+
+    # 3. Chunked copy with progress reporting
+    return stream_copy(source, target, label, digest)
+
+
+def is_staged_output_intact(record, output_file_path):
+    # The staged output must still be the file written by the previous run
+    try:
+        output_stat = os.stat(output_file_path)
+    except FileNotFoundError:
+        return False
+    return (output_stat.st_size, output_stat.st_mtime_ns) == (record.get("output_size"), record.get("output_mtime_ns"))
+
+
+def stage_domain(sdtm_dir, domain, record, directory):
+    # Returns a summary of the domain and the new manifest record (None if the domain is missing)
+    file_path = os.path.join(sdtm_dir, f"{domain}.sas7bdat")
+    output_file_path = os.path.join(directory, f"{domain}.sas7bdat")
+    result = {"domain": domain, "source": file_path, "output": output_file_path}
+    start = time.monotonic()
+
+    try:
+        source_stat = os.stat(file_path)
+    except FileNotFoundError:
+        print(f"File not found: {file_path}")
+        result["status"] = "missing"
+        return result, None
+
+    # Skip the domain when its staged output is intact and the source size and digest match the manifest.
+    # The digest is only recomputed when the source mtime has moved.
+    digest = None
+    if record and is_staged_output_intact(record, output_file_path) and source_stat.st_size == record.get("size"):
+        if source_stat.st_mtime_ns == record.get("mtime_ns"):
+            digest = record["digest"]
+        else:
+            digest = file_digest(file_path)
+        if digest == record["digest"]:
+            print(f"Unchanged {file_path}, keeping {output_file_path}")
+            result.update(status="skipped", method=None, size=source_stat.st_size, digest=digest,
+                          seconds=round(time.monotonic() - start, 3))
+            return result, dict(record, mtime_ns=source_stat.st_mtime_ns)
+
+    if digest is None:
+        digest = file_digest(file_path)
+    copy_start = time.monotonic()
+    method, copied, resumed = stage_file(file_path, output_file_path, domain, digest)
+    copy_seconds = time.monotonic() - copy_start
+
+    output_stat = os.stat(output_file_path)
+    mb_per_s = round(copied / MB / copy_seconds, 1) if copied and copy_seconds > 0 else None
+    print(f"Copied {file_path} to {output_file_path} ({method}{f', {mb_per_s} MB/s' if mb_per_s else ''})")
+    result.update(status="staged", method=method, size=source_stat.st_size, digest=digest,
+                  bytes_copied=copied, bytes_resumed=resumed, mb_per_s=mb_per_s,
+                  seconds=round(time.monotonic() - start, 3))
+    new_record = {
+        "source": file_path,
+        "size": source_stat.st_size,
+        "mtime_ns": source_stat.st_mtime_ns,
+        "digest": digest,
+        "output_size": output_stat.st_size,
+        "output_mtime_ns": output_stat.st_mtime_ns,
+    }
+    return result, new_record
+
+
+def stage_domains(domains, sdtm_dir=None, directory=None, workers=MAX_COPY_WORKERS):
+    # Returns the run summary; the domains that were not found are listed under "missing"
+    if sdtm_dir is None:
+        sdtm_dir = read_sdtm_dir()
+    if directory is None:
+        directory = output_dir
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+    start = time.monotonic()
+
+    def stage(domain):
+        try:
+            return stage_domain(sdtm_dir, domain, manifest.get(domain), directory)
+        except OSError as e:
+            print(f"Failed to stage {domain}: {e}")
+            return {"domain": domain, "status": "failed", "error": str(e)}, None
+
+    # Links and clones finish immediately, so the pool only matters when the data has to be copied
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(domains)))) as executor:
+        results = list(executor.map(stage, domains))
+
+    for (result, record) in results:
+        if record is not None:
+            manifest[result["domain"]] = record
+        elif result["status"] == "missing":
+            manifest.pop(result["domain"], None)
+    save_manifest(directory, manifest)
+
+    domain_results = [result for (result, record) in results]
+    return {
+        "sdtm_dir": sdtm_dir,
+        "output_dir": directory,
+        "snapshot_digest": snapshot_digest(manifest, domains),
+        "seconds": round(time.monotonic() - start, 3),
+        "staged": [r["domain"] for r in domain_results if r["status"] == "staged"],
+        "skipped": [r["domain"] for r in domain_results if r["status"] == "skipped"],
+        "missing": [r["domain"] for r in domain_results if r["status"] == "missing"],
+        "failed": [r["domain"] for r in domain_results if r["status"] == "failed"],
+        "domains": domain_results,
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Stage SDTM domains from the Dataset snapshot into the Flow outputs")
+    parser.add_argument("domains", nargs="+", metavar="DOMAIN", help="SDTM domains to stage, e.g. ae cm dm")
+    parser.add_argument("--output-dir", default=output_dir, help=f"Directory for the staged datasets and the digest manifest (default: {output_dir})")
+    parser.add_argument("--sdtm-dir", help=f"SDTM snapshot directory (default: read from {input_location})")
+    parser.add_argument("--workers", type=int, default=MAX_COPY_WORKERS, help=f"Maximum concurrent copies (default: {MAX_COPY_WORKERS})")
+    args = parser.parse_args()
+
+    summary = stage_domains(args.domains, sdtm_dir=args.sdtm_dir, directory=args.output_dir, workers=args.workers)
+    print(json.dumps(summary))
+    if summary["failed"]:
+        sys.exit(1)
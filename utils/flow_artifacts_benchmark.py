@@ -0,0 +1,270 @@
+"""
+flow_artifacts_benchmark.py
+
+Measure the download path of flow_artifacts_copy.py without the Flyte data store.
+
+Starts a local object store stand-in (path-style http://127.0.0.1:<port>/<bucket>/<key>, answering HEAD and
+ranged GET requests like S3), seeds it with synthetic blobs the size of typical sas7bdat datasets, and downloads
+them with copy_blobs at every given concurrency level.
+
+    flow_artifacts_benchmark.py --workers 1,4,8,16 --latency-ms 20 --json results.json
+    flow_artifacts_benchmark.py --scheme s3 --chunk-sizes 1,8 --json results.json
+
+--latency-ms and --connection-mb-per-s make the stand-in behave like a remote store, where a single request is
+slow and throughput comes from requests in flight. With --scheme s3 the blobs are read through s3fs pointed at
+the stand-in, which is the path used for s3:// URIs, and every combination of workers and --chunk-sizes is run:
+s3fs fetches each block with a ranged GET, whereas over plain HTTP each blob is one streamed GET whose chunk size
+only sets the read buffer. --etag kms makes the stand-in answer with ETags that are not the MD5 of the content,
+as S3 does for SSE-KMS and SSE-C encrypted objects, and leaves the MD5 out of the manifest. --min-mb-per-s fails the run (exit code 1) when the default
+configuration of flow_artifacts_copy.py is slower, so a regression shows up as a failed CI step.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from flow_artifacts_copy import CHUNK_SIZE, MAX_DOWNLOAD_WORKERS, MB, copy_blobs
+
+BUCKET = "flyte-data"
+# Sizes in MB of the seeded blobs, cycled over --blobs: a mix of small and large ADaM datasets
+DEFAULT_SIZES = "1,4,16,64"
+SEND_BUFFER_SIZE = 256 * 1024
+
+
+def split_numbers(value, kind):
+    return [kind(item) for item in value.split(",") if item.strip()]
+
+
+def seed_blobs(directory, count, sizes_mb):
+    # Write `count` random blobs to directory/<key> and return their manifest entries
+    blobs = []
+    for i in range(count):
+        size = int(sizes_mb[i % len(sizes_mb)] * MB)
+        key = f"{i:04d}/blob{i:02d}_dataset"
+        path = os.path.join(directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        md5 = hashlib.md5()
+        with open(path, "wb") as file:
+            remaining = size
+            while remaining:
+                chunk = os.urandom(min(MB, remaining))
+                file.write(chunk)
+                md5.update(chunk)
+                remaining -= len(chunk)
+        blobs.append({"key": key, "filename": f"blob{i:02d}.sas7bdat", "size": size, "md5": md5.hexdigest()})
+    return blobs
+
+
+class ObjectStoreHandler(BaseHTTPRequestHandler):
+    # Serves the files under server.root as /<BUCKET>/<key>, with the headers S3 returns for HEAD and GET
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def resolve(self):
+        prefix = f"/{BUCKET}/"
+        path = self.path.split("?", 1)[0]
+        if not path.startswith(prefix):
+            return None
+        path = os.path.normpath(os.path.join(self.server.root, path[len(prefix):]))
+        if not path.startswith(self.server.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def send_headers(self, path, status, start, end):
+        stat = os.stat(path)
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("ETag", f'"{self.server.etags.get(path, "")}"')
+        self.send_header("Last-Modified", self.date_time_string(stat.st_mtime))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{stat.st_size}")
+        self.end_headers()
+
+    def byte_range(self, size):
+        # (start, end, status) of a "Range: bytes=a-b" request, or of the whole object
+        header = self.headers.get("Range")
+        if not header or not header.startswith("bytes="):
+            return 0, size, 200
+        first, _, last = header[len("bytes="):].partition("-")
+        if not first:
+            start, end = max(0, size - int(last)), size
+        else:
+            start, end = int(first), min(size, int(last) + 1) if last else size
+        return start, end, 206
+
+    def not_found(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        time.sleep(self.server.latency)
+        path = self.resolve()
+        if path is None:
+            return self.not_found()
+        self.send_headers(path, 200, 0, os.path.getsize(path))
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        path = self.resolve()
+        if path is None:
+            return self.not_found()
+        start, end, status = self.byte_range(os.path.getsize(path))
+        self.send_headers(path, status, start, end)
+        began = time.monotonic()
+        sent = 0
+        with open(path, "rb") as file:
+            file.seek(start)
+            while sent < end - start:
+                chunk = file.read(min(SEND_BUFFER_SIZE, end - start - sent))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if self.server.connection_rate:
+                    # Hold each connection to connection_rate bytes per second
+                    ahead = sent / self.server.connection_rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+
+def start_object_store(root, blobs, latency_ms, connection_mb_per_s, etag="md5"):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ObjectStoreHandler)
+    server.daemon_threads = True
+    server.root = os.path.realpath(root)
+    # Encrypted objects have ETags that look like an MD5 but are not the MD5 of the content
+    server.etags = {os.path.join(server.root, blob["key"]): blob["md5"] if etag == "md5" else os.urandom(16).hex() for blob in blobs}
+    server.latency = latency_ms / 1000
+    server.connection_rate = connection_mb_per_s * MB
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure_s3(endpoint):
+    # Point s3fs, and flytekit's data store configuration when flytekit is installed, at the stand-in
+    import fsspec
+    fsspec.config.conf.setdefault("s3", {}).update(
+        {"endpoint_url": endpoint, "anon": True, "client_kwargs": {"region_name": "us-east-1"}})
+    os.environ.setdefault("FLYTE_AWS_ENDPOINT", endpoint)
+    os.environ.setdefault("FLYTE_AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("FLYTE_AWS_SECRET_ACCESS_KEY", "benchmark")
+
+
+def run_benchmark(blobs, workers, chunk_size, repeat, work_dir):
+    # Download every blob into an empty directory `repeat` times; returns the median run's summary
+    runs = []
+    for _ in range(repeat):
+        output_dir = tempfile.mkdtemp(dir=work_dir)
+        try:
+            # copy_blobs prints a line per blob, which would drown the results table
+            with contextlib.redirect_stdout(io.StringIO()):
+                summary = copy_blobs(blobs, output_dir, workers=workers, chunk_size=chunk_size, retries=0)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        if summary["failed"]:
+            raise RuntimeError(f"{len(summary['failed'])} blobs failed with {workers} workers and {chunk_size // MB} MB chunks")
+        runs.append(summary)
+    runs.sort(key=lambda summary: summary["seconds"])
+    return runs[len(runs) // 2]
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark flow_artifacts_copy.py against a local object store stand-in.")
+    parser.add_argument("--workers", default="1,4,8,16", help="Comma separated concurrency levels (default: 1,4,8,16)")
+    parser.add_argument("--chunk-sizes", default="1,8", help="Comma separated chunk sizes in MB, only swept with --scheme s3 (default: 1,8)")
+    parser.add_argument("--blobs", type=int, default=8, help="Number of synthetic blobs (default: 8)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma separated blob sizes in MB, cycled over the blobs (default: {DEFAULT_SIZES})")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay before the store answers each request (default: 20)")
+    parser.add_argument("--connection-mb-per-s", type=float, default=100, help="Throughput limit of a single connection, 0 for none (default: 100)")
+    parser.add_argument("--scheme", choices=("http", "s3"), default="http", help="Read the blobs over plain HTTP or through s3fs (default: http)")
+    parser.add_argument("--etag", choices=("md5", "kms"), default="md5",
+                        help="ETags the store returns: the MD5 of the content, or opaque ones as for SSE-KMS encrypted objects (default: md5)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration; the median is reported (default: 3)")
+    parser.add_argument("--work-dir", help="Directory for the seeded blobs and downloads (default: a temporary directory)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to this JSON file")
+    parser.add_argument("--min-mb-per-s", type=float, help=f"Exit with 1 when {MAX_DOWNLOAD_WORKERS} workers with {CHUNK_SIZE // MB} MB chunks are slower than this")
+    args = parser.parse_args()
+
+    worker_levels = split_numbers(args.workers, int)
+    if args.scheme == "s3":
+        chunk_sizes = [int(size * MB) for size in split_numbers(args.chunk_sizes, float)]
+    else:
+        # One streamed GET per blob, so the chunk size would only change the read buffer
+        chunk_sizes = [CHUNK_SIZE]
+    # The default configuration is always measured, since --min-mb-per-s checks it
+    if args.min_mb_per_s is not None:
+        worker_levels = sorted(set(worker_levels) | {MAX_DOWNLOAD_WORKERS})
+        chunk_sizes = sorted(set(chunk_sizes) | {CHUNK_SIZE})
+
+    work_dir = tempfile.mkdtemp(prefix="flow-artifacts-benchmark-", dir=args.work_dir)
+    server = None
+    try:
+        store_dir = os.path.join(work_dir, "store")
+        seeded = seed_blobs(store_dir, args.blobs, split_numbers(args.sizes, float))
+        server = start_object_store(store_dir, seeded, args.latency_ms, args.connection_mb_per_s, args.etag)
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+        if args.scheme == "s3":
+            configure_s3(endpoint)
+            prefix = f"s3://{BUCKET}"
+        else:
+            prefix = f"{endpoint}/{BUCKET}"
+        blobs = [
+            {"uri": f"{prefix}/{blob['key']}", "filename": blob["filename"], "size": blob["size"],
+             "md5": blob["md5"] if args.etag == "md5" else None, "sha256": None}
+            for blob in seeded
+        ]
+        total_mb = sum(blob["size"] for blob in seeded) / MB
+        print(f"{len(blobs)} blobs, {total_mb:.0f} MB, {args.scheme} at {endpoint}, {args.latency_ms:g} ms latency, "
+              f"{args.connection_mb_per_s or 'unlimited'} MB/s per connection, {args.etag} ETags")
+        print(f"{'workers':>8} {'chunk MB':>9} {'seconds':>8} {'MB/s':>8} {'median blob s':>14} {'max blob s':>11}")
+
+        results = []
+        for chunk_size in chunk_sizes:
+            for workers in worker_levels:
+                summary = run_benchmark(blobs, workers, chunk_size, args.repeat, work_dir)
+                results.append({"workers": workers, "chunk_mb": chunk_size / MB, **summary})
+                print(f"{workers:>8} {chunk_size / MB:>9g} {summary['seconds']:>8.2f} {summary['mb_per_s']:>8.1f} "
+                      f"{summary['blob_seconds_median']:>14.3f} {summary['blob_seconds_max']:>11.3f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "scheme": args.scheme,
+        "etag": args.etag,
+        "blobs": len(blobs),
+        "total_mb": round(total_mb, 1),
+        "latency_ms": args.latency_ms,
+        "connection_mb_per_s": args.connection_mb_per_s,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.min_mb_per_s is not None:
+        default = next(r for r in results if r["workers"] == MAX_DOWNLOAD_WORKERS and r["chunk_mb"] * MB == CHUNK_SIZE)
+        if default["mb_per_s"] < args.min_mb_per_s:
+            print(f"Default configuration reached {default['mb_per_s']} MB/s, below the required {args.min_mb_per_s} MB/s "
+                  f"(best {max(r['mb_per_s'] for r in results)} MB/s)")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
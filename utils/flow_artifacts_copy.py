@@ -1,88 +1,393 @@
-
-
 """
 flow_artifacts_copy.py
 
-1. Paste your Flyte code snippet (that includes "blobs = [ ... ]" and ends with "download_blobs(blobs)")
-   into the FLYTE_SNIPPET variable below.
-2. Set the OUTPUT_DIR variable to your desired directory.
-3. Run: flow_artifacts_copy.py
-"""
+Download Flow artifacts (file blobs in the Flyte data store) into a dataset directory, e.g. /mnt/data/ADAM.
 
-# ----------------------------- #
-# Paste your Flyte snippet here #
-# ----------------------------- #
-FLYTE_SNIPPET = """
-from flytekitplugins.domino.helpers import BlobDataLocation, download_blobs
-
-blobs = [
-    BlobDataLocation(
-        "s3://ddl-sce57693-flyte-data//999b5d83-a1cc-4ed1-8d36-59880a4357ba/admh_dataset",
-        local_dir="",
-        local_filename="admh.sas7bdat",
-        local_file_extension="",
-    ),
-    BlobDataLocation(
-        "s3://ddl-sce57693-flyte-data//606afd05-9d19-4e29-883f-ca8c17c7f36e/advs_dataset",
-        local_dir="",
-        local_filename="advs.sas7bdat",
-        local_file_extension="",
-    ),
-    BlobDataLocation(
-        "s3://ddl-sce57693-flyte-data//30e4c638-08f2-44f4-9a2f-2f9fc699412d/adsl_dataset",
-        local_dir="",
-        local_filename="adsl.sas7bdat",
-        local_file_extension="",
-    ),
-    BlobDataLocation(
-        "s3://ddl-sce57693-flyte-data//af771702-6db5-4e60-b195-c208cf3c2035/adae_dataset",
-        local_dir="",
-        local_filename="adae.sas7bdat",
-        local_file_extension="",
-    ),
-    BlobDataLocation(
-        "s3://ddl-sce57693-flyte-data//e612131f-1e39-4d40-84ee-e63f122f2eaa/adcm_dataset",
-        local_dir="",
-        local_filename="adcm.sas7bdat",
-        local_file_extension="",
-    ),
-    BlobDataLocation(
-        "s3://ddl-sce57693-flyte-data//e6b49bd6-8988-45dc-91ac-29c100ab76fb/adlb_dataset",
-        local_dir="",
-        local_filename="adlb.sas7bdat",
-        local_file_extension="",
-    )
-]
-download_blobs(blobs)
+    flow_artifacts_copy.py OUTPUT_DIR --manifest blobs.json      # or blobs.csv
+    flow_artifacts_copy.py OUTPUT_DIR --execution-id f8a2c1...   # every file output of a Flow execution
+    flow_artifacts_copy.py OUTPUT_DIR --snippet snippet.py       # the code shown on the Flow artifacts page
+
+A manifest lists one blob per entry with the columns/keys uri and filename, plus optional size, md5 and sha256.
+A JSON manifest is a list of such objects, or an object with a "blobs" list.
+
+Blobs are downloaded concurrently. Each one is written to a temporary file in OUTPUT_DIR, checked against the
+expected size and the manifest checksums, and then renamed into place, so the dataset never holds a partial file.
+Files that are already present with matching digests are not downloaded again. The store's ETag is only used to
+notice that a blob changed: it is the MD5 of the object for plain uploads, but not for SSE-KMS or SSE-C encrypted
+ones, so it is only checked as an MD5 with --etag-md5. A JSON summary is printed as the last line.
 """
 
-# --------------------------------------------------------------- #
-# Set this to the directory you want all blobs to download into   #
-# --------------------------------------------------------------- #
-OUTPUT_DIR = "/mnt/data/scratch"
-# e.g. OUTPUT_DIR = "/mnt/data/ADAM"
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 
-def main():
-    # Remove or comment-out lines containing 'download_blobs(blobs)'
-    snippet_without_first_download = []
-    for line in FLYTE_SNIPPET.splitlines():
-        if "download_blobs(blobs)" in line:
-            line = f"# {line}"  # comment it out
-        snippet_without_first_download.append(line)
+MB = 1024 * 1024
+# Concurrent downloads; each holds one chunk in memory at a time
+MAX_DOWNLOAD_WORKERS = 8
+CHUNK_SIZE = 8 * MB
+# Further attempts for a blob whose download or verification failed, with exponential backoff
+RETRIES = 2
+# Downloaded files are recorded here, so later runs can skip them without hashing. Hidden from dataset listings.
+STATE_NAME = ".flow_artifacts.json"
+HASH_CHUNK_SIZE = MB
 
-    snippet_cleaned = "\n".join(snippet_without_first_download)
+# BlobDataLocation("s3://...", local_dir="", local_filename="adsl.sas7bdat", local_file_extension="") in a snippet
+SNIPPET_BLOB_PATTERN = re.compile(r'BlobDataLocation\(\s*["\']([^"\']+)["\'](.*?)\)', re.DOTALL)
+SNIPPET_ARG_PATTERN = re.compile(r'(\w+)\s*=\s*["\']([^"\']*)["\']')
+# An S3 ETag looks like an MD5 unless the object was uploaded in parts ("<md5>-<parts>"), but it is only the MD5 of
+# the content for objects without SSE-KMS or SSE-C encryption
+MD5_ETAG_PATTERN = re.compile(r'^[0-9a-f]{32}$')
 
-    # Then add the override and second download call
-    updated_snippet = f"""
-{snippet_cleaned}
 
-for blob in blobs:
-    blob.local_dir = r\"\"\"{OUTPUT_DIR}\"\"\"
+def normalize_blob(entry, source):
+    uri = (entry.get("uri") or "").strip()
+    filename = (entry.get("filename") or entry.get("local_filename") or "").strip()
+    if not uri:
+        raise ValueError(f"{source}: blob without a uri: {entry}")
+    if not filename:
+        filename = uri.rstrip("/").rsplit("/", 1)[-1]
+    if os.path.basename(filename) != filename or filename in (".", ".."):
+        raise ValueError(f"{source}: filename {filename} must be a plain file name")
+    size = entry.get("size")
+    return {
+        "uri": uri,
+        "filename": filename,
+        "size": int(size) if size not in (None, "") else None,
+        "md5": (entry.get("md5") or "").strip().lower() or None,
+        "sha256": (entry.get("sha256") or "").strip().lower() or None,
+    }
 
-download_blobs(blobs)
-"""
 
-    exec(updated_snippet, globals(), locals())
+def read_manifest(path):
+    with open(path, "r", newline="") as file:
+        if path.lower().endswith(".csv"):
+            entries = list(csv.DictReader(file))
+        else:
+            entries = json.load(file)
+            if isinstance(entries, dict):
+                entries = entries.get("blobs", [])
+    return [normalize_blob(entry, path) for entry in entries]
+
+
+def parse_snippet(text, source="snippet"):
+    # The blobs of a snippet copied from the Flow artifacts page. The snippet is parsed, never executed.
+    blobs = []
+    for uri, arguments in SNIPPET_BLOB_PATTERN.findall(text):
+        arguments = dict(SNIPPET_ARG_PATTERN.findall(arguments))
+        filename = arguments.get("local_filename") or uri.rstrip("/").rsplit("/", 1)[-1]
+        extension = arguments.get("local_file_extension", "").lstrip(".")
+        if extension and not filename.endswith(f".{extension}"):
+            filename = f"{filename}.{extension}"
+        blobs.append(normalize_blob({"uri": uri, "filename": filename}, source))
+    if not blobs:
+        raise ValueError(f"{source}: no BlobDataLocation found")
+    return blobs
+
+
+def read_execution(execution_id, project=None, domain=None):
+    # The file outputs of every task of a Flow execution, named <output name>.<file type> as in the artifact
+    # listing. Imported here, so manifests can be downloaded without a Flyte remote configuration.
+    from flytekit.configuration import Config
+    from flytekit.remote import FlyteRemote
+
+    remote = FlyteRemote(config=Config.auto(), default_project=project, default_domain=domain)
+    execution = remote.fetch_execution(project=project, domain=domain, name=execution_id)
+    execution = remote.sync_execution(execution, sync_nodes=True)
+    blobs = {}
+    for node_id, node in sorted(execution.node_executions.items()):
+        if node_id in ("start-node", "end-node") or node.outputs is None:
+            continue
+        for name, literal in node.outputs.literals.items():
+            blob = literal.scalar.blob if literal.scalar is not None else None
+            if blob is None:
+                continue
+            file_format = blob.metadata.type.format
+            filename = f"{name}.{file_format}" if file_format and not name.endswith(f".{file_format}") else name
+            blobs.setdefault(blob.uri, normalize_blob({"uri": blob.uri, "filename": filename}, f"execution {execution_id}"))
+    if not blobs:
+        raise ValueError(f"Execution {execution_id} has no file outputs")
+    return list(blobs.values())
+
+
+class BlobReader:
+    # Stat and stream blobs by URI. http(s) URIs are read with requests, file paths directly, and anything else
+    # (s3://...) through the fsspec filesystem flytekit configures for the Flyte data store.
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.session = None
+        self.filesystems = {}
+
+    def http_session(self):
+        with self.lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self.session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+                self.session.mount("https://", adapter)
+                self.session.mount("http://", adapter)
+            return self.session
+
+    def filesystem(self, uri):
+        protocol = uri.split("://", 1)[0]
+        with self.lock:
+            if protocol not in self.filesystems:
+                try:
+                    from flytekit import FlyteContextManager
+                    fs = FlyteContextManager.current_context().file_access.get_filesystem_for_path(uri)
+                except ImportError:
+                    import fsspec
+                    fs = fsspec.filesystem(protocol)
+                self.filesystems[protocol] = fs
+            return self.filesystems[protocol]
+
+    @staticmethod
+    def scheme(uri):
+        if uri.startswith(("http://", "https://")):
+            return "http"
+        if "://" not in uri or uri.startswith("file://"):
+            return "file"
+        return "fsspec"
+
+    def stat(self, uri):
+        # Returns (size, etag) of a blob; either may be None when the store does not report it
+        scheme = self.scheme(uri)
+        if scheme == "http":
+            response = self.http_session().head(uri, allow_redirects=True)
+            response.raise_for_status()
+            size = response.headers.get("Content-Length")
+            return (int(size) if size is not None else None), response.headers.get("ETag")
+        if scheme == "file":
+            return os.stat(uri[len("file://"):] if uri.startswith("file://") else uri).st_size, None
+        info = self.filesystem(uri).info(uri)
+        return info.get("size"), info.get("ETag") or info.get("etag")
+
+    def chunks(self, uri, chunk_size):
+        scheme = self.scheme(uri)
+        if scheme == "http":
+            with self.http_session().get(uri, stream=True) as response:
+                response.raise_for_status()
+                yield from response.iter_content(chunk_size)
+            return
+        if scheme == "file":
+            file = open(uri[len("file://"):] if uri.startswith("file://") else uri, "rb")
+        else:
+            file = self.filesystem(uri).open(uri, "rb", block_size=chunk_size)
+        with file:
+            yield from iter(lambda: file.read(chunk_size), b"")
+
+
+def etag_md5(etag):
+    etag = (etag or "").strip('"').lower()
+    return etag if MD5_ETAG_PATTERN.match(etag) else None
+
+
+def file_digests(path, algorithms):
+    digests = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            for digest in digests.values():
+                digest.update(chunk)
+    return {algorithm: digest.hexdigest() for algorithm, digest in digests.items()}
+
+
+def load_state(directory):
+    path = os.path.join(directory, STATE_NAME)
+    try:
+        with open(path, "r") as file:
+            return json.load(file).get("files", {})
+    except FileNotFoundError:
+        return {}
+    except (ValueError, AttributeError):
+        print(f"Ignoring unreadable download state {path}")
+        return {}
+
+
+def save_state(directory, state):
+    path = os.path.join(directory, STATE_NAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump({"files": state}, file, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def is_present(blob, target, record, size, etag, md5):
+    # Whether target already holds the blob. A file recorded by an earlier download of the same blob, and not
+    # modified since, is trusted without hashing; any other existing file must match a known checksum.
+    try:
+        stat = os.stat(target)
+    except FileNotFoundError:
+        return False
+    if size is not None and stat.st_size != size:
+        return False
+    if (record and record.get("uri") == blob["uri"] and record.get("size") == stat.st_size
+            and record.get("mtime_ns") == stat.st_mtime_ns and (etag is None or record.get("etag") == etag)
+            and blob["sha256"] in (None, record.get("sha256"))):
+        return True
+    expected = {algorithm: value for algorithm, value in (("md5", md5), ("sha256", blob["sha256"])) if value}
+    if not expected:
+        return False
+    return file_digests(target, expected) == expected
+
+
+def download_blob(reader, blob, directory, record, chunk_size, trust_etag=False):
+    # Stream one blob into a temporary file next to its target, verify it, and rename it into place.
+    # Returns (result, record), where result is "downloaded" or "skipped". With trust_etag, an ETag that looks like
+    # an MD5 is checked as one when the manifest has no MD5.
+    target = os.path.join(directory, blob["filename"])
+    size, etag = reader.stat(blob["uri"])
+    if blob["size"] is not None:
+        if size is not None and size != blob["size"]:
+            raise ValueError(f"{blob['uri']} is {size} bytes, but the manifest expects {blob['size']}")
+        size = blob["size"]
+    md5 = blob["md5"] or (etag_md5(etag) if trust_etag else None)
+    if is_present(blob, target, record, size, etag, md5):
+        # Re-recorded, so a file that was only verified by its checksum is trusted without hashing next time
+        stat = os.stat(target)
+        sha256 = blob["sha256"] or (record.get("sha256") if record and record.get("uri") == blob["uri"] else None)
+        return "skipped", {"uri": blob["uri"], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "etag": etag, "sha256": sha256}
+
+    digests = {"sha256": hashlib.sha256()}
+    if md5:
+        digests["md5"] = hashlib.md5()
+    temp_path = os.path.join(directory, f".{blob['filename']}.part")
+    copied = 0
+    try:
+        with open(temp_path, "wb") as file:
+            for chunk in reader.chunks(blob["uri"], chunk_size):
+                file.write(chunk)
+                copied += len(chunk)
+                for digest in digests.values():
+                    digest.update(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        if size is not None and copied != size:
+            raise ValueError(f"{blob['uri']}: received {copied} of {size} bytes")
+        sha256 = digests["sha256"].hexdigest()
+        if md5 and digests["md5"].hexdigest() != md5:
+            raise ValueError(f"{blob['uri']}: MD5 {digests['md5'].hexdigest()} does not match {md5}")
+        if blob["sha256"] and sha256 != blob["sha256"]:
+            raise ValueError(f"{blob['uri']}: SHA-256 {sha256} does not match {blob['sha256']}")
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    stat = os.stat(target)
+    return "downloaded", {
+        "uri": blob["uri"],
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "etag": etag,
+        "sha256": sha256,
+    }
+
+
+def copy_blobs(blobs, directory, workers=MAX_DOWNLOAD_WORKERS, chunk_size=CHUNK_SIZE, retries=RETRIES, trust_etag=False):
+    # Download the blobs into directory with at most `workers` downloads in flight. Returns a summary dict.
+    filenames = {}
+    unique_blobs = []
+    for blob in blobs:
+        if blob["filename"] in filenames:
+            if filenames[blob["filename"]] != blob["uri"]:
+                raise ValueError(f"Both {filenames[blob['filename']]} and {blob['uri']} would be written to {blob['filename']}")
+            # A repeated entry would have two downloads writing the same temporary file
+            continue
+        filenames[blob["filename"]] = blob["uri"]
+        unique_blobs.append(blob)
+    blobs = unique_blobs
+    os.makedirs(directory, exist_ok=True)
+    state = load_state(directory)
+    state_lock = threading.Lock()
+    reader = BlobReader(workers)
+
+    def copy(blob):
+        target = os.path.join(directory, blob["filename"])
+        for attempt in range(retries + 1):
+            start = time.monotonic()
+            try:
+                result, record = download_blob(reader, blob, directory, state.get(blob["filename"]), chunk_size, trust_etag)
+                break
+            except Exception as e:
+                if attempt == retries:
+                    print(f"Failed to download {blob['uri']}: {e}")
+                    return "failed", 0, None
+                print(f"Retrying {blob['uri']} after error: {e}")
+                time.sleep(2 ** attempt)
+        seconds = time.monotonic() - start
+        with state_lock:
+            state[blob["filename"]] = record
+        if result == "skipped":
+            print(f"Unchanged {target}")
+            return result, 0, seconds
+        print(f"Downloaded {blob['uri']} to {target} ({record['size'] / MB:.1f} MB, {record['size'] / MB / max(seconds, 1e-6):.1f} MB/s)")
+        return result, record["size"], seconds
+
+    start = time.monotonic()
+    results = []
+    try:
+        if blobs:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(blobs)))) as executor:
+                results = list(executor.map(copy, blobs))
+    finally:
+        # Saved even when interrupted, so completed downloads are skipped on the next run
+        with state_lock:
+            save_state(directory, state)
+    seconds = time.monotonic() - start
+    downloaded_bytes = sum(copied for _, copied, _ in results)
+    # Time per downloaded blob, from the first request to the rename
+    blob_seconds = sorted(blob_time for result, _, blob_time in results if result == "downloaded")
+    return {
+        "downloaded": len(blob_seconds),
+        "skipped": sum(1 for result, _, _ in results if result == "skipped"),
+        "failed": [blob["uri"] for blob, (result, _, _) in zip(blobs, results) if result == "failed"],
+        "bytes": downloaded_bytes,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(downloaded_bytes / MB / seconds, 1) if seconds > 0 else None,
+        "blob_seconds_median": round(blob_seconds[len(blob_seconds) // 2], 3) if blob_seconds else None,
+        "blob_seconds_max": round(blob_seconds[-1], 3) if blob_seconds else None,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Download Flow artifacts into a dataset directory.")
+    parser.add_argument("output_dir", help="Directory to which all blobs are downloaded, e.g. /mnt/data/ADAM")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", metavar="PATH", help="JSON or CSV manifest of the blobs to download")
+    source.add_argument("--execution-id", metavar="ID", help="download every file output of this Flow execution")
+    source.add_argument("--snippet", metavar="PATH", help="file holding a code snippet copied from the Flow artifacts page")
+    parser.add_argument("--flyte-project", help="Flyte project of the execution (default: from the Flyte configuration)")
+    parser.add_argument("--flyte-domain", help="Flyte domain of the execution (default: from the Flyte configuration)")
+    parser.add_argument("--workers", type=int, default=MAX_DOWNLOAD_WORKERS, help=f"Maximum concurrent downloads (default: {MAX_DOWNLOAD_WORKERS})")
+    parser.add_argument("--chunk-size", type=float, default=CHUNK_SIZE / MB, metavar="MB", help=f"Read size per request in MB (default: {CHUNK_SIZE // MB})")
+    parser.add_argument("--retries", type=int, default=RETRIES, help=f"Further attempts for a failed download (default: {RETRIES})")
+    parser.add_argument("--etag-md5", action="store_true",
+                        help="check blobs without a manifest MD5 against their ETag, when it looks like an MD5. "
+                        "Only for buckets without SSE-KMS or SSE-C encryption, whose ETags are not the MD5 of the content")
+    args = parser.parse_args()
+
+    if args.manifest:
+        blobs = read_manifest(args.manifest)
+    elif args.snippet:
+        with open(args.snippet, "r") as file:
+            blobs = parse_snippet(file.read(), args.snippet)
+    else:
+        blobs = read_execution(args.execution_id, args.flyte_project, args.flyte_domain)
+
+    summary = copy_blobs(blobs, args.output_dir, workers=args.workers, chunk_size=int(args.chunk_size * MB), retries=args.retries, trust_etag=args.etag_md5)
+    print(json.dumps(summary))
+    if summary["failed"]:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,5 +1,18 @@
-from domino import Domino
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from re import sub
+import json
 import os
+import sys
+import threading
+import time
+
+from domino import Domino
+import requests
+from requests.adapters import HTTPAdapter
+
+# Bootstrap the Domino datasets of a reporting effort (RE) project. Safe to run repeatedly: only datasets that
+# are missing are created, and only required shared datasets that are not mounted yet are mounted.
 
 DOMINO_USER_API_KEY = os.environ['DOMINO_USER_API_KEY']
 DOMINO_API_HOST = os.environ['DOMINO_API_HOST']
@@ -7,10 +20,6 @@ DOMINO_PROJECT_ID = os.environ['DOMINO_PROJECT_ID']
 DOMINO_PROJECT_OWNER = os.environ['DOMINO_PROJECT_OWNER']
 DOMINO_PROJECT_NAME = os.environ['DOMINO_PROJECT_NAME']
 
-domino = Domino(f"{DOMINO_PROJECT_OWNER}/{DOMINO_PROJECT_NAME}")
-
-# Create domino datasets
-
 # Required Datasets & Descriptions
 REQUIRED = {
     "METADATA": "Internal metadata",
@@ -21,91 +30,269 @@ REQUIRED = {
     "TFLQC": "TFLQC is created using ADAM for qc tfls"
 }
 
-# Existing Datasets
-CURRENT = set(d['datasetName'] for d in domino.datasets_list(project_id=os.environ["DOMINO_PROJECT_ID"]))
+# Shared datasets of the SDTM project to mount
+REQUIRED_MOUNTED = {
+    "SDTMBLIND",
+    "METADATA"
+}
+
+# Concurrent API calls, and the most calls started per second, across the whole script
+MAX_CONCURRENT_REQUESTS = 8
+MAX_REQUESTS_PER_SECOND = 20
+PAGE_SIZE = 100
+
+# Project and dataset ids are looked up by name in a local cache before asking the API
+CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "domino-init-datasets.json")
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+API_SESSION = requests.Session()
+API_SESSION.mount("https://", HTTPAdapter(pool_connections=MAX_CONCURRENT_REQUESTS, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+API_SESSION.mount("http://", HTTPAdapter(pool_connections=MAX_CONCURRENT_REQUESTS, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+API_SESSION.headers.update({
+    'X-Domino-Api-Key': DOMINO_USER_API_KEY,
+    'Content-Type': 'application/json',
+    'accept': 'application/json',
+})
+
+
+class RateLimiter:
+    # Spaces out the start of API calls so that at most `rate` calls start per second
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+RATE_LIMITER = RateLimiter(MAX_REQUESTS_PER_SECOND)
+# Creating and mounting datasets run side by side, each with its own pool, so the calls in flight are bounded here
+API_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+def limited_call(function, *args, **kwargs):
+    # Every API call, through requests or the python-domino client, shares the same slots and rate limit
+    with API_SLOTS:
+        RATE_LIMITER.wait()
+        return function(*args, **kwargs)
 
-# For any required datasets which do not exist 
-for key in set(REQUIRED.keys()).difference(CURRENT):
-    # Make them
-    domino.datasets_create(key, REQUIRED[key])
 
-# From multijob.py
-import requests
 def submit_api_call(method, endpoint, data=None):
-    headers = {
-        'X-Domino-Api-Key': DOMINO_USER_API_KEY, 
-        'Content-Type': 'application/json',
-        'accept': 'application/json',
-    }
     url = f'{DOMINO_API_HOST}/{endpoint}'
-    response = requests.request(method, url, headers=headers, json=data)
+    response = limited_call(API_SESSION.request, method, url, json=data)
+    response.raise_for_status()
 
     # Some API responses have JSON bodies, some are empty
     try:
         return response.json()
-    except:
+    except ValueError:
+        return response.text
+
+
+def get_paginated(endpoint, key, params="", stop=None):
+    # Fetches every page of a list endpoint, or stops early once stop(items) is true. The server may return fewer
+    # items than asked for, so the listing ends at the total count in the response metadata, or at an empty page.
+    items = []
+    offset = 0
+    separator = "&" if "?" in endpoint else "?"
+    while True:
+        response = submit_api_call("GET", f"{endpoint}{separator}offset={offset}&limit={PAGE_SIZE}{params}")
+        page = response[key]
+        items.extend(page)
+        total = (response.get("metadata") or {}).get("totalCount")
+        if not page or (total is not None and len(items) >= total) or (stop is not None and stop(items)):
+            return items
+        offset += len(page)
+
+
+def run_concurrently(function, args_list):
+    # Calls function on each argument with at most MAX_CONCURRENT_REQUESTS calls in flight and returns the
+    # results in order. An exception is returned in place of the result of a call that raised it.
+    def call(args):
         try:
-            return response.text
-        except:
-            return response
+            return function(args)
+        except Exception as e:
+            return e
+    if not args_list:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(args_list))) as executor:
+        return list(executor.map(call, args_list))
 
-# Mount imported datasets
 
-REQUIRED_MOUNTED = {
-    "SDTMBLIND",
-    "METADATA"
-}
+class LookupCache:
+    # Name and id lookups that rarely change, kept in a JSON file for CACHE_TTL_SECONDS. Each entry is
+    # {"value": ..., "time": ...}, keyed by "<kind>:<key>".
 
-# What datasets are currently mounted? And What are they called?
-CURRENT_MOUNTED_ID = submit_api_call(
-    'GET',
-     f"api/projects/v1/projects/{DOMINO_PROJECT_ID}/shared-datasets"
-)['dataset']['sharedDatasetIds']
+    def __init__(self, path, ttl, refresh=False):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.changed = False
+        if path and not refresh and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable cache {path}: {e}")
 
-CURRENT_MOUNTED = set()
-for id in CURRENT_MOUNTED_ID:
-    CURRENT_MOUNTED.add(submit_api_call(
-        "GET",
-        f"api/datasetrw/v1/datasets/{id}"
-    )['dataset']['name'])
+    def get(self, kind, key):
+        entry = self.entries.get(f"{kind}:{key}")
+        if entry is None or time.time() - entry["time"] > self.ttl:
+            return None
+        return entry["value"]
 
-# Make SDTM project name
-from re import sub
-SDTM_PROJECT = sub(r"RE_\w+","SDTM", DOMINO_PROJECT_NAME)
-
-# Get SDTM project ID
-SDTM_PROJECT_IDs = {
-    x['name']: x['id'] 
-    for x in 
-    submit_api_call(
-        "GET",
-        "api/projects/beta/projects?limit=999",
-    )['projects']
-}
+    def put(self, kind, key, value):
+        self.entries[f"{kind}:{key}"] = {"value": value, "time": time.time()}
+        self.changed = True
 
-SDTM_PROJECT_ID = SDTM_PROJECT_IDs[SDTM_PROJECT]
-
-# For every unmounted datasets, mount it
-# ASSUMPTION: We are only mounting datasets from the SDTM project
-SDTM_DATASETS = {
-    x['dataset']['name']: x['dataset']['id'] 
-    for x in 
-    submit_api_call(
-        "GET",
-        f"api/datasetrw/v2/datasets?projectIdsToInclude={SDTM_PROJECT_ID}",
-    )['datasets']
-}
+    def save(self):
+        if not self.path or not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
 
-for missing_dataset in REQUIRED_MOUNTED.difference(CURRENT_MOUNTED):
-    try:
-        submit_api_call(
-            "POST",
-            f"api/projects/v1/projects/{DOMINO_PROJECT_ID}/shared-datasets",
-            {
-                "datasetId": SDTM_DATASETS[missing_dataset]
-            })
-    except KeyError:
-        print(f"ERROR: Could not find required dataset {missing_dataset} in {SDTM_PROJECT} datasets: {SDTM_DATASETS.keys()}")
-    except Exception as e:
-        print(e)
-        
+
+def get_project_id(cache, project_name):
+    project_id = cache.get("project", project_name)
+    if project_id is None:
+        # Pages are fetched until the project shows up; every project seen on the way is cached too
+        projects = get_paginated("api/projects/beta/projects", "projects",
+                                 stop=lambda items: any(p['name'] == project_name for p in items))
+        for project in projects:
+            cache.put("project", project['name'], project['id'])
+        project_id = cache.get("project", project_name)
+    return project_id
+
+
+def get_dataset_names(cache, dataset_ids):
+    # Dataset names by id; ids not in the cache are resolved concurrently
+    missing = [dataset_id for dataset_id in dataset_ids if cache.get("dataset", dataset_id) is None]
+    results = run_concurrently(lambda dataset_id: submit_api_call("GET", f"api/datasetrw/v1/datasets/{dataset_id}")['dataset']['name'], missing)
+    for dataset_id, name in zip(missing, results):
+        if isinstance(name, Exception):
+            print(f"ERROR: Could not look up dataset {dataset_id}: {name}")
+        else:
+            cache.put("dataset", dataset_id, name)
+    return {dataset_id: cache.get("dataset", dataset_id) for dataset_id in dataset_ids if cache.get("dataset", dataset_id)}
+
+
+def get_project_datasets(cache, project_id, required_names):
+    # Dataset ids by name for a project. The cached list is refreshed when a required name is missing from it,
+    # since the dataset may have been created after the list was cached.
+    datasets = cache.get("project-datasets", project_id)
+    if datasets is None or not set(required_names).issubset(datasets):
+        datasets = {
+            x['dataset']['name']: x['dataset']['id']
+            for x in get_paginated("api/datasetrw/v2/datasets", "datasets", params=f"&projectIdsToInclude={project_id}")
+        }
+        cache.put("project-datasets", project_id, datasets)
+    return datasets
+
+
+def create_datasets(domino, dry_run):
+    # Create the required datasets of this project that do not exist yet. Returns the number of failures.
+    current = set(d['datasetName'] for d in limited_call(domino.datasets_list, project_id=DOMINO_PROJECT_ID))
+    missing = sorted(set(REQUIRED.keys()).difference(current))
+    if not missing:
+        print("All required datasets exist")
+        return 0
+    if dry_run:
+        print(f"Would create datasets: {', '.join(missing)}")
+        return 0
+    results = run_concurrently(lambda name: limited_call(domino.datasets_create, name, REQUIRED[name]), missing)
+    failures = 0
+    for name, result in zip(missing, results):
+        if isinstance(result, Exception):
+            print(f"ERROR: Could not create dataset {name}: {result}")
+            failures += 1
+        else:
+            print(f"Created dataset {name}")
+    return failures
+
+
+def mount_datasets(cache, dry_run):
+    # Mount the required shared datasets of the SDTM project that are not mounted yet. Returns the number of failures.
+    mounted_ids = submit_api_call(
+        'GET',
+        f"api/projects/v1/projects/{DOMINO_PROJECT_ID}/shared-datasets"
+    )['dataset']['sharedDatasetIds']
+    mounted = set(get_dataset_names(cache, mounted_ids).values())
+    missing = sorted(REQUIRED_MOUNTED.difference(mounted))
+    if not missing:
+        print("All required shared datasets are mounted")
+        return 0
+
+    # ASSUMPTION: We are only mounting datasets from the SDTM project
+    sdtm_project = sub(r"RE_\w+", "SDTM", DOMINO_PROJECT_NAME)
+    sdtm_project_id = get_project_id(cache, sdtm_project)
+    if sdtm_project_id is None:
+        print(f"ERROR: Could not find project {sdtm_project}")
+        return len(missing)
+    sdtm_datasets = get_project_datasets(cache, sdtm_project_id, missing)
+
+    failures = 0
+    to_mount = []
+    for name in missing:
+        if name not in sdtm_datasets:
+            print(f"ERROR: Could not find required dataset {name} in {sdtm_project} datasets: {', '.join(sorted(sdtm_datasets))}")
+            failures += 1
+        else:
+            to_mount.append(name)
+    if dry_run:
+        if to_mount:
+            print(f"Would mount shared datasets: {', '.join(to_mount)}")
+        return failures
+
+    results = run_concurrently(lambda name: submit_api_call(
+        "POST",
+        f"api/projects/v1/projects/{DOMINO_PROJECT_ID}/shared-datasets",
+        {
+            "datasetId": sdtm_datasets[name]
+        }), to_mount)
+    for name, result in zip(to_mount, results):
+        if isinstance(result, Exception):
+            print(f"ERROR: Could not mount dataset {name}: {result}")
+            failures += 1
+        else:
+            print(f"Mounted shared dataset {name}")
+    return failures
+
+
+def main():
+    parser = ArgumentParser(description="Create and mount the Domino datasets a reporting effort project needs. Safe to run repeatedly.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help='report the datasets that would be created or mounted without changing anything')
+    parser.add_argument('--refresh', action='store_true',
+                        help='ignore the cached project and dataset ids and look them up again')
+    parser.add_argument('--cache', default=CACHE_PATH, metavar='PATH',
+                        help=f"lookup cache file (default: {CACHE_PATH}); pass an empty string to disable")
+    parser.add_argument('--ttl', type=int, default=CACHE_TTL_SECONDS, metavar='SECONDS',
+                        help=f"how long cached ids stay valid (default: {CACHE_TTL_SECONDS})")
+    args = parser.parse_args()
+
+    domino = Domino(f"{DOMINO_PROJECT_OWNER}/{DOMINO_PROJECT_NAME}")
+    cache = LookupCache(args.cache, args.ttl, refresh=args.refresh)
+
+    # Creating local datasets and mounting shared ones are independent, so they run side by side
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        created = executor.submit(create_datasets, domino, args.dry_run)
+        mounted = executor.submit(mount_datasets, cache, args.dry_run)
+        failures = created.result() + mounted.result()
+    cache.save()
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()